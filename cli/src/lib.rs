@@ -109,7 +109,7 @@ impl Whale {
                 "cd ~/.whale && git init && git remote add origin {}",
                 git_address
             );
-            let gitignore_command = "echo 'bin/\nlogs/\nconfig/config.yaml\nlibexec/' > .gitignore";
+            let gitignore_command = "echo 'bin/\ncache/\nlogs/\nconfig/config.yaml\nlibexec/' > .gitignore";
             let git_push_command =
                 "git add . && git commit -m 'Whale on our way' && git push -u origin master";
             let full_command = format!(
@@ -160,9 +160,6 @@ Fetching and rebasing local changes from github.");
             );
             let mut child = Command::new("sh").args(&["-c", &full_command]).spawn()?;
             child.wait()?;
-
-            let manifest_path = filesystem::get_manifest_filename();
-            filesystem::deduplicate_file(&manifest_path);
         }
         Ok(())
     }
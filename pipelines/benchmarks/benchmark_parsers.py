@@ -0,0 +1,79 @@
+"""
+Benchmarks for the table stub parsers on large stubs.
+
+Usage: python benchmarks/benchmark_parsers.py [n_columns] [n_blocks]
+"""
+import sys
+import timeit
+
+from whale.utils.markdown_delimiters import (
+    COLUMN_DETAILS_DELIMITER,
+    DEFINED_METRICS_DELIMITER,
+    INDEX_DELIMITER,
+    METRICS_DELIMITER,
+    PARTITIONS_DELIMITER,
+    SQL_BLOCK_DELIMITER,
+    UGC_DELIMITER,
+)
+from whale.utils.parsers import (
+    find_blocks_and_process,
+    markdown_from_sections,
+    parse_ugc,
+    sections_from_text,
+)
+
+N_REPEATS = 20
+
+
+def build_stub(n_columns, n_blocks):
+    columns = "".join(
+        f"* [STRING]    `column_{i}`\n    - Description of column {i}.\n"
+        for i in range(n_columns)
+    )
+    metrics = "".join(
+        f"metric_{i}: {i} @ 2021-01-01 00:00:00\n" for i in range(n_blocks)
+    )
+    blocks = "".join(
+        f"Some notes.\n\n{DEFINED_METRICS_DELIMITER}\nmetric_{i}:\n  sql: |\n"
+        f"    select count(*) from schema.table\n```\n\n"
+        f"{SQL_BLOCK_DELIMITER}-alias_{i}\nselect {i}\n```\n\n"
+        for i in range(n_blocks)
+    )
+    return (
+        "# `schema.table`\n`database` | `cluster`\n\n"
+        + f"{COLUMN_DETAILS_DELIMITER}\n{columns}\n"
+        + f"{INDEX_DELIMITER}\n* [primary] `index` [`column_0`]\n"
+        + f"{PARTITIONS_DELIMITER}\n```\nds:\n  high: '2021-01-01'\n```\n"
+        + f"{METRICS_DELIMITER}\n```\n{metrics}```\n"
+        + UGC_DELIMITER
+        + "\n*Do not make edits above this line.*\n\n"
+        + blocks
+    )
+
+
+def benchmark(name, function):
+    seconds = min(timeit.repeat(function, number=1, repeat=N_REPEATS))
+    print(f"{name:<40}{seconds * 1000:>10.3f} ms")
+
+
+def main():
+    n_columns = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    stub = build_stub(n_columns, n_blocks)
+    sections = sections_from_text(stub)
+    assert markdown_from_sections(sections) == stub
+
+    print(f"Stub: {len(stub)} characters, {n_columns} columns, {n_blocks} blocks.")
+    benchmark("sections_from_text", lambda: sections_from_text(stub))
+    benchmark("markdown_from_sections", lambda: markdown_from_sections(sections))
+    benchmark("parse_ugc", lambda: parse_ugc(sections["ugc"]))
+    benchmark(
+        "find_blocks_and_process",
+        lambda: find_blocks_and_process(
+            sections["ugc"], lambda sql, extra_macros="": sql
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
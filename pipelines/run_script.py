@@ -1,7 +1,13 @@
-from whale import execute_markdown_sql_blocks, execute_sql_file
-
 import argparse
+import json
+import os
 import pathlib
+import socket
+import sys
+
+# Kept in sync with whale.utils.paths, as importing whale is what the daemon
+# saves us from
+DAEMON_SOCKET_PATH = os.path.join(pathlib.Path.home(), ".whale", "daemon.sock")
 
 parser = argparse.ArgumentParser(description="Run a query.")
 parser.add_argument("filename")
@@ -13,10 +19,46 @@ args = parser.parse_args()
 #    them, saving the results in-line.
 #  * For SQL files, execute them and print the results here. If `--!wh-execute`
 #    is included, also save the results to the file.
+#
+# If the whale daemon (`python -m whale.daemon`) is running, it does the work
+# instead, otherwise whale is imported and run in this process.
+
+
+def run_in_daemon(filename, warehouse_name):
+    """
+    Returns the daemon's response, or None if it isn't running.
+    """
+    if not os.path.exists(DAEMON_SOCKET_PATH):
+        return None
+
+    request = {"filename": os.path.abspath(filename), "warehouse_name": warehouse_name}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(DAEMON_SOCKET_PATH)
+            client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with client.makefile("r", encoding="utf-8") as f:
+                response = f.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+
+    if not response:  # The daemon exited before responding
+        return None
+    return json.loads(response)
+
+
+response = run_in_daemon(args.filename, args.warehouse_name)
+if response is not None:
+    # Warnings the daemon logged on our behalf, e.g. that results were truncated
+    for message in response.get("logs", []):
+        print(message, file=sys.stderr)
+    if response["error"]:
+        print(response["error"], file=sys.stderr)
+        sys.exit(1)
+    if response["output"]:
+        print(response["output"])
+else:
+    from whale.daemon import run_file
 
-file_extension = pathlib.Path(args.filename).suffix
-if file_extension.lower() in [".md", ".markdown"]:
-    result = execute_markdown_sql_blocks(args.filename)
-else:  # Catchall for all sql-based extensions
-    result = execute_sql_file(args.filename, warehouse_name=args.warehouse_name)
-    print(result)
+    output = run_file(args.filename, warehouse_name=args.warehouse_name)
+    if output:
+        print(output)
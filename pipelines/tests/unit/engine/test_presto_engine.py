@@ -108,3 +108,93 @@ class TestPrestoEngine(unittest.TestCase):
         result = next(results)
         self.maxDiff = None
         self.assertEqual(result.__repr__(), expected.__repr__())
+
+    def test_get_table_metadata_from_information_schema(self, mock_settings) -> None:
+        self.engine.init(self.conf)
+        queries = []
+
+        def execute(query, **kwargs):
+            queries.append(query)
+            for table, table_type in [("mock_table", "BASE TABLE"), ("view", "VIEW")]:
+                for column_name, extra_info in [("id", None), ("ds", "partition key")]:
+                    yield {
+                        "table_name": table,
+                        "column_name": column_name,
+                        "data_type": "varchar(64)",
+                        "extra_info": extra_info,
+                        "comment": None,
+                        "table_type": table_type,
+                    }
+
+        self.engine.execute = MagicMock(side_effect=execute)
+        results = self.engine.get_table_metadata_from_information_schema(
+            MOCK_SCHEMA_NAME,
+            [MOCK_TABLE_NAME, "view", "missing's"],
+            is_view_query_enabled=True,
+        )
+
+        # All tables are fetched with a single query
+        self.assertEqual(len(queries), 1)
+        self.assertIn(
+            "IN ('mock_table', 'view', 'missing''s')",
+            queries[0],
+        )
+        self.assertEqual(list(results), [MOCK_TABLE_NAME, "view"])
+        table = results[MOCK_TABLE_NAME]
+        self.assertEqual(table.schema, MOCK_SCHEMA_NAME)
+        self.assertFalse(table.is_view)
+        self.assertTrue(results["view"].is_view)
+        self.assertEqual(
+            [(c.name, c.sort_order, c.is_partition_column) for c in table.columns],
+            [("id", 0, False), ("ds", 1, True)],
+        )
+
+        self.assertEqual(
+            self.engine.get_table_metadata_from_information_schema(
+                MOCK_SCHEMA_NAME, []
+            ),
+            {},
+        )
+        self.assertEqual(len(queries), 1)
+
+    def test_get_watermarks_aggregates_in_presto(self, mock_settings) -> None:
+        self.engine.init(self.conf)
+        queries = []
+
+        def execute(query, has_header=False, **kwargs):
+            queries.append(query)
+            if query.endswith("LIMIT 0"):
+                yield ["ds", "school"]
+            else:
+                yield (4, "2020-02-01", "2020-01-01", "Uplift", "Metaframe")
+
+        self.engine.execute = MagicMock(side_effect=execute)
+        high, low = self.engine.get_watermarks(MOCK_SCHEMA_NAME, MOCK_TABLE_NAME)
+
+        # Only a single row of partitions is fetched
+        self.assertNotIn("SELECT * FROM", queries[-1])
+        self.assertEqual(high.parts, [("ds", "2020-02-01"), ("school", "Uplift")])
+        self.assertEqual(low.parts, [("ds", "2020-01-01"), ("school", "Metaframe")])
+        self.assertEqual(low.get_watermark_model_key().split("/")[-2], "low_watermark")
+
+    def test_get_watermarks_falls_back_to_all_partitions(self, mock_settings) -> None:
+        self.engine.init(self.conf)
+
+        def execute(query, has_header=False, **kwargs):
+            if query.startswith("SELECT count(*)"):
+                raise Exception("Aggregation not supported")
+            yield ["ds", "school"]
+            if not query.endswith("LIMIT 0"):
+                yield ("2020-02-01", "Uplift University")
+                yield ("2020-01-01", "Uplift University")
+                yield ("2020-02-01", "Metaframe College")
+
+        self.engine.execute = MagicMock(side_effect=execute)
+        high, low = self.engine.get_watermarks(MOCK_SCHEMA_NAME, MOCK_TABLE_NAME)
+
+        self.assertEqual(
+            high.parts, [("ds", "2020-02-01"), ("school", "Uplift University")]
+        )
+        self.assertEqual(
+            low.parts, [("ds", "2020-01-01"), ("school", "Metaframe College")]
+        )
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from pyhocon import ConfigFactory
+
+from whale.engine.sql_alchemy_engine import SQLAlchemyEngine
+
+
+def test_other_threads_borrow_connections(tmp_path):
+    engine = SQLAlchemyEngine()
+    engine.init(
+        ConfigFactory.from_dict(
+            {SQLAlchemyEngine.CONN_STRING_KEY: f"sqlite:///{tmp_path / 'db.sqlite3'}"}
+        )
+    )
+
+    connection = engine.connection
+    borrowed_connections = []
+    get_connection = engine._get_connection
+
+    def borrow_connection():
+        borrowed_connections.append(get_connection())
+        return borrowed_connections[-1]
+
+    engine._get_connection = borrow_connection
+
+    def run_query(i):
+        return list(engine.execute(f"select {i}"))[0][0]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(run_query, range(8))) == list(range(8))
+    assert run_query(8) == 8
+
+    # Only other threads borrow connections, which are returned once done
+    assert len(borrowed_connections) == 8
+    assert all(borrowed.closed for borrowed in borrowed_connections)
+    assert engine.connection is connection and not connection.closed
+
+
+def test_pool_size_is_set_where_connections_are_queued(tmp_path):
+    engine = SQLAlchemyEngine()
+    engine.conn_string = "postgresql://user@localhost/db"
+    engine.connect_args = {}
+    engine.credentials_path = None
+    engine.pool_size = 16
+    engine.engine = None
+    assert engine._get_engine().pool.size() == 16
+
+    # sqlite doesn't queue connections, so can't be sized
+    engine.init(
+        ConfigFactory.from_dict(
+            {
+                SQLAlchemyEngine.CONN_STRING_KEY: f"sqlite:///{tmp_path / 'db.sqlite3'}",
+                SQLAlchemyEngine.POOL_SIZE_KEY: 16,
+            }
+        )
+    )
+    assert list(engine.execute("select 1")) == [(1,)]
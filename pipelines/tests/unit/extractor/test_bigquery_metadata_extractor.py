@@ -1,6 +1,10 @@
 import logging
+import os
+import sys
+import tempfile
 import unittest
 
+from googleapiclient.errors import HttpError
 from mock import patch, Mock
 from pyhocon import ConfigFactory
 
@@ -301,6 +305,89 @@ TAGS = {
     ]
 }
 NO_TAGS = {}
+INFORMATION_SCHEMA_FIELDS = [
+    {"name": "table_name"},
+    {"name": "table_type"},
+    {"name": "table_description"},
+    {"name": "table_labels"},
+    {"name": "column_name"},
+    {"name": "field_path"},
+    {"name": "data_type"},
+    {"name": "description"},
+]
+INFORMATION_SCHEMA_FIRST_PAGE = {
+    "jobReference": {"projectId": "your-project-here", "jobId": "job"},
+    "jobComplete": True,
+    "schema": {"fields": INFORMATION_SCHEMA_FIELDS},
+    "rows": [
+        {"f": [{"v": value} for value in row]}
+        for row in [
+            (
+                "date_range_20190101",
+                "VIEW",
+                '"Table \\"description\\""',
+                '[STRUCT("label_1", "test_label_1")]',
+                "ds",
+                "ds",
+                "DATE",
+                None,
+            ),
+            ("date_range_20190102", "VIEW", None, None, "ds", "ds", "DATE", None),
+            ("test", "BASE TABLE", None, None, "id", "id", "INT64", None),
+        ]
+    ],
+    "pageToken": "token",
+}
+INFORMATION_SCHEMA_LAST_PAGE = {
+    "jobReference": {"projectId": "your-project-here", "jobId": "job"},
+    "jobComplete": True,
+    "schema": {"fields": INFORMATION_SCHEMA_FIELDS},
+    "rows": [
+        {"f": [{"v": value} for value in row]}
+        for row in [
+            (
+                "test",
+                "BASE TABLE",
+                None,
+                None,
+                "nested",
+                "nested",
+                "STRUCT<nested2 STRUCT<ahah STRING>, other BOOL>",
+                "some_description",
+            ),
+            (
+                "test",
+                "BASE TABLE",
+                None,
+                None,
+                "nested",
+                "nested.other",
+                "BOOL",
+                None,
+            ),
+            (
+                "test",
+                "BASE TABLE",
+                None,
+                None,
+                "nested",
+                "nested.nested2",
+                "STRUCT<ahah STRING>",
+                None,
+            ),
+            (
+                "test",
+                "BASE TABLE",
+                None,
+                None,
+                "nested",
+                "nested.nested2.ahah",
+                "STRING",
+                None,
+            ),
+        ]
+    ],
+}
 
 
 try:
@@ -627,3 +714,252 @@ class TestBigQueryMetadataExtractor(unittest.TestCase):
 
         self.assertEqual(count, 1)
         self.assertEqual(table_name, "date_range_")
+
+    @patch("whale.extractor.base_bigquery_extractor.build")
+    @patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+    def test_tables_are_filtered_before_fetching_and_kept_in_order(
+        self, mock_datacatalogue, mock_bigquery
+    ):
+        config_dict = {
+            "extractor.bigquery_table_metadata.{}".format(
+                BigQueryMetadataExtractor.PROJECT_ID_KEY
+            ): "your-project-here",
+            "extractor.bigquery_table_metadata.{}".format(
+                BigQueryMetadataExtractor.INCLUDED_TABLES_REGEX
+            ): ".*(?<!skipped)$",
+            "extractor.bigquery_table_metadata.{}".format(
+                BigQueryMetadataExtractor.MAX_WORKERS_KEY
+            ): 4,
+        }
+        conf = ConfigFactory.from_dict(config_dict)
+        table_ids = [f"table_{i}" if i % 3 else f"table_{i}_skipped" for i in range(12)]
+        table_list = {
+            "tables": [
+                {
+                    "tableReference": {
+                        "projectId": "your-project-here",
+                        "datasetId": "fdgdfgh",
+                        "tableId": table_id,
+                    },
+                    "type": "TABLE",
+                }
+                for table_id in table_ids
+            ]
+        }
+
+        client = MockBigQueryClient(ONE_DATASET, table_list, TABLE_DATA)
+        mock_bigquery.return_value = client
+        mock_datacatalogue.DataCatalogClient.return_value = MockDataCatalogClient(
+            ENTRY, TAGS
+        )
+        extractor = BigQueryMetadataExtractor()
+        extractor.init(Scoped.get_scoped_conf(conf=conf, scope=extractor.get_scope()))
+
+        names = []
+        result = extractor.extract()
+        while result:
+            names.append(result.name)
+            result = extractor.extract()
+
+        expected_names = [name for name in table_ids if not name.endswith("skipped")]
+        self.assertEqual(names, expected_names)
+        fetched_names = [
+            call[1]["tableId"] for call in client.tables_method.get.call_args_list
+        ]
+        self.assertEqual(sorted(fetched_names), sorted(expected_names))
+
+    def get_information_schema_conf(self):
+        return ConfigFactory.from_dict(
+            {
+                "extractor.bigquery_table_metadata.{}".format(
+                    BigQueryMetadataExtractor.PROJECT_ID_KEY
+                ): "your-project-here",
+                "extractor.bigquery_table_metadata.{}".format(
+                    BigQueryMetadataExtractor.IS_INFORMATION_SCHEMA_ENABLED_KEY
+                ): True,
+            }
+        )
+
+    @patch("whale.extractor.base_bigquery_extractor.build")
+    @patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+    def test_information_schema_extraction(self, mock_datacatalogue, mock_bigquery):
+        client = MockBigQueryClient(ONE_DATASET, None, TABLE_DATA)
+        client.jobs = Mock()
+        client.jobs.return_value.query.return_value.execute.return_value = (
+            INFORMATION_SCHEMA_FIRST_PAGE
+        )
+        get_query_results = client.jobs.return_value.getQueryResults
+        get_query_results.return_value.execute.return_value = (
+            INFORMATION_SCHEMA_LAST_PAGE
+        )
+        mock_bigquery.return_value = client
+        mock_datacatalogue.DataCatalogClient.return_value = MockDataCatalogClient(
+            ENTRY, TAGS
+        )
+        extractor = BigQueryMetadataExtractor()
+        extractor.init(
+            Scoped.get_scoped_conf(
+                conf=self.get_information_schema_conf(), scope=extractor.get_scope()
+            )
+        )
+
+        results = []
+        result = extractor.extract()
+        while result:
+            results.append(result)
+            result = extractor.extract()
+
+        # Tables aren't fetched, and later pages are fetched by page token
+        client.tables_method.get.assert_not_called()
+        self.assertEqual(get_query_results.call_args[1]["pageToken"], "token")
+
+        self.assertEqual([result.name for result in results], ["date_range_", "test"])
+        date_range, table = results
+        self.assertEqual(date_range.columns[0].type, "DATE")
+        self.assertEqual(date_range.description, 'Table "description"')
+        self.assertEqual(date_range.labels, {"label_1": "test_label_1"})
+        self.assertEqual(date_range.is_view, True)
+        self.assertEqual(table.description, "")
+        self.assertEqual(
+            [(col.name, col.type, col.description) for col in table.columns],
+            [
+                ("id", "INTEGER", ""),
+                ("nested", "RECORD", "some_description"),
+                ("nested.nested2", "RECORD", ""),
+                ("nested.nested2.ahah", "STRING", ""),
+                ("nested.other", "BOOLEAN", ""),
+            ],
+        )
+        self.assertEqual(table.is_view, False)
+
+    @patch("whale.extractor.base_bigquery_extractor.build")
+    @patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+    def test_information_schema_extraction_falls_back_when_denied(
+        self, mock_datacatalogue, mock_bigquery
+    ):
+        client = MockBigQueryClient(ONE_DATASET, ONE_TABLE, TABLE_DATA)
+        client.jobs = Mock()
+        client.jobs.return_value.query.return_value.execute.side_effect = HttpError(
+            Mock(status=403), b"Access Denied"
+        )
+        mock_bigquery.return_value = client
+        mock_datacatalogue.DataCatalogClient.return_value = MockDataCatalogClient(
+            ENTRY, TAGS
+        )
+        extractor = BigQueryMetadataExtractor()
+        extractor.init(
+            Scoped.get_scoped_conf(
+                conf=self.get_information_schema_conf(), scope=extractor.get_scope()
+            )
+        )
+
+        result = extractor.extract()
+        self.assertEqual(result.name, "nested_recs")
+        self.assertEqual(result.columns[0].name, "test")
+        self.assertIsNone(extractor.extract())
+
+    @patch("whale.extractor.base_bigquery_extractor.build")
+    @patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+    def test_incremental_extraction_skips_unmodified_tables(
+        self, mock_datacatalogue, mock_bigquery
+    ):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        last_modified_times = {
+            "jobReference": {"projectId": "your-project-here", "jobId": "job"},
+            "jobComplete": True,
+            "schema": {
+                "fields": [{"name": "table_id"}, {"name": "last_modified_time"}]
+            },
+            "rows": [{"f": [{"v": "nested_recs"}, {"v": "1557578974009"}]}],
+        }
+
+        def extract(last_modified_time, full_refresh_interval_days=7):
+            last_modified_times["rows"][0]["f"][1]["v"] = last_modified_time
+            client = MockBigQueryClient(ONE_DATASET, ONE_TABLE, TABLE_DATA)
+            client.jobs = Mock()
+            client.jobs.return_value.query.return_value.execute.return_value = (
+                last_modified_times
+            )
+            mock_bigquery.return_value = client
+            mock_datacatalogue.DataCatalogClient.return_value = MockDataCatalogClient(
+                ENTRY, TAGS
+            )
+            conf = ConfigFactory.from_dict(
+                {
+                    BigQueryMetadataExtractor.PROJECT_ID_KEY: "your-project-here",
+                    BigQueryMetadataExtractor.IS_INCREMENTAL_ENABLED_KEY: True,
+                    BigQueryMetadataExtractor.FULL_REFRESH_INTERVAL_DAYS_KEY: (
+                        full_refresh_interval_days
+                    ),
+                    BigQueryMetadataExtractor.STATE_PATH_KEY: os.path.join(
+                        tmp_dir.name, "state.json"
+                    ),
+                }
+            )
+            extractor = BigQueryMetadataExtractor()
+            extractor.init(conf)
+            result = extractor.extract()
+            self.assertIsNone(extractor.extract())
+            return result, client.tables_method.get.call_count
+
+        first_result, n_fetched = extract("1557578974009")
+        self.assertEqual(n_fetched, 1)
+
+        # Unmodified tables are rebuilt from the state
+        result, n_fetched = extract("1557578974009")
+        self.assertEqual(n_fetched, 0)
+        self.assertEqual(repr(result), repr(first_result))
+
+        result, n_fetched = extract("1557578999999")
+        self.assertEqual(n_fetched, 1)
+
+        result, n_fetched = extract("1557578999999", full_refresh_interval_days=0)
+        self.assertEqual(n_fetched, 1)
+
+        # Full refreshes can be turned off altogether
+        result, n_fetched = extract("1557578999999", full_refresh_interval_days=None)
+        self.assertEqual(n_fetched, 0)
+
+    @patch("whale.extractor.base_bigquery_extractor.build")
+    @patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+    def test_deeply_nested_records_with_tags(self, mock_datacatalogue, mock_bigquery):
+        # Deeper than the recursion limit
+        depth = sys.getrecursionlimit() + 10
+        column = {"name": "leaf", "type": "STRING"}
+        for _ in range(depth):
+            column = {"name": "nested", "type": "RECORD", "fields": [column]}
+        table_data = dict(NESTED_DATA, schema={"fields": [column]})
+        leaf_name = ".".join(["nested"] * depth + ["leaf"])
+        tags = {
+            "tags": [
+                {"column": leaf_name, "template": "first"},
+                {"template": "table"},
+                {"column": "nested", "template": "nested"},
+                {"column": leaf_name, "template": "second"},
+            ]
+        }
+
+        mock_bigquery.return_value = MockBigQueryClient(
+            ONE_DATASET, ONE_TABLE, table_data
+        )
+        mock_datacatalogue.DataCatalogClient.return_value = MockDataCatalogClient(
+            ENTRY, tags
+        )
+        extractor = BigQueryMetadataExtractor()
+        extractor.init(
+            Scoped.get_scoped_conf(conf=self.conf, scope=extractor.get_scope())
+        )
+        result = extractor.extract()
+
+        self.assertEqual(len(result.columns), depth + 1)
+        self.assertEqual(result.tags, {"template": "table"})
+        self.assertEqual(
+            result.columns[0].tags, {"column": "nested", "template": "nested"}
+        )
+        self.assertIsNone(result.columns[1].tags)
+        leaf = result.columns[-1]
+        self.assertEqual(leaf.name, leaf_name)
+        self.assertEqual(leaf.sort_order, depth + 1)
+        # The last matching tag wins
+        self.assertEqual(leaf.tags["template"], "second")
@@ -0,0 +1,190 @@
+import datetime
+import unittest
+
+from googleapiclient.errors import HttpError
+from mock import patch, Mock
+from pyhocon import ConfigFactory
+
+from databuilder import Scoped
+from whale.extractor.bigquery_watermark_extractor import BigQueryWatermarkExtractor
+
+
+ONE_DATASET = {
+    "datasets": [
+        {
+            "datasetReference": {
+                "datasetId": "fdgdfgh",
+                "projectId": "your-project-here",
+            },
+        }
+    ],
+}
+TABLES = {
+    "tables": [
+        {
+            "tableReference": {
+                "projectId": "your-project-here",
+                "datasetId": "fdgdfgh",
+                "tableId": table_id,
+            },
+            "type": "TABLE",
+            "timePartitioning": {"type": "DAY", "field": "ds"},
+            "creationTime": "1557578974009",
+        }
+        for table_id in ["partitioned", "other_partitioned", "empty_partitioned"]
+    ]
+    + [
+        {
+            "tableReference": {
+                "projectId": "your-project-here",
+                "datasetId": "fdgdfgh",
+                "tableId": "unpartitioned",
+            },
+            "type": "TABLE",
+            "creationTime": "1557578974009",
+        }
+    ],
+}
+PARTITIONS = {
+    "jobReference": {"projectId": "your-project-here", "jobId": "job"},
+    "jobComplete": True,
+    "schema": {
+        "fields": [
+            {"name": "table_name"},
+            {"name": "low_partition_id"},
+            {"name": "low_modified_time"},
+            {"name": "high_partition_id"},
+            {"name": "high_modified_time"},
+        ]
+    },
+    "rows": [
+        {"f": [{"v": value} for value in row]}
+        for row in [
+            ("partitioned", "20200101", "1577836800000", "20200201", "1580515200000"),
+            (
+                "other_partitioned",
+                "20200301",
+                "1583020800000",
+                "20200301",
+                "1583020800000",
+            ),
+        ]
+    ],
+}
+PARTITIONS_SUMMARY = {
+    "rows": [
+        {"f": [{"v": "20200201"}, {"v": "1580515200.0"}]},
+        {"f": [{"v": "20200101"}, {"v": "1577836800.0"}]},
+    ]
+}
+
+
+def get_create_time(epoch_seconds):
+    return datetime.datetime.fromtimestamp(epoch_seconds).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@patch("google.auth.default", lambda scopes: ["dummy", "dummy"])
+@patch("whale.extractor.base_bigquery_extractor.datacatalog_v1")
+@patch("whale.extractor.base_bigquery_extractor.build")
+class TestBigQueryWatermarkExtractor(unittest.TestCase):
+    def setUp(self):
+        self.conf = ConfigFactory.from_dict(
+            {
+                "extractor.bigquery_watermarks.{}".format(
+                    BigQueryWatermarkExtractor.PROJECT_ID_KEY
+                ): "your-project-here",
+            }
+        )
+
+    def get_client(self, query_result):
+        client = Mock()
+        client.datasets.return_value.list.return_value.execute.return_value = (
+            ONE_DATASET
+        )
+        client.tables.return_value.list.return_value.execute.return_value = TABLES
+        query_execute = client.jobs.return_value.query.return_value.execute
+        if isinstance(query_result, Exception):
+            query_execute.side_effect = query_result
+        else:
+            query_execute.return_value = query_result
+        return client
+
+    def extract_all(self):
+        extractor = BigQueryWatermarkExtractor()
+        extractor.init(
+            Scoped.get_scoped_conf(conf=self.conf, scope=extractor.get_scope())
+        )
+        results = []
+        result = extractor.extract()
+        while result:
+            results.append(result)
+            result = extractor.extract()
+        return results
+
+    def test_partitions_are_queried_once_per_dataset(
+        self, mock_bigquery, mock_datacatalogue
+    ):
+        client = self.get_client(PARTITIONS)
+        mock_bigquery.return_value = client
+
+        results = self.extract_all()
+
+        client.jobs.return_value.query.assert_called_once()
+        body = client.jobs.return_value.query.call_args[1]["body"]
+        self.assertIn("`your-project-here.fdgdfgh`.INFORMATION_SCHEMA", body["query"])
+        self.assertFalse(body["useLegacySql"])
+        self.assertEqual(
+            [(r.table, r.part_type, r.parts, r.create_time) for r in results],
+            [
+                (
+                    "partitioned",
+                    "low_watermark",
+                    [("ds", "20200101")],
+                    get_create_time(1577836800),
+                ),
+                (
+                    "partitioned",
+                    "high_watermark",
+                    [("ds", "20200201")],
+                    get_create_time(1580515200),
+                ),
+                (
+                    "other_partitioned",
+                    "low_watermark",
+                    [("ds", "20200301")],
+                    get_create_time(1583020800),
+                ),
+                (
+                    "other_partitioned",
+                    "high_watermark",
+                    [("ds", "20200301")],
+                    get_create_time(1583020800),
+                ),
+            ],
+        )
+
+    def test_falls_back_to_querying_each_table(self, mock_bigquery, mock_datacatalogue):
+        client = self.get_client(HttpError(Mock(status=403), b"Access Denied"))
+        legacy_query = Mock()
+        legacy_query.execute.return_value = PARTITIONS_SUMMARY
+
+        def query(projectId, body):
+            if body["useLegacySql"]:
+                return legacy_query
+            return client.jobs.return_value.query.return_value
+
+        client.jobs.return_value.query.side_effect = query
+        mock_bigquery.return_value = client
+
+        results = self.extract_all()
+
+        # One query for the dataset, then one for each partitioned table
+        self.assertEqual(client.jobs.return_value.query.call_count, 4)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(
+            [(r.part_type, r.parts) for r in results[:2]],
+            [
+                ("low_watermark", [("ds", "20200101")]),
+                ("high_watermark", [("ds", "20200201")]),
+            ],
+        )
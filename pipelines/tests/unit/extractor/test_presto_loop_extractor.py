@@ -1,5 +1,8 @@
 import logging
 import os
+import tempfile
+import threading
+import time
 import unittest
 
 from mock import patch, MagicMock
@@ -8,6 +11,7 @@ from pyhocon import ConfigFactory
 from whale.extractor.presto_loop_extractor import PrestoLoopExtractor
 from whale.engine.sql_alchemy_engine import SQLAlchemyEngine
 from whale.models.table_metadata import ColumnMetadata, TableMetadata
+from whale.utils import get_table_file_path_relative
 
 
 MOCK_SCHEMA_NAME = "mock_schema"
@@ -15,22 +19,35 @@ MOCK_TABLE_NAME = "mock_table"
 MOCK_COLUMN_RESULT = ("ds", "varchar(64)", "partition key", "")
 
 
-def presto_engine_execute_side_effect(query, has_header=True):
+def get_information_schema_rows(tables):
+    for table in tables:
+        yield {
+            "table_name": table,
+            "column_name": MOCK_COLUMN_RESULT[0],
+            "data_type": MOCK_COLUMN_RESULT[1],
+            "extra_info": MOCK_COLUMN_RESULT[2],
+            "comment": MOCK_COLUMN_RESULT[3],
+            "table_type": "BASE TABLE",
+        }
+
+
+def presto_engine_execute_side_effect(query, has_header=True, **kwargs):
     query = query.lower()
     if query == "show schemas":
         yield (MOCK_SCHEMA_NAME,)
     elif query == "show tables in {}".format(MOCK_SCHEMA_NAME):
         yield (MOCK_TABLE_NAME,)
-    elif query == "show columns in {}.{}".format(MOCK_SCHEMA_NAME, MOCK_TABLE_NAME):
-        yield ["Column", "Type", "Extra", "Comment"]
-        yield MOCK_COLUMN_RESULT
+    elif "information_schema.columns" in query:
+        yield from get_information_schema_rows([MOCK_TABLE_NAME])
 
 
-@patch.object(os.path, "exists")
 @patch.object(SQLAlchemyEngine, "_get_connection")
 class TestPrestoLoopExtractor(unittest.TestCase):
     def setUp(self) -> None:
         logging.basicConfig(level=logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmp_dir.name, "manifest.txt")
+        self.write_manifest(MOCK_SCHEMA_NAME, [MOCK_TABLE_NAME])
 
         config_dict = {
             "conn_string": "TEST_CONNECTION",
@@ -39,10 +56,21 @@ class TestPrestoLoopExtractor(unittest.TestCase):
             "is_watermark_enabled": False,
             "is_stats_enabled": False,
             "is_analyze_enabled": False,
+            "manifest_path": self.manifest_path,
         }
         self.conf = ConfigFactory.from_dict(config_dict)
 
-    def test_extraction_with_empty_result(self, mock1, mock2) -> None:
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_manifest(self, schema, tables):
+        with open(self.manifest_path, "w") as f:
+            for table in tables:
+                f.write(
+                    get_table_file_path_relative("presto", None, schema, table) + "\n"
+                )
+
+    def test_extraction_with_empty_result(self, mock1) -> None:
         """
         Test Extraction with empty result from query.
         """
@@ -52,7 +80,7 @@ class TestPrestoLoopExtractor(unittest.TestCase):
         results = extractor.extract()
         self.assertEqual(results, None)
 
-    def test_table_metadata_extraction_with_single_result(self, mock1, mock2) -> None:
+    def test_table_metadata_extraction_with_single_result(self, mock1) -> None:
         extractor = PrestoLoopExtractor()
         conf = self.conf.copy()
         conf.put("is_table_metadata_enabled", True)
@@ -79,3 +107,44 @@ class TestPrestoLoopExtractor(unittest.TestCase):
             ],
         )
         self.assertEqual(results.__repr__(), expected.__repr__())
+
+    def test_tables_are_extracted_concurrently_in_order(self, mock1) -> None:
+        tables = [f"table_{i}" for i in range(8)]
+        # Tables without a stub are skipped
+        self.write_manifest(MOCK_SCHEMA_NAME, tables[:6])
+        thread_names = set()
+        queried_batches = []
+
+        def execute(query, has_header=True, **kwargs):
+            query = query.lower()
+            if query == "show schemas":
+                yield (MOCK_SCHEMA_NAME,)
+            elif query == "show tables in {}".format(MOCK_SCHEMA_NAME):
+                yield from ((table,) for table in tables)
+            elif "information_schema.columns" in query:
+                thread_names.add(threading.current_thread().name)
+                batch = [table for table in tables if "'{}'".format(table) in query]
+                queried_batches.append(batch)
+                # Earlier batches take longer
+                time.sleep(0.01 * (8 - int(batch[0][-1])))
+                yield from get_information_schema_rows(batch)
+
+        extractor = PrestoLoopExtractor()
+        conf = self.conf.copy()
+        conf.put("is_table_metadata_enabled", True)
+        conf.put("max_workers", 4)
+        conf.put("batch_size", 2)
+        extractor.init(conf)
+        extractor.execute = MagicMock(side_effect=execute)
+
+        results = []
+        result = extractor.extract()
+        while result is not None:
+            results.append(result.name)
+            result = extractor.extract()
+        self.assertEqual(results, tables[:6])
+        # Tables are queried in batches, rather than one at a time
+        self.assertEqual(
+            sorted(queried_batches), [tables[0:2], tables[2:4], tables[4:6]]
+        )
+        self.assertGreater(len(thread_names), 1)
@@ -4,9 +4,11 @@ import unittest
 import pytest
 import yaml
 import tempfile
+import threading
+import time
 
 from slack_sdk import WebClient
-from mock import patch, call
+from mock import patch, call, Mock
 from pyhocon import ConfigFactory
 from databuilder import Scoped
 
@@ -182,6 +184,92 @@ class TestMetricRunner(unittest.TestCase):
         ]
         mock_slack_client.assert_has_calls(calls, any_order=True)
 
+    def test_runs_metrics_concurrently_and_skips_slow_metrics(
+        self,
+        mock_execution,
+        get_connection,
+        mock_slack_client,
+    ):
+        def execute(query, is_dict_return_enabled=False):
+            if "slow" in query:
+                time.sleep(1)
+            return [(len(query),)]
+
+        mock_execution.side_effect = execute
+
+        loader = whale_loader.WhaleLoader()
+        loader.init(self.loader_config)
+        loader.load(self.record)
+
+        self.add_metrics_and_alerts_to_markdown("fast-1", "select 1")
+        self.add_metrics_and_alerts_to_markdown("slow", "select slow")
+        self.add_metrics_and_alerts_to_markdown("fast-2", "select 2")
+
+        self.extractor_config.put(UGCRunner.MAX_WORKERS_KEY, 2)
+        self.extractor_config.put(UGCRunner.QUERY_TIMEOUT_KEY, 0.2)
+        extractor = UGCRunner()
+        extractor.init(self.extractor_config)
+
+        metric_names = []
+        metric_value = extractor.extract()
+        while metric_value is not None:
+            metric_names.append(metric_value.name)
+            metric_value = extractor.extract()
+
+        assert metric_names == ["fast-1", "fast-2"]
+        assert mock_execution.call_count == 3
+        # The slow query is cancelled, as the driver supports it
+        get_connection.return_value.connection.cancel.assert_called_once()
+
+    def test_leaves_uncancellable_queries_to_finish_on_their_own_connection(
+        self,
+        mock_execution,
+        get_connection,
+        mock_slack_client,
+    ):
+        is_released = threading.Event()
+
+        def execute(query, is_dict_return_enabled=False):
+            if "slow" in query:
+                is_released.wait(5)
+            return [(len(query),)]
+
+        mock_execution.side_effect = execute
+        # Drivers without `cancel`
+        connections = []
+
+        def get_new_connection():
+            connections.append(Mock(spec=["close", "connection"]))
+            connections[-1].connection = object()
+            return connections[-1]
+
+        get_connection.side_effect = get_new_connection
+
+        loader = whale_loader.WhaleLoader()
+        loader.init(self.loader_config)
+        loader.load(self.record)
+
+        self.add_metrics_and_alerts_to_markdown("slow", "select slow")
+        self.add_metrics_and_alerts_to_markdown("fast", "select 1")
+
+        self.extractor_config.put(UGCRunner.QUERY_TIMEOUT_KEY, 0.2)
+        extractor = UGCRunner()
+        extractor.init(self.extractor_config)
+
+        # The only worker is held up by the slow query, so the fast one can't
+        # start in time either
+        assert extractor.extract() is None
+        worker_connection = connections[-1]
+        assert connections[0].close.called
+        assert not worker_connection.close.called
+
+        is_released.set()
+        for _ in range(50):
+            if worker_connection.close.called:
+                break
+            time.sleep(0.1)
+        worker_connection.close.assert_called_once()
+
     def add_metrics_and_alerts_to_markdown(
         self,
         metric_name,
@@ -19,6 +19,7 @@ def mock_whale_dir(monkeypatch, tmp_path, request):
         "LOGS_DIR": paths.LOGS_DIR,
         "MANIFEST_DIR": paths.MANIFEST_DIR,
         "MANIFEST_PATH": paths.MANIFEST_PATH,
+        "TMP_MANIFEST_PATH": paths.TMP_MANIFEST_PATH,
         "METRICS_PATH": paths.METRICS_PATH,
         "METADATA_PATH": paths.METADATA_PATH,
         "MACROS_DIR": paths.MACROS_DIR,
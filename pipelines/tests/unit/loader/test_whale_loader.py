@@ -3,13 +3,22 @@ import os
 import unittest
 import pytest
 
+from mock import patch
+
 from pyhocon import ConfigFactory
 from typing import Dict, Iterable, Any, Callable  # noqa: F401
 
+from databuilder.models.watermark import Watermark
+
+from whale.models.column_metadata import ColumnMetadata
 from whale.models.table_metadata import TableMetadata
 from whale.models.index_metadata import TableIndexesMetadata, IndexMetadata
 from whale.loader import whale_loader
 from whale.utils import paths
+from whale.utils import metric_index
+from whale.utils.catalog import Catalog
+from whale.utils.metric_index import MetricIndex
+from whale.utils.result_cache import get_watermarks
 
 
 @pytest.fixture
@@ -108,3 +117,215 @@ def test_load_index_metadata(patched_config):
     assert "mock_catalog" in written_record
     assert "mock_database" in written_record
     assert "mock_index" in written_record
+
+
+def test_buffered_load_writes_each_table_once(patched_config):
+    patched_config.put(whale_loader.WhaleLoader.IS_BUFFERING_ENABLED_KEY, True)
+    index_records = [
+        TableIndexesMetadata(
+            database="mock_database",
+            cluster=None,
+            schema="mock_schema",
+            table=table,
+            indexes=[IndexMetadata(name=f"{table}_index", columns=["id"])],
+        )
+        for table in ["mock_table_1", "mock_table_1", "mock_table_2"]
+    ]
+
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    with patch.object(
+        whale_loader,
+        "update_markdown_from_records",
+        wraps=whale_loader.update_markdown_from_records,
+    ) as mock_update:
+        for record in index_records:
+            loader.load(record)
+        # Moving on to mock_table_2 flushes mock_table_1
+        assert mock_update.call_count == 1
+        assert len(mock_update.call_args[0][1]) == 2
+
+        loader.close()
+        assert mock_update.call_count == 2
+
+    file_path = os.path.join(
+        patched_config.get("base_directory"),
+        "mock_database/mock_schema.mock_table_2.md",
+    )
+    with open(file_path, "r") as f:
+        written_record = f.read()
+
+    assert "mock_table_2_index" in written_record
+
+
+def test_buffered_load_flushes_at_buffer_size(patched_config):
+    patched_config.put(whale_loader.WhaleLoader.IS_BUFFERING_ENABLED_KEY, True)
+    patched_config.put(whale_loader.WhaleLoader.BUFFER_SIZE_KEY, 2)
+    record = TableMetadata(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        name="mock_table",
+    )
+
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    with patch.object(whale_loader, "update_markdown_from_records") as mock_update:
+        for _ in range(5):
+            loader.load(record)
+        assert mock_update.call_count == 2
+
+        loader.close()
+        assert mock_update.call_count == 3
+
+
+def test_manifest_is_deduplicated_and_written_on_close(patched_config):
+    records = [
+        TableMetadata(
+            database="mock_database",
+            cluster=None,
+            schema="mock_schema",
+            name=name,
+        )
+        for name in ["mock_table_2", "mock_table_1", "mock_table_2"]
+    ]
+
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    for record in records:
+        loader.load(record)
+
+    tmp_manifest_path = patched_config.get("tmp_manifest_path")
+    assert not os.path.exists(tmp_manifest_path)
+
+    loader.close()
+    with open(tmp_manifest_path, "r") as f:
+        manifest = f.read().splitlines()
+
+    assert manifest == [
+        "mock_database/mock_schema.mock_table_2",
+        "mock_database/mock_schema.mock_table_1",
+    ]
+
+
+def test_fingerprinting_skips_unchanged_tables(patched_config, tmp_path):
+    patched_config.put(whale_loader.WhaleLoader.IS_FINGERPRINTING_ENABLED_KEY, True)
+    patched_config.put(
+        whale_loader.WhaleLoader.FINGERPRINTS_PATH_KEY,
+        str(tmp_path / "fingerprints.json"),
+    )
+    record = TableMetadata(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        name="mock_table",
+    )
+    file_path = os.path.join(
+        patched_config.get("base_directory"), "mock_database/mock_schema.mock_table.md"
+    )
+
+    def load():
+        loader = whale_loader.WhaleLoader()
+        loader.init(patched_config)
+        loader.load(record)
+        loader.close()
+
+    with patch.object(
+        whale_loader,
+        "update_markdown_from_records",
+        wraps=whale_loader.update_markdown_from_records,
+    ) as mock_update:
+        load()
+        load()
+        assert mock_update.call_count == 1
+
+        # Editing the stub by hand invalidates its fingerprints
+        with open(file_path, "a") as f:
+            f.write("\nSome notes.\n")
+        load()
+        assert mock_update.call_count == 2
+
+    with open(file_path, "r") as f:
+        assert "Some notes." in f.read()
+
+
+def test_catalog_is_updated_on_load(patched_config, tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite3")
+    patched_config.put(whale_loader.WhaleLoader.IS_CATALOG_ENABLED_KEY, True)
+    patched_config.put(whale_loader.WhaleLoader.CATALOG_PATH_KEY, catalog_path)
+    record = TableMetadata(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        name="mock_table",
+        columns=[ColumnMetadata("id", None, "integer", 0)],
+    )
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    loader.load(record)
+    loader.close()
+
+    columns = Catalog(catalog_path).find_columns_by_name("id")
+    assert [column["table_key"] for column in columns] == [
+        "mock_database/mock_schema.mock_table"
+    ]
+
+
+def test_metric_index_is_updated_on_write(patched_config, tmp_path):
+    index_path = str(tmp_path / "metric_index.json")
+    patched_config.put(whale_loader.WhaleLoader.IS_METRIC_INDEX_ENABLED_KEY, True)
+    patched_config.put(whale_loader.WhaleLoader.METRIC_INDEX_PATH_KEY, index_path)
+    record = TableMetadata(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        name="mock_table",
+    )
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    loader.load(record)
+    loader.close()
+
+    file_path = os.path.join(
+        patched_config.get("base_directory"), "mock_database/mock_schema.mock_table.md"
+    )
+    index = MetricIndex(index_path)
+    with patch.object(metric_index, "sections_from_markdown") as mock_parse:
+        assert index.get_metrics(file_path) == []
+        assert mock_parse.call_count == 0
+
+
+def test_loaded_watermarks_are_found_by_connection_name(patched_config, tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite3")
+    patched_config.put("database_name", "warehouse")
+    patched_config.put(whale_loader.WhaleLoader.IS_CATALOG_ENABLED_KEY, True)
+    patched_config.put(whale_loader.WhaleLoader.CATALOG_PATH_KEY, catalog_path)
+    loader = whale_loader.WhaleLoader()
+    loader.init(patched_config)
+    # Extractors set the warehouse type, rather than the connection name
+    loader.load(
+        TableMetadata(
+            database="postgres",
+            cluster=None,
+            schema="mock_schema",
+            name="mock_table",
+            columns=[ColumnMetadata("ds", None, "varchar", 0)],
+        )
+    )
+    loader.load(
+        Watermark(
+            create_time="2020-01-01",
+            database="postgres",
+            schema="mock_schema",
+            table_name="mock_table",
+            part_name="ds=2020-01-01",
+            part_type="high_watermark",
+            cluster=None,
+        )
+    )
+    loader.close()
+
+    assert get_watermarks(
+        "warehouse", "select * from mock_schema.mock_table", catalog_path
+    ) == [["warehouse/mock_schema.mock_table", "high", "ds", "2020-01-01"]]
+    assert get_watermarks("postgres", "select * from mock_table", catalog_path) == []
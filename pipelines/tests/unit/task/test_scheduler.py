@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from whale.task.scheduler import Scheduler
+
+
+def test_dependencies_run_before_dependents():
+    order = []
+    scheduler = Scheduler(max_workers=4)
+    scheduler.add_job("metadata", lambda: order.append("metadata"))
+    scheduler.add_job(
+        "metrics", lambda: order.append("metrics"), dependencies=["metadata"]
+    )
+    scheduler.add_job(
+        "indexes", lambda: order.append("indexes"), dependencies=["metadata"]
+    )
+    scheduler.run()
+
+    assert order[0] == "metadata"
+    assert set(order[1:]) == {"metrics", "indexes"}
+
+
+def test_group_concurrency_is_capped():
+    lock = threading.Lock()
+    counts = {"running": 0, "max_running": 0}
+
+    def job():
+        with lock:
+            counts["running"] += 1
+            counts["max_running"] = max(counts["max_running"], counts["running"])
+        time.sleep(0.02)
+        with lock:
+            counts["running"] -= 1
+
+    scheduler = Scheduler(max_workers=8)
+    scheduler.add_group("warehouse", concurrency=2)
+    for i in range(6):
+        scheduler.add_job(f"job_{i}", job, group="warehouse")
+    scheduler.run()
+
+    assert counts["max_running"] == 2
+
+
+def test_failed_required_job_skips_dependents_and_raises():
+    ran = []
+
+    def fail():
+        raise RuntimeError("metadata failed")
+
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add_job("a:metadata", fail)
+    scheduler.add_job("a:metrics", lambda: ran.append("a"), dependencies=["a:metadata"])
+    scheduler.add_job("b:metadata", lambda: ran.append("b"))
+
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+
+    assert ran == ["b"]
+    assert "a:metrics" in scheduler.skipped
+
+
+def test_failed_optional_job_does_not_raise():
+    def fail():
+        raise RuntimeError("metrics failed")
+
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add_job("metadata", lambda: None)
+    scheduler.add_job("metrics", fail, dependencies=["metadata"], is_required=False)
+    scheduler.run()
+
+    assert "metrics" in scheduler.failed
+    assert "metadata" in scheduler.succeeded
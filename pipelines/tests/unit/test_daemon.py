@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import socket
+import threading
+import warnings
+
+from mock import patch
+
+from whale import daemon
+
+
+def send_request(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("r", encoding="utf-8") as f:
+            return json.loads(f.readline())
+
+
+@patch.object(daemon, "run_file")
+def test_daemon_runs_requests(mock_run_file, tmp_path):
+    mock_run_file.side_effect = [" id\n0 1", ValueError("Bad query.")]
+    socket_path = tmp_path / "daemon.sock"
+    server = daemon.create_server(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        assert daemon.is_daemon_running(socket_path)
+        assert daemon.create_server(socket_path) is None
+        assert oct(os.stat(socket_path).st_mode & 0o777) == oct(0o600)
+
+        response = send_request(socket_path, {"filename": "query.sql"})
+        assert response == {"output": " id\n0 1", "error": None, "logs": []}
+        mock_run_file.assert_called_with("query.sql", None)
+
+        response = send_request(
+            socket_path, {"filename": "query.sql", "warehouse_name": "warehouse"}
+        )
+        assert "Bad query." in response["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@patch.object(daemon, "run_file")
+def test_daemon_returns_warnings_with_responses(mock_run_file, tmp_path):
+    def run_file(filename, warehouse_name):
+        logging.getLogger("whale").warning("Results truncated.")
+        logging.getLogger("whale").info("Not shown.")
+        warnings.warn("Deprecated.")
+        return ""
+
+    mock_run_file.side_effect = run_file
+    socket_path = tmp_path / "daemon.sock"
+    server = daemon.create_server(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        for _ in range(2):
+            logs = send_request(socket_path, {"filename": "query.md"})["logs"]
+            assert len(logs) == 2
+            assert logs[0] == "Results truncated."
+            assert "UserWarning: Deprecated." in logs[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    stale_server = daemon.create_server(socket_path)
+    stale_server.socket.close()
+
+    assert not daemon.is_daemon_running(socket_path)
+    server = daemon.create_server(socket_path)
+    assert server is not None
+    server.server_close()
@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+
+# Generous, so that this only fails if something heavy is imported eagerly
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+LAZY_MODULES = [
+    "boto3",
+    "databuilder.task",
+    "google.cloud.datacatalog_v1",
+    "google.cloud.spanner",
+    "googleapiclient",
+    "neo4j",
+    "splicemachinesa",
+    "whale.loader.whale_loader",
+]
+
+
+def import_whale() -> dict:
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import whale\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start,"
+        " 'modules': list(sys.modules)}))\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", script])
+    return json.loads(output.decode("utf-8").splitlines()[-1])
+
+
+def test_import_whale_does_not_import_extractors():
+    modules = import_whale()["modules"]
+    for module in LAZY_MODULES:
+        assert module not in modules
+
+
+def test_import_whale_is_within_budget():
+    # The best of a few runs, to discount a cold disk cache
+    seconds = min(import_whale()["seconds"] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS
@@ -1,9 +1,18 @@
 import pandas as pd
 import pytest
 from mock import patch
+from pyhocon import ConfigFactory
 from whale.engine.sql_alchemy_engine import SQLAlchemyEngine
 from whale.models.connection_config import ConnectionConfigSchema
-from whale import run, pull, execute_markdown_sql_blocks, EXECUTION_FLAG
+from whale.utils.result_cache import ResultCache
+from whale import (
+    run,
+    run_chunks,
+    pull,
+    embed_results_as_comment,
+    execute_markdown_sql_blocks,
+    EXECUTION_FLAG,
+)
 from .fixtures import mock_whale_dir
 import whale
 
@@ -26,6 +35,53 @@ def test_run(mock_execution, get_connection, _):
     assert "hi" in df.columns
 
 
+@patch("google.auth.default", lambda scopes: ["dummy", "dummy"])
+@patch.object(whale, "template_query")
+@patch.object(whale, "get_connection")
+@patch.object(SQLAlchemyEngine, "execute")
+def test_run_chunks_stops_at_row_budget(mock_execution, get_connection, _):
+    mock_execution.return_value = iter([["id"]] + [[i] for i in range(25)])
+    get_connection.return_value = ConnectionConfigSchema(metadata_source="bigquery")
+
+    chunks = list(run_chunks("select id from table", chunk_size=10, max_rows=15))
+    assert [len(chunk) for chunk in chunks] == [10, 5]
+    assert list(pd.concat(chunks)["id"]) == list(range(15))
+
+
+@patch.object(whale, "get_watermarks")
+@patch.object(whale, "get_engine")
+@patch.object(whale, "template_query")
+@patch.object(whale, "get_connection")
+def test_run_reuses_cached_results(
+    get_connection, mock_template_query, get_engine, get_watermarks, tmp_path
+):
+    get_connection.return_value = ConnectionConfigSchema(
+        metadata_source="postgres", name="warehouse"
+    )
+    mock_template_query.side_effect = lambda sql, **kwargs: sql
+    mock_execute = get_engine.return_value.execute
+    mock_execute.side_effect = lambda *args, **kwargs: iter([["id"], [0]])
+    get_watermarks.return_value = [["warehouse/schema.table", "high", "ds", "1"]]
+
+    sql = f"select id from schema.table{EXECUTION_FLAG}"
+    with patch.object(
+        whale, "ResultCache", lambda **kwargs: ResultCache(tmp_path, **kwargs)
+    ):
+        first_results = run(sql, use_cache=True)
+        cached_results = run(sql, use_cache=True)
+        assert mock_execute.call_count == 1
+        assert list(cached_results["id"]) == [0]
+
+        # The embedded comment shows when the query actually ran
+        execution_time = first_results.attrs["execution_time"]
+        assert cached_results.attrs["execution_time"] == execution_time
+        assert str(execution_time) in embed_results_as_comment(sql, cached_results)
+
+        get_watermarks.return_value = [["warehouse/schema.table", "high", "ds", "2"]]
+        run(sql, use_cache=True)
+        assert mock_execute.call_count == 2
+
+
 def test_pull_without_files(mock_whale_dir):
     pull()
 
@@ -65,3 +121,33 @@ select
 
     assert MOCK_SQL_RESULTS.to_string() in contents
     assert EXECUTION_FLAG not in contents
+
+
+@patch.object(whale, "_run_task")
+def test_metadata_task_leaves_manifest_to_later_tasks(mock_run_task, tmp_path):
+    connection_manifest_path = str(tmp_path / "manifest.0.txt")
+    with open(connection_manifest_path, "w") as f:
+        f.write("warehouse/schema.table.md\n")
+    conf = ConfigFactory.from_dict({whale.MANIFEST_KEY: connection_manifest_path})
+    hand_offs = []
+
+    whale._run_metadata_task(None, conf, connection_manifest_path, hand_offs.append)
+
+    assert hand_offs == [connection_manifest_path]
+    # Later extractors of the connection append to its own manifest
+    assert conf.get(whale.MANIFEST_KEY) == connection_manifest_path
+
+
+def test_chunks_are_concatenated_with_dtypes_inferred_from_all_rows():
+    rows = [(None, "a")] * 3 + [(1, "b")] * 2
+    columns = ["value", "value"]
+    chunks = [
+        pd.DataFrame.from_records(rows[:3], columns=columns, coerce_float=True),
+        pd.DataFrame.from_records(rows[3:], columns=columns, coerce_float=True),
+    ]
+
+    results = whale._concat_chunks(chunks)
+
+    expected = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    assert results.dtypes.tolist() == expected.dtypes.tolist()
+    assert results.iloc[:, 0].tolist()[3:] == [1.0, 1.0]
@@ -0,0 +1,106 @@
+from databuilder.models.watermark import Watermark
+
+from whale.models.column_metadata import ColumnMetadata
+from whale.models.index_metadata import TableIndexesMetadata, IndexMetadata
+from whale.models.metric_value import MetricValue
+from whale.models.table_metadata import TableMetadata
+from whale.utils.catalog import Catalog
+
+TABLE_KEY = "mock_database/mock_schema.mock_table"
+
+
+def get_table_metadata(columns):
+    return TableMetadata(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        name="mock_table",
+        description="A mock table.",
+        columns=columns,
+    )
+
+
+def test_upsert_and_get_table(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    catalog.upsert(
+        TABLE_KEY,
+        get_table_metadata(
+            [
+                ColumnMetadata("id", None, "integer", 0),
+                ColumnMetadata("name", "The name.", "varchar", 1),
+            ]
+        ),
+    )
+    catalog.upsert(
+        TABLE_KEY,
+        TableIndexesMetadata(
+            database="mock_database",
+            cluster=None,
+            schema="mock_schema",
+            table="mock_table",
+            indexes=[
+                IndexMetadata(name="pk", columns=["id"], constraint="primary key")
+            ],
+        ),
+    )
+    catalog.upsert(
+        TABLE_KEY,
+        Watermark(
+            create_time="2020-01-01",
+            database="mock_database",
+            schema="mock_schema",
+            table_name="mock_table",
+            part_name="ds=2020-01-01",
+            part_type="high_watermark",
+        ),
+    )
+    catalog.upsert(
+        TABLE_KEY,
+        MetricValue(
+            database="mock_database",
+            cluster=None,
+            schema="mock_schema",
+            table="mock_table",
+            execution_time="2020-01-01 00:00:00",
+            name="row_count",
+            value=10,
+        ),
+    )
+    assert catalog.get_table(TABLE_KEY) is None
+    catalog.close()
+
+    table = Catalog(tmp_path / "catalog.sqlite3").get_table(TABLE_KEY)
+    assert table["name"] == "mock_table"
+    assert table["description"] == "A mock table."
+    assert table["is_view"] is False
+    assert [column["name"] for column in table["columns"]] == ["id", "name"]
+    assert table["indexes"][0]["columns"] == ["id"]
+    assert table["indexes"][0]["constraint_type"] == "primary key"
+    assert table["watermarks"] == [
+        {"part_type": "high", "part_name": "ds", "part_value": "2020-01-01"}
+    ]
+    assert table["metrics"][0]["value"] == "10"
+
+
+def test_upsert_replaces_dropped_columns(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.sqlite3")
+    catalog.upsert(
+        TABLE_KEY,
+        get_table_metadata(
+            [
+                ColumnMetadata("id", None, "integer", 0),
+                ColumnMetadata("dropped", None, "integer", 1),
+            ]
+        ),
+    )
+    catalog.commit()
+    catalog.upsert(
+        TABLE_KEY, get_table_metadata([ColumnMetadata("id", None, "bigint", 0)])
+    )
+    catalog.commit()
+
+    assert catalog.find_columns_by_name("dropped") == []
+    assert catalog.find_columns_by_type("integer") == []
+    assert [
+        column["table_key"] for column in catalog.find_columns_by_type("bigint")
+    ] == [TABLE_KEY]
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from whale.utils import paths
+from whale.utils.config import get_connection, read_config, read_connections
+
+CONNECTIONS = """
+name: first
+metadata_source: postgres
+uri: localhost
+---
+name: second
+metadata_source: snowflake
+account: account
+"""
+
+
+def write_file(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    # Make sure the mtime changes, however coarse the filesystem's clock
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + int(1e9)))
+
+
+@pytest.fixture()
+def connection_path(monkeypatch, tmp_path):
+    connection_path = tmp_path / "connections.yaml"
+    monkeypatch.setattr(paths, "CONNECTION_PATH", connection_path)
+    write_file(connection_path, CONNECTIONS)
+    return connection_path
+
+
+def test_get_connection_reuses_connections(connection_path):
+    connection = get_connection("second")
+    assert connection.conn_string == "snowflake://@account/"
+    assert get_connection("second") is connection
+    assert get_connection().name == "first"
+
+    with pytest.raises(AttributeError):
+        connection.name = "third"
+    # Callers get copies of the raw connections
+    read_connections()[0]["name"] = "third"
+    assert get_connection().name == "first"
+
+
+def test_get_connection_picks_up_edits(connection_path):
+    connection = get_connection("second")
+    write_file(connection_path, CONNECTIONS.replace("account: account", "uri: uri"))
+    assert get_connection("second") is not connection
+    assert get_connection("second").conn_string == "snowflake://@uri/"
+
+    os.remove(connection_path)
+    with pytest.raises(Exception):
+        get_connection("second")
+
+
+def test_read_config_picks_up_edits(monkeypatch, tmp_path):
+    config_path = tmp_path / "config.yaml"
+    monkeypatch.setattr(paths, "CONFIG_PATH", config_path)
+    assert read_config("key", "default") == "default"
+
+    write_file(config_path, "key: value")
+    assert read_config("key", "default") == "value"
+    write_file(config_path, "key: other_value")
+    assert read_config("key", "default") == "other_value"
@@ -0,0 +1,46 @@
+from whale.utils.extraction_state import ExtractionState
+
+
+def test_complete_extraction_drops_unseen_entries(tmp_path):
+    state_path = tmp_path / "state.json"
+    state = ExtractionState(state_path)
+    state.update("a", {"value": 1})
+    state.update("b", {"value": 2})
+    state.save(is_complete=True)
+
+    state = ExtractionState(state_path)
+    assert state.get("a") == {"value": 1}
+    state.update("a", {"value": 3})
+    state.save()
+    # Incomplete extractions keep entries that weren't seen
+    state = ExtractionState(state_path)
+    assert state.get("a") == {"value": 3}
+    assert state.get("b") == {"value": 2}
+
+    state.update("b", {"value": 4})
+    state.save(is_complete=True)
+    state = ExtractionState(state_path)
+    assert state.get("a") is None
+    assert state.get("b") == {"value": 4}
+
+
+def test_entries_that_cant_be_saved_are_skipped(tmp_path):
+    state = ExtractionState(tmp_path / "state.json")
+    state.update("a", {"value": object()})
+    state.save(is_complete=True)
+    assert ExtractionState(tmp_path / "state.json").get("a") is None
+
+
+def test_full_refresh_is_due_after_interval(tmp_path):
+    state_path = tmp_path / "state.json"
+    assert not ExtractionState(state_path).is_full_refresh_due
+    assert ExtractionState(state_path, 60).is_full_refresh_due
+
+    state = ExtractionState(state_path, 60)
+    state.save(is_complete=True)
+    # Only complete full refreshes count
+    assert ExtractionState(state_path, 60).is_full_refresh_due
+
+    state.save(is_complete=True, is_full_refresh=True)
+    assert not ExtractionState(state_path, 60).is_full_refresh_due
+    assert ExtractionState(state_path, 0).is_full_refresh_due
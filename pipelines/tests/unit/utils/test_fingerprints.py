@@ -0,0 +1,40 @@
+from whale.utils.fingerprints import FingerprintStore, get_fingerprint
+
+
+def test_fingerprints_persist_across_stores(tmp_path):
+    store_path = tmp_path / "fingerprints.json"
+    stub_path = tmp_path / "stub.md"
+    stub_path.write_text("contents")
+    fingerprints = {"header": get_fingerprint("contents")}
+
+    store = FingerprintStore(store_path)
+    store.update(stub_path, fingerprints)
+    store.save()
+
+    new_store = FingerprintStore(store_path)
+    assert new_store.get_unchanged_keys(stub_path, fingerprints) == {"header"}
+    assert new_store.get_unchanged_keys(stub_path, {"header": "other"}) == set()
+
+
+def test_modified_stub_is_invalidated(tmp_path):
+    stub_path = tmp_path / "stub.md"
+    stub_path.write_text("contents")
+    fingerprints = {"header": get_fingerprint("contents")}
+
+    store = FingerprintStore(tmp_path / "fingerprints.json")
+    store.update(stub_path, fingerprints)
+    stub_path.write_text("edited contents")
+
+    assert store.get_unchanged_keys(stub_path, fingerprints) == set()
+
+
+def test_invalidate_all(tmp_path):
+    stub_path = tmp_path / "stub.md"
+    stub_path.write_text("contents")
+    fingerprints = {"header": get_fingerprint("contents")}
+
+    store = FingerprintStore(tmp_path / "fingerprints.json")
+    store.update(stub_path, fingerprints)
+    store.invalidate()
+
+    assert store.get_unchanged_keys(stub_path, fingerprints) == set()
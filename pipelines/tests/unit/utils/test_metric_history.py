@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from whale.models.metric_value import MetricValue
+from whale.utils.metric_history import MetricHistory
+
+TABLE_KEY = "mock_database/mock_schema.mock_table"
+
+
+def get_metric_value(name, value, execution_time):
+    return MetricValue(
+        database="mock_database",
+        cluster=None,
+        schema="mock_schema",
+        table="mock_table",
+        execution_time=execution_time,
+        name=name,
+        value=value,
+    )
+
+
+def test_read_returns_values_in_range(tmp_path):
+    metric_history = MetricHistory("mock_database", base_directory=tmp_path)
+    for day in range(1, 4):
+        metric_history.append(get_metric_value("row_count", day, f"2021-01-0{day}"))
+        metric_history.flush()
+    metric_history.append(get_metric_value("other", "a", "2021-01-02"))
+    metric_history.flush()
+
+    series = metric_history.read(TABLE_KEY, "row_count", start="2021-01-02")
+    assert list(series) == [2.0, 3.0]
+    assert list(series.index) == [
+        pd.Timestamp("2021-01-02"),
+        pd.Timestamp("2021-01-03"),
+    ]
+
+    assert np.isnan(metric_history.read(TABLE_KEY, "other").iloc[0])
+    assert list(metric_history.read(TABLE_KEY, "other", is_numeric=False)) == ["a"]
+    assert metric_history.read(TABLE_KEY, "missing").empty
+
+
+def test_compaction_applies_retention_and_downsampling(tmp_path):
+    metric_history = MetricHistory(
+        "mock_database",
+        base_directory=tmp_path,
+        retention_days=365,
+        downsample_after_days=30,
+    )
+    now = pd.Timestamp("2021-06-01")
+    for execution_time, value in [
+        ("2020-01-01", 0),  # Dropped
+        ("2021-01-01 01:00:00", 1),  # Downsampled to the last value of the day
+        ("2021-01-01 02:00:00", 2),
+        ("2021-05-31 01:00:00", 3),  # Kept
+        ("2021-05-31 02:00:00", 4),
+    ]:
+        metric_history.append(get_metric_value("row_count", value, execution_time))
+        metric_history.flush()
+    metric_history.compact(now=now.timestamp())
+
+    assert len(os.listdir(tmp_path / "mock_database")) == 2  # Segment and lock
+    assert list(metric_history.read(TABLE_KEY, "row_count")) == [2.0, 3.0, 4.0]
+
+
+def test_record_appends_to_history(tmp_path, monkeypatch):
+    defaults = list(MetricHistory.__init__.__defaults__)
+    defaults[0] = tmp_path
+    monkeypatch.setattr(MetricHistory.__init__, "__defaults__", tuple(defaults))
+    get_metric_value("row_count", 10, "2021-01-01").record()
+
+    series = MetricHistory("mock_database", base_directory=tmp_path).read(
+        TABLE_KEY, "row_count"
+    )
+    assert list(series) == [10.0]
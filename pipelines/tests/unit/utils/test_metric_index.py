@@ -0,0 +1,61 @@
+import os
+
+from mock import patch
+
+from whale.utils import metric_index
+from whale.utils.markdown_delimiters import DEFINED_METRICS_DELIMITER, UGC_DELIMITER
+from whale.utils.metric_index import MetricIndex
+
+STUB_HEADER = f"# `schema.table`\n{UGC_DELIMITER}\n"
+METRICS_BLOCK = f"{DEFINED_METRICS_DELIMITER}\nnull-ids:\n  sql: select 1\n```\n"
+
+
+def write_stub(stub_path, ugc=""):
+    with open(stub_path, "w") as f:
+        f.write(STUB_HEADER + ugc)
+
+
+def test_finds_stubs_with_metrics(tmp_path):
+    write_stub(tmp_path / "schema.with_metrics.md", METRICS_BLOCK)
+    write_stub(tmp_path / "schema.without_metrics.md", "Some notes.")
+
+    index = MetricIndex(tmp_path / "metric_index.json")
+    stub_path = str(tmp_path / "schema.with_metrics.md")
+    assert index.get_table_stub_paths(tmp_path) == [stub_path]
+    assert index.get_metrics(stub_path) == [{"null-ids": {"sql": "select 1"}}]
+
+
+def test_stubs_are_only_reparsed_when_changed(tmp_path):
+    stub_path = tmp_path / "schema.table.md"
+    write_stub(stub_path, METRICS_BLOCK)
+    index_path = tmp_path / "metric_index.json"
+
+    index = MetricIndex(index_path)
+    index.get_table_stub_paths(tmp_path)
+    index.save()
+
+    with patch.object(
+        metric_index,
+        "sections_from_markdown",
+        wraps=metric_index.sections_from_markdown,
+    ) as mock_parse:
+        new_index = MetricIndex(index_path)
+        assert new_index.get_table_stub_paths(tmp_path) == [str(stub_path)]
+        assert mock_parse.call_count == 0
+
+        write_stub(stub_path, "Metrics removed.")
+        os.utime(stub_path, ns=(0, 0))
+        assert new_index.get_table_stub_paths(tmp_path) == []
+        assert mock_parse.call_count == 1
+
+
+def test_deleted_stubs_are_forgotten(tmp_path):
+    stub_path = tmp_path / "schema.table.md"
+    write_stub(stub_path, METRICS_BLOCK)
+
+    index = MetricIndex(tmp_path / "metric_index.json")
+    index.get_table_stub_paths(tmp_path)
+    os.remove(stub_path)
+
+    assert index.get_table_stub_paths(tmp_path) == []
+    assert index.get_metrics(stub_path) == []
@@ -1,4 +1,15 @@
-from whale.utils.parsers import parse_ugc
+import threading
+import time
+
+import pytest
+
+from whale.utils.parsers import (
+    find_blocks_and_process,
+    markdown_from_sections,
+    parse_ugc,
+    scan_programmatic_sections,
+    sections_from_text,
+)
 
 METRIC_STATEMENT = "METRIC_PAYLOAD"
 TEST_BLOB = f"""
@@ -15,3 +26,101 @@ filler
 def test_parse_ugc():
     sections = parse_ugc(TEST_BLOB)
     assert sections["defined_metrics"][0] == "\n" + METRIC_STATEMENT + "\n"
+
+
+STUB = """# `schema.table`
+`database` | `cluster`
+
+## Column details
+* [STRING]    `column1`
+
+## Partition info
+```
+ds:
+  high: '2021-01-01'
+```
+-------------------------------------------------------------------------------
+*Do not make edits above this line.*
+
+```sql-alias
+select 1
+```
+"""
+
+
+def test_sections_round_trip():
+    sections = sections_from_text(STUB)
+    assert sections["column_details"].startswith("## Column details")
+    assert sections["partition"].startswith("## Partition info")
+    assert sections["index"] == ""
+    assert markdown_from_sections(sections) == STUB
+
+
+def test_scan_programmatic_sections_returns_offsets():
+    spans = scan_programmatic_sections(STUB)
+    ((start, end),) = spans["column_details"]
+    assert STUB[start:end] == "## Column details\n* [STRING]    `column1`\n\n"
+    assert spans["index"] == []
+
+
+def test_find_blocks_and_process_passes_aliases_as_macros():
+    calls = []
+
+    def record_call(sql, extra_macros=""):
+        calls.append(extra_macros)
+        return sql
+
+    ugc = sections_from_text(STUB)["ugc"]
+    assert find_blocks_and_process(ugc, record_call) == ugc
+    assert "{% set alias %}" in calls[0]
+
+
+def test_find_blocks_and_process_runs_blocks_concurrently():
+    ugc = "".join(f"```sql\nselect {i}\n```\n" for i in range(4))
+    barrier = threading.Barrier(4, timeout=5)
+
+    def wait_for_other_blocks(sql, extra_macros=""):
+        # Only passes if all four blocks are running at once
+        barrier.wait()
+        return sql.replace("select", "processed")
+
+    processed_ugc = find_blocks_and_process(ugc, wait_for_other_blocks, max_workers=4)
+    assert processed_ugc == ugc.replace("select", "processed")
+
+
+def test_find_blocks_and_process_waits_for_aliased_blocks():
+    ugc = (
+        "```sql\nselect * from {{ alias }}\n```\n"
+        "```sql-alias\nselect 1\n```\n"
+        "```sql\nselect 2\n```\n"
+    )
+    calls = []
+
+    def record_call(sql, extra_macros=""):
+        # Without waiting, the block using the alias would finish first
+        if sql.strip() == "select 1":
+            time.sleep(0.1)
+        calls.append(sql.strip())
+        return sql
+
+    assert find_blocks_and_process(ugc, record_call, max_workers=3) == ugc
+    assert calls.index("select 1") < calls.index("select * from {{ alias }}")
+
+
+def test_find_blocks_and_process_stops_after_a_failed_block():
+    ugc = "".join(f"```sql\nselect {i}\n```\n" for i in range(4))
+
+    for max_workers in [1, 2]:
+        calls = []
+
+        def fail_on_second_block(sql, extra_macros=""):
+            calls.append(sql.strip())
+            if sql.strip() == "select 1":
+                raise ValueError("Failed")
+            # Give the failure time to land before later blocks would start
+            time.sleep(0.1)
+            return sql
+
+        with pytest.raises(ValueError):
+            find_blocks_and_process(ugc, fail_on_second_block, max_workers=max_workers)
+        assert "select 3" not in calls
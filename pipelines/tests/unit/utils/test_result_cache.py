@@ -0,0 +1,125 @@
+import datetime
+import os
+
+import pandas as pd
+from mock import patch
+
+from databuilder.models.watermark import Watermark
+
+from whale.models.table_metadata import TableMetadata
+from whale.utils import result_cache
+from whale.utils.catalog import Catalog
+from whale.utils.result_cache import (
+    get_cache_key,
+    get_referenced_tables,
+    get_watermarks,
+    ResultCache,
+)
+
+RESULTS = pd.DataFrame({"id": [0, 1], "name": ["a", "b"]})
+
+
+def test_get_cache_key_depends_on_connection_and_sql():
+    key = get_cache_key("warehouse", "select 1")
+    assert key == get_cache_key("warehouse", "select 1")
+    assert key != get_cache_key("other_warehouse", "select 1")
+    assert key != get_cache_key("warehouse", "select 2")
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(tmp_path)
+    execution_time = datetime.datetime.now()
+    assert cache.get("key") is None
+
+    cache.put("key", RESULTS, execution_time)
+    results, cached_execution_time = cache.get("key")
+    pd.testing.assert_frame_equal(results, RESULTS)
+    assert cached_execution_time == execution_time
+
+
+def test_entries_expire(tmp_path):
+    cache = ResultCache(tmp_path, ttl_seconds=60)
+    execution_time = datetime.datetime.now()
+    cache.put("key", RESULTS, execution_time)
+
+    later = execution_time.timestamp() + 61
+    with patch.object(result_cache.time, "time", lambda: later):
+        assert cache.get("key") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path)
+    execution_time = datetime.datetime.now()
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, RESULTS, execution_time)
+        os.utime(cache._get_entry_path(key), (i, i))
+
+    # Reading "a" makes "b" the least recently used
+    cache.get("a")
+    cache.max_bytes = 2 * os.path.getsize(cache._get_entry_path("a"))
+    cache._evict()
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_entries_are_invalidated_when_watermarks_change(tmp_path):
+    cache = ResultCache(tmp_path)
+    watermarks = [["warehouse/schema.table", "high", "ds", "2020-01-01"]]
+    cache.put("key", RESULTS, datetime.datetime.now(), watermarks)
+
+    assert cache.get("key", watermarks) is not None
+    watermarks[0][-1] = "2020-01-02"
+    assert cache.get("key", watermarks) is None
+
+
+def test_get_referenced_tables():
+    sql = """
+    select *
+    from "Schema"."Table" t
+    join other_table o on t.id = o.id
+    left join `project.dataset.bq_table` b on t.id = b.id
+    where t.id in (select id from schema.table)
+    """
+    assert get_referenced_tables(sql) == [
+        (None, "other_table"),
+        ("Schema", "Table"),
+        ("dataset", "bq_table"),
+        ("schema", "table"),
+    ]
+
+
+def test_get_watermarks(tmp_path):
+    catalog_path = tmp_path / "catalog.sqlite3"
+    assert get_watermarks("warehouse", "select 1", catalog_path) == []
+
+    catalog = Catalog(catalog_path)
+    table_key = "warehouse/schema.table"
+    catalog.upsert(
+        table_key,
+        TableMetadata(
+            database="warehouse",
+            cluster=None,
+            schema="schema",
+            name="table",
+            columns=[],
+        ),
+    )
+    catalog.upsert(
+        table_key,
+        Watermark(
+            create_time="2020-01-01",
+            database="warehouse",
+            schema="schema",
+            table_name="table",
+            part_name="ds=2020-01-01",
+            part_type="high_watermark",
+        ),
+    )
+    catalog.close()
+
+    assert get_watermarks("warehouse", "select * from SCHEMA.TABLE", catalog_path) == [
+        [table_key, "high", "ds", "2020-01-01"]
+    ]
+    assert get_watermarks("warehouse", "select * from other", catalog_path) == []
@@ -0,0 +1,38 @@
+import os
+
+from mock import patch
+
+from whale.utils import GroupCommit, safe_write
+
+
+@patch.object(os, "fsync", wraps=os.fsync)
+def test_safe_write_fsyncs_each_file_by_default(mock_fsync, tmp_path):
+    for i in range(3):
+        safe_write(str(tmp_path / f"{i}.md"), "text")
+
+    assert mock_fsync.call_count == 3
+    assert (tmp_path / "0.md").read_text() == "text"
+
+
+@patch.object(os, "fsync", wraps=os.fsync)
+def test_group_commit_fsyncs_files_then_directories_at_checkpoints(
+    mock_fsync, tmp_path
+):
+    directories = [tmp_path / "a", tmp_path / "b"]
+    for directory in directories:
+        directory.mkdir()
+
+    with GroupCommit(checkpoint_interval=4):
+        for i in range(3):
+            for directory in directories:
+                safe_write(str(directory / f"{i}.md"), "text")
+        # One checkpoint after the fourth write, over those four files and
+        # both directories
+        assert mock_fsync.call_count == 6
+
+    # Final checkpoint on exit, over the last two files and their directories
+    assert mock_fsync.call_count == 10
+    assert not list(tmp_path.glob("**/*.bak"))
+
+    safe_write(str(tmp_path / "c.md"), "text")
+    assert mock_fsync.call_count == 11
@@ -1,9 +1,12 @@
+import os
+
 from ..fixtures import mock_whale_dir, mock_template_dir
 from pathlib import Path
 from mock import call, patch
 import pytest
 
 from whale.utils.sql import (
+    get_macro_module,
     template_query,
     _validate_and_print_result,
 )
@@ -58,3 +61,29 @@ class TestTemplateDirectory:
             connection_name="valid",
         )
         assert templated_query == "\n5"
+
+    def test_template_query_reuses_macros_until_file_changes(self, mock_template_dir):
+        template_path = mock_template_dir / "macros.sql"
+        write_template_to_file(
+            template_path, "{% macro double(x) %}{{ 2 * x }}{% endmacro %}"
+        )
+        assert template_query("{{ double(2) }}", connection_name="macros") == "\n4"
+        module = get_macro_module("macros")
+        assert get_macro_module("macros") is module
+
+        write_template_to_file(
+            template_path, "{% macro double(x) %}{{ x }}{{ x }}{% endmacro %}"
+        )
+        # Make sure the mtime changes, however coarse the filesystem's clock
+        stat = os.stat(template_path)
+        os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + int(1e9)))
+        assert get_macro_module("macros") is not module
+        assert template_query("{{ double(2) }}", connection_name="macros") == "\n22"
+
+    def test_template_query_passes_macros_to_extra_macros(self):
+        templated_query = template_query(
+            "{{ alias }}",
+            connection_name="valid",
+            extra_macros="{% set alias %}{{ main }}{% endset %}",
+        )
+        assert templated_query == "\n\n5"
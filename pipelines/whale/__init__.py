@@ -1,17 +1,28 @@
-import traceback
 import datetime
+import functools
+import itertools
+import json
 import logging
 import os
+import threading
 import pandas as pd
 
 from pathlib import Path
+from sqlalchemy.exc import DBAPIError
+from typing import Iterator
 
 from whale.utils import paths
 from whale.utils.sql import template_query
-from whale.task import WhaleTask
-from whale.loader.whale_loader import WhaleLoader
 from whale.models.connection_config import ConnectionConfigSchema
-from whale.utils import copy_manifest, get_table_info_from_path, transfer_manifest
+from whale.utils import (
+    DEFAULT_CHECKPOINT_INTERVAL,
+    GroupCommit,
+    get_table_info_from_path,
+    merge_manifests,
+    read_manifest,
+    transfer_manifest,
+    write_manifest,
+)
 from whale.utils.parsers import (
     find_blocks_and_process,
     sections_from_markdown,
@@ -19,8 +30,17 @@ from whale.utils.parsers import (
     HEADER_SECTION,
     UGC_SECTION,
 )
-from whale.utils.config import get_connection, read_connections
+from whale.utils.config import get_connection, read_config, read_connections
+from whale.utils.result_cache import (
+    get_cache_key,
+    get_watermarks,
+    ResultCache,
+    DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES,
+    DEFAULT_TTL_SECONDS,
+)
 
+# Cheap to import: each configurer imports its extractors when called, so
+# `import whale` (e.g. for `wh run`) doesn't load every warehouse's client
 from whale.utils.extractor_wrappers import (
     configure_bigquery_extractors,
     configure_spanner_extractors,
@@ -38,6 +58,26 @@ from whale.utils.extractor_wrappers import (
 
 LOGGER = logging.getLogger(__name__)
 EXECUTION_FLAG = "\n--!wh-run\n"
+MANIFEST_KEY = "loader.whale.tmp_manifest_path"
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+DEFAULT_RUN_MAX_WORKERS = 1
+EXECUTION_TIME_ATTR = "execution_time"
+ENGINES = {}
+ENGINES_LOCK = threading.Lock()
+
+METADATA_SOURCE_CONFIGURERS = {
+    "bigquery": configure_bigquery_extractors,
+    "spanner": configure_spanner_extractors,
+    "glue": configure_glue_extractors,
+    "hivemetastore": configure_hive_metastore_extractors,
+    "neo4j": configure_neo4j_extractors,
+    "postgres": configure_postgres_extractors,
+    "presto": configure_presto_extractors,
+    "redshift": configure_redshift_extractors,
+    "snowflake": configure_snowflake_extractors,
+    "splicemachine": configure_splice_machine_extractors,
+}
 
 
 def embed_results_as_comment(sql: str, results: pd.DataFrame):
@@ -45,7 +85,8 @@ def embed_results_as_comment(sql: str, results: pd.DataFrame):
     Given sql and results of executing this query, embed the results as a comment into sql.
 
     """
-    results_header = f"/* results: {datetime.datetime.now()}\n{38*'-'}"
+    execution_time = results.attrs.get(EXECUTION_TIME_ATTR, datetime.datetime.now())
+    results_header = f"/* results: {execution_time}\n{38*'-'}"
     tabulated_results = results.to_string()
     formatted_results = f"\n{results_header}\n{tabulated_results}\n*/\n"
     # Only replace the first instance of EXECUTION_FLAG
@@ -58,6 +99,9 @@ def execute_markdown_sql_blocks(filepath: str) -> str:
     Executes all sql, denoted by ```sql, within the file `filepath` if
     EXECUTION_FLAG is within. Replace the EXECUTION_FLAG with the results.
 
+    Up to `run_max_workers` (in ~/.whale/config/config.yaml) blocks are run
+    concurrently, except that blocks referencing an aliased block wait for it.
+
     """
     database, _, _, _ = get_table_info_from_path(filepath)
     with open(filepath, "r") as f:
@@ -76,6 +120,7 @@ def execute_markdown_sql_blocks(filepath: str) -> str:
             ugc_blob,
             run_and_append_results,
             function_kwargs={"warehouse_name": database},
+            max_workers=read_config("run_max_workers", DEFAULT_RUN_MAX_WORKERS),
         )
 
         with open(filepath, "w") as f:
@@ -109,10 +154,19 @@ def pull():
     Pulls down all metadata & metrics from user-defined warehouse connections
     in ~/.whale/config/connections.yaml.
 
+    Connections are pulled concurrently (up to `pull_max_workers` in
+    ~/.whale/config/config.yaml). Within a connection, the metadata extractor
+    always runs first, after which the remaining extractors run with at most
+    `max_concurrency` (set per connection) running at once.
+
     Generally not to be used publicly. This is accessed by the rust client to
     update metadata and facilitate scheduling.
 
     """
+    from whale.loader.whale_loader import WhaleLoader
+    from whale.task.scheduler import Scheduler, DEFAULT_MAX_WORKERS
+    from whale.utils.metric_history import DEFAULT_DOWNSAMPLE_AFTER_DAYS
+
     for path in [
         paths.CONFIG_DIR,
         paths.LOGS_DIR,
@@ -133,78 +187,337 @@ def pull():
             paths.BASE_DIR, "manifests/tmp_manifest_" + str(i) + ".txt"
         )
         i += 1
+    # Reserve this path, as connections write to their own manifests
+    Path(tmp_manifest_path).touch()
 
-    for raw_connection_dict in raw_connection_dicts:
-        connection = ConnectionConfigSchema(**raw_connection_dict)
+    scheduler = Scheduler(
+        max_workers=read_config("pull_max_workers", DEFAULT_MAX_WORKERS)
+    )
+    connection_manifest_paths = []
+    completed_manifest_paths = []
+    manifest_lock = threading.Lock()
+
+    # Trade per-file fsyncs for per-directory fsyncs at checkpoints
+    group_commit = None
+    if read_config("is_group_commit_enabled", False):
+        group_commit = GroupCommit(
+            read_config("group_commit_interval", DEFAULT_CHECKPOINT_INTERVAL)
+        )
+
+    def hand_off_manifest(connection_manifest_path):
+        # Expose the tables of each connection as soon as its metadata is in
+        with manifest_lock:
+            completed_manifest_paths.append(connection_manifest_path)
+            merge_manifests(completed_manifest_paths, paths.MANIFEST_PATH)
 
-        metadata_source_dict = {
-            "bigquery": configure_bigquery_extractors,
-            "spanner": configure_spanner_extractors,
-            "glue": configure_glue_extractors,
-            "hivemetastore": configure_hive_metastore_extractors,
-            "neo4j": configure_neo4j_extractors,
-            "postgres": configure_postgres_extractors,
-            "presto": configure_presto_extractors,
-            "redshift": configure_redshift_extractors,
-            "snowflake": configure_snowflake_extractors,
-            "splicemachine": configure_splice_machine_extractors,
-        }
+    for i, raw_connection_dict in enumerate(raw_connection_dicts):
+        connection = ConnectionConfigSchema(**raw_connection_dict)
+        job_prefix = f"{i}:{connection.name}"
 
         if connection.metadata_source == "build_script":
-            run_build_script(connection)
-            break
-        else:
-            configurer = metadata_source_dict[connection.metadata_source]
-            extractors, conf = configurer(connection)
+            scheduler.add_job(
+                f"{job_prefix}:build_script",
+                functools.partial(run_build_script, connection),
+            )
+            continue
 
-        manifest_key = "loader.whale.tmp_manifest_path"
+        configurer = METADATA_SOURCE_CONFIGURERS[connection.metadata_source]
+        extractors, conf = configurer(connection)
+
+        connection_manifest_path = get_connection_manifest_path(tmp_manifest_path, i)
+        connection_manifest_paths.append(connection_manifest_path)
         conf.put("loader.whale.database_name", connection.name)
-        conf.put(manifest_key, tmp_manifest_path)
+        conf.put(f"loader.whale.{WhaleLoader.IS_BUFFERING_ENABLED_KEY}", True)
+        conf.put(f"loader.whale.{WhaleLoader.IS_FINGERPRINTING_ENABLED_KEY}", True)
+        conf.put(f"loader.whale.{WhaleLoader.IS_CATALOG_ENABLED_KEY}", True)
+        conf.put(f"loader.whale.{WhaleLoader.IS_METRIC_INDEX_ENABLED_KEY}", True)
+        conf.put(f"loader.whale.{WhaleLoader.IS_METRIC_HISTORY_ENABLED_KEY}", True)
+        for key, default in [
+            (WhaleLoader.METRIC_HISTORY_RETENTION_DAYS_KEY, None),
+            (
+                WhaleLoader.METRIC_HISTORY_DOWNSAMPLE_AFTER_DAYS_KEY,
+                DEFAULT_DOWNSAMPLE_AFTER_DAYS,
+            ),
+        ]:
+            conf.put(f"loader.whale.{key}", read_config(key, default))
+        conf.put(MANIFEST_KEY, connection_manifest_path)
+
+        scheduler.add_group(job_prefix, connection.max_concurrency)
+        metadata_job_name = f"{job_prefix}:{type(extractors[0]).__name__}"
+        scheduler.add_job(
+            metadata_job_name,
+            functools.partial(
+                _run_metadata_task,
+                extractors[0],
+                conf,
+                connection_manifest_path,
+                hand_off_manifest,
+                group_commit,
+            ),
+            group=job_prefix,
+        )
 
-        for i, extractor in enumerate(extractors):
-            is_metadata_extractor = i == 0
-            task = WhaleTask(
-                extractor=extractor,
-                loader=WhaleLoader(),
+        # Metrics, watermarks, etc. need the stubs, but not each other
+        for extractor in extractors[1:]:
+            scheduler.add_job(
+                f"{job_prefix}:{type(extractor).__name__}",
+                functools.partial(_run_task, extractor, conf, group_commit),
+                dependencies=[metadata_job_name],
+                group=job_prefix,
+                is_required=False,
             )
-            task.init(conf)
 
-            # Enable try except for non-metadata extractors
-            # No need to update the manifest for other extractors
-            if is_metadata_extractor:
-                task.run()
-                task.save_stats()
-                conf.pop(manifest_key)
-                copy_manifest(tmp_manifest_path)
-            else:
-                try:
-                    task.run()
-                except Exception as e:
-                    LOGGER.warning(e)
-                    LOGGER.warning(f"Skipping {type(extractor)}.")
-                    LOGGER.warning(traceback.format_exc())
+    if group_commit is not None:
+        group_commit.start()
+
+    try:
+        scheduler.run()
+
+        # Build scripts may have written to the reserved manifest directly
+        manifest_entries = set()
+        for path in [tmp_manifest_path] + connection_manifest_paths:
+            manifest_entries.update(read_manifest(path))
+        if manifest_entries:
+            write_manifest(manifest_entries, tmp_manifest_path)
+        else:
+            os.remove(tmp_manifest_path)
+        transfer_manifest(tmp_manifest_path)
+    finally:
+        if group_commit is not None:
+            group_commit.stop()
+        for path in connection_manifest_paths + [tmp_manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
 
-    transfer_manifest(tmp_manifest_path)
+def get_connection_manifest_path(tmp_manifest_path, connection_index: int) -> str:
+    base, extension = os.path.splitext(str(tmp_manifest_path))
+    return f"{base}.{connection_index}{extension}"
 
 
-def run(sql, warehouse_name=None, extra_macros: str = "") -> pd.DataFrame:
+def _run_task(extractor, conf, group_commit=None):
+    from whale.loader.whale_loader import WhaleLoader
+    from whale.task import WhaleTask
+
+    task = WhaleTask(
+        extractor=extractor,
+        loader=WhaleLoader(),
+    )
+    task.init(conf)
+    try:
+        task.run()
+    finally:
+        if group_commit is not None:
+            group_commit.checkpoint()
+    return task
+
+
+def _run_metadata_task(
+    extractor, conf, connection_manifest_path, hand_off_manifest, group_commit=None
+):
+    task = _run_task(extractor, conf, group_commit)
+    task.save_stats()
+    # Later extractors keep appending to this connection's manifest, which is
+    # merged again once every connection is done
+    if os.path.exists(connection_manifest_path):
+        hand_off_manifest(connection_manifest_path)
+    else:
+        LOGGER.warning(f"No tmp manifest created at path: {connection_manifest_path}")
+
+
+def get_engine(connection: ConnectionConfigSchema):
+    """
+    Returns an initialized engine for `connection`. Engines are kept open and
+    reused by later queries in this process (e.g. by the whale daemon).
+
+    """
+    key = (
+        connection.conn_string,
+        connection.key_path,
+        json.dumps(connection.connect_args, sort_keys=True, default=str),
+    )
+    with ENGINES_LOCK:
+        if key not in ENGINES:
+            engine, conf = configure_unscoped_sqlalchemy_engine(connection)
+            engine.init(conf)
+            ENGINES[key] = engine
+        return ENGINES[key]
+
+
+def run(
+    sql,
+    warehouse_name=None,
+    extra_macros: str = "",
+    max_rows: int = None,
+    max_bytes: int = None,
+    use_cache: bool = None,
+) -> pd.DataFrame:
     """
     Runs sql queries against warehouse_name defined in
     ~/.whale/config/connections.yaml.  If no warehouse_name is given, the first
     is used.
 
+    Results are truncated to `max_rows` rows and roughly `max_bytes` bytes
+    (`run_max_rows` and `run_max_bytes` in ~/.whale/config/config.yaml by
+    default). See `run_chunks`.
+
+    If `use_cache` (`is_result_cache_enabled` in config.yaml by default),
+    results are reused from earlier runs of the same templated query; see
+    whale.utils.result_cache. The time at which the query was executed is in
+    the `execution_time` attribute of the results.
+
+    """
+    if use_cache is None:
+        use_cache = read_config("is_result_cache_enabled", False)
+    _, max_rows, max_bytes = _get_budgets(None, max_rows, max_bytes)
+    connection, sql = _template_query(sql, warehouse_name, extra_macros)
+
+    if use_cache:
+        cache = ResultCache(
+            ttl_seconds=read_config("result_cache_ttl", DEFAULT_TTL_SECONDS),
+            max_bytes=read_config("result_cache_max_bytes", DEFAULT_CACHE_MAX_BYTES),
+        )
+        cache_key = get_cache_key(connection.name, sql, max_rows, max_bytes)
+        watermarks = None
+        if read_config("is_result_cache_watermark_check_enabled", True):
+            watermarks = get_watermarks(connection.name, sql)
+        cached = cache.get(cache_key, watermarks)
+        if cached is not None:
+            results, execution_time = cached
+            LOGGER.info(f"Using results cached at {execution_time}.")
+            results.attrs[EXECUTION_TIME_ATTR] = execution_time
+            return results
+
+    execution_time = datetime.datetime.now()
+    chunks = list(
+        _fetch_chunks(connection, sql, max_rows=max_rows, max_bytes=max_bytes)
+    )
+    results = _concat_chunks(chunks)
+
+    if use_cache:
+        cache.put(cache_key, results, execution_time, watermarks)
+    results.attrs[EXECUTION_TIME_ATTR] = execution_time
+    return results
+
+
+def run_chunks(
+    sql,
+    warehouse_name=None,
+    extra_macros: str = "",
+    chunk_size: int = None,
+    max_rows: int = None,
+    max_bytes: int = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Like `run`, but streams the results from the warehouse, yielding them as
+    DataFrames of up to `chunk_size` rows. At least one (possibly empty)
+    chunk is always yielded.
+
+    Fetching stops once `max_rows` rows or `max_bytes` bytes (as measured by
+    pandas) have been yielded. As the byte budget is checked after each chunk,
+    it may be exceeded by up to one chunk. Unless given, the budgets and chunk
+    size are read from ~/.whale/config/config.yaml.
+
     """
+    connection, sql = _template_query(sql, warehouse_name, extra_macros)
+    yield from _fetch_chunks(connection, sql, chunk_size, max_rows, max_bytes)
+
+
+def _concat_chunks(chunks) -> pd.DataFrame:
+    """
+    Concatenates `chunks`, inferring the dtypes of columns whose chunks
+    disagree (e.g. all null in one chunk, but numeric in the next) from all of
+    their values, as if the rows were fetched at once.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    results = pd.concat(chunks, ignore_index=True)
+    mixed_columns = [
+        i
+        for i in range(len(results.columns))
+        if len({str(chunk.dtypes.iloc[i]) for chunk in chunks}) > 1
+    ]
+    if not mixed_columns:
+        return results
+    # By position, as columns may share names
+    return pd.concat(
+        [
+            results.iloc[:, i].infer_objects()
+            if i in mixed_columns
+            else results.iloc[:, i]
+            for i in range(len(results.columns))
+        ],
+        axis=1,
+    )
+
+
+def _get_budgets(chunk_size: int, max_rows: int, max_bytes: int):
+    chunk_size = chunk_size or read_config("run_chunk_size", DEFAULT_CHUNK_SIZE)
+    max_rows = max_rows or read_config("run_max_rows", None)
+    max_bytes = max_bytes or read_config("run_max_bytes", DEFAULT_MAX_BYTES)
+    return chunk_size, max_rows, max_bytes
+
+
+def _template_query(sql, warehouse_name=None, extra_macros: str = ""):
     connection = get_connection(warehouse_name=warehouse_name)
-    engine, conf = configure_unscoped_sqlalchemy_engine(connection)
-    engine.init(conf)
     sql = template_query(
         sql, connection_name=connection.name, extra_macros=extra_macros
     )
     LOGGER.info(f"Templated query:\n{sql}")
+    return connection, sql
+
+
+def _fetch_chunks(
+    connection: ConnectionConfigSchema,
+    sql: str,
+    chunk_size: int = None,
+    max_rows: int = None,
+    max_bytes: int = None,
+) -> Iterator[pd.DataFrame]:
+    chunk_size, max_rows, max_bytes = _get_budgets(chunk_size, max_rows, max_bytes)
+    engine = get_engine(connection)
     sql = sql.replace("%", "%%")
 
-    result = engine.execute(sql, has_header=True)
-    headers = next(result)
-    table = list(result)
-    df = pd.DataFrame(table, columns=headers)
-    return df
+    result = engine.execute(sql, has_header=True, stream_results=True)
+    try:
+        headers = list(next(result))
+    except DBAPIError as e:
+        # The warehouse may have closed an idle connection, in which case it
+        # is re-established on the next query
+        if not e.connection_invalidated:
+            raise
+        result = engine.execute(sql, has_header=True, stream_results=True)
+        headers = list(next(result))
+    n_rows = 0
+    n_bytes = 0
+    while True:
+        n_rows_to_fetch = chunk_size
+        if max_rows is not None:
+            n_rows_to_fetch = min(n_rows_to_fetch, max_rows - n_rows)
+        # Only a chunk of rows is held at once, so the byte budget applies to
+        # whole chunks
+        rows = list(itertools.islice(result, n_rows_to_fetch))
+        chunk = pd.DataFrame.from_records(rows, columns=headers, coerce_float=True)
+        del rows
+        n_rows += len(chunk)
+        n_bytes += chunk.memory_usage(deep=True).sum()
+
+        if len(chunk) or not n_rows:
+            yield chunk
+        if len(chunk) < n_rows_to_fetch:
+            return
+
+        if max_rows is not None and n_rows >= max_rows:
+            budget = f"{max_rows} rows"
+        elif max_bytes is not None and n_bytes >= max_bytes:
+            budget = f"{max_bytes} bytes"
+        else:
+            continue
+
+        # Only warn if there are rows left
+        if next(result, None) is not None:
+            LOGGER.warning(
+                f"Results truncated to {n_rows} rows, as the budget of {budget} was reached."
+            )
+        return
@@ -0,0 +1,152 @@
+"""
+A long-lived process that runs queries on behalf of `wh run`, so that each
+run skips python startup and reuses warm warehouse connections.
+
+Start it with the python of whale's virtual environment:
+
+    ~/.whale/libexec/env/bin/python -m whale.daemon
+
+Requests and responses are single lines of JSON over a Unix socket at
+~/.whale/daemon.sock. Requests are handled one at a time. Warnings logged
+while handling a request are returned with its response, for the client to
+print.
+"""
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import traceback
+import warnings
+
+from whale import execute_markdown_sql_blocks, execute_sql_file
+from whale.utils import paths
+
+LOGGER = logging.getLogger(__name__)
+
+FILENAME_KEY = "filename"
+WAREHOUSE_NAME_KEY = "warehouse_name"
+OUTPUT_KEY = "output"
+ERROR_KEY = "error"
+LOGS_KEY = "logs"
+
+
+def run_file(filename: str, warehouse_name: str = None) -> str:
+    """
+    Runs the queries in `filename` as `wh run` does, returning the text to
+    print.
+    """
+    file_extension = pathlib.Path(filename).suffix
+    if file_extension.lower() in [".md", ".markdown"]:
+        execute_markdown_sql_blocks(filename)
+        return ""
+    else:  # Catchall for all sql-based extensions
+        result = execute_sql_file(filename, warehouse_name=warehouse_name)
+        return str(result)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, level):
+        super().__init__(level)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record).rstrip("\n"))
+
+
+@contextlib.contextmanager
+def capture_logs(level=logging.WARNING):
+    """
+    Yields a list of the messages logged at `level` or above, including
+    warnings raised, until the block exits.
+    """
+    handler = _ListHandler(level)
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+    with warnings.catch_warnings():
+        # Show each warning once per request, as `wh run` would once per run
+        warnings.simplefilter("default")
+        logging.captureWarnings(True)
+        try:
+            yield handler.messages
+        finally:
+            logging.captureWarnings(False)
+            root_logger.removeHandler(handler)
+
+
+class WhaleDaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        response = {OUTPUT_KEY: "", ERROR_KEY: None, LOGS_KEY: []}
+        try:
+            request = json.loads(self.rfile.readline())
+            LOGGER.info(f"Running {request[FILENAME_KEY]}.")
+            with capture_logs() as response[LOGS_KEY]:
+                response[OUTPUT_KEY] = run_file(
+                    request[FILENAME_KEY], request.get(WAREHOUSE_NAME_KEY)
+                )
+        except Exception:
+            response[ERROR_KEY] = traceback.format_exc()
+            LOGGER.warning(response[ERROR_KEY])
+
+        try:
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        except BrokenPipeError:
+            LOGGER.warning("Client disconnected before receiving its results.")
+
+
+def is_daemon_running(socket_path=paths.DAEMON_SOCKET_PATH) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+def create_server(socket_path=paths.DAEMON_SOCKET_PATH):
+    """
+    Binds the daemon to `socket_path`, or returns None if another daemon is
+    already listening there.
+    """
+    socket_path = str(socket_path)
+    if os.path.exists(socket_path):
+        if is_daemon_running(socket_path):
+            return None
+        # Left behind by a daemon that didn't shut down cleanly
+        os.remove(socket_path)
+
+    # Queries run with the user's warehouse credentials, so only the user
+    # may connect
+    umask = os.umask(0o177)
+    try:
+        return socketserver.UnixStreamServer(socket_path, WhaleDaemonHandler)
+    finally:
+        os.umask(umask)
+
+
+def serve(socket_path=paths.DAEMON_SOCKET_PATH):
+    socket_path = str(socket_path)
+    server = create_server(socket_path)
+    if server is None:
+        LOGGER.warning(f"A whale daemon is already listening on {socket_path}.")
+        return
+
+    try:
+        LOGGER.info(f"Listening on {socket_path}.")
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s:%(levelname)s:%(name)s:%(message)s",
+        level=logging.INFO,
+    )
+    try:
+        serve()
+    except KeyboardInterrupt:
+        pass
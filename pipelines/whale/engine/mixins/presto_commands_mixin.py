@@ -172,6 +172,79 @@ class PrestoCommandsMixin:
             is_view=is_view,
         )
 
+    def get_table_metadata_from_information_schema(
+        self,
+        schema: str,
+        tables: Optional[Iterable[str]] = None,
+        cluster: Optional[str] = None,
+        is_view_query_enabled: Optional[bool] = False,
+    ) -> Dict[str, TableMetadata]:
+        """
+        Like `get_table_metadata`, but fetches the metadata of `tables` in
+        `schema` (or of all its tables, if not given) with a single query
+        against information_schema. Returns the metadata of each table found,
+        keyed by table name.
+        """
+        unformatted_query = """
+        SELECT
+          c.table_name
+          , c.column_name
+          , c.data_type
+          , c.extra_info
+          , c.comment
+          , t.table_type
+        FROM {cluster_prefix}information_schema.columns c
+        LEFT JOIN {cluster_prefix}information_schema.tables t
+            ON c.table_schema = t.table_schema
+            AND c.table_name = t.table_name
+        WHERE c.table_schema = '{schema}'
+        {table_clause}
+        ORDER BY c.table_name, c.ordinal_position
+        """
+
+        def quote(value):
+            return "'{}'".format(value.replace("'", "''"))
+
+        table_clause = ""
+        if tables is not None:
+            tables = list(tables)
+            if not tables:
+                return {}
+            table_clause = "AND c.table_name IN ({})".format(
+                ", ".join(quote(table) for table in tables)
+            )
+
+        formatted_query = unformatted_query.format(
+            cluster_prefix=cluster + "." if cluster is not None else "",
+            schema=schema.replace("'", "''"),
+            table_clause=table_clause,
+        )
+        query_results = self.execute(formatted_query, is_dict_return_enabled=True)
+
+        table_metadata = {}
+        for table, group in groupby(query_results, lambda row: row["table_name"]):
+            rows = list(group)
+            columns = [
+                ColumnMetadata(
+                    name=row["column_name"],
+                    description=row["comment"],
+                    data_type=row["data_type"],
+                    sort_order=i,
+                    is_partition_column=row["extra_info"] == "partition key",
+                )
+                for i, row in enumerate(rows)
+            ]
+            table_metadata[table] = TableMetadata(
+                database=self._database,
+                cluster=cluster,
+                schema=schema,
+                name=table,
+                description=None,
+                columns=columns,
+                is_view=bool(is_view_query_enabled) and rows[0]["table_type"] == "VIEW",
+            )
+        return table_metadata
+
     def get_preview(
         self, schema: str, table: str, cluster: Optional[str] = None, n_rows: int = 10
     ) -> Iterator[Dict]:
@@ -252,42 +325,92 @@ class PrestoCommandsMixin:
         """
         full_schema_address = self._get_full_schema_address(cluster, schema)
         partition_table_name = '{}."{}$partitions"'.format(full_schema_address, table)
-        partition_query = "SELECT * FROM {}".format(partition_table_name)
 
         try:
-            partition_query_results = self.execute(partition_query, has_header=True)
-            partition_column_names = next(partition_query_results)
-            partition_query_rows = list(partition_query_results)
-            watermarks_high = _calculate_watermarks(
-                partition_names=partition_column_names,
-                partition_query_rows=partition_query_rows,
-                watermark_type="high_watermark",
-            )
-            watermarks_low = _calculate_watermarks(
-                partition_names=partition_column_names,
-                partition_query_rows=partition_query_rows,
-                watermark_type="low_watermark",
+            watermarks_high, watermarks_low = self._get_partition_watermarks(
+                partition_table_name
             )
+        except Exception as e:
+            LOGGER.exception(e)
+            return
 
-            yield PrestoWatermark(
-                database=self._database,
-                cluster=cluster or self._default_cluster_name,
-                schema=schema,
-                table_name=table,
-                parts=watermarks_high,
-                part_type="high_watermark",
-            )
+        yield PrestoWatermark(
+            database=self._database,
+            cluster=cluster or self._default_cluster_name,
+            schema=schema,
+            table_name=table,
+            parts=watermarks_high,
+            part_type="high_watermark",
+        )
 
-            yield PrestoWatermark(
-                database=self._database,
-                cluster=cluster or self._default_cluster_name,
-                schema=schema,
-                table_name=table,
-                parts=watermarks_low,
-                part_type="low_watermark",
-            )
+        yield PrestoWatermark(
+            database=self._database,
+            cluster=cluster or self._default_cluster_name,
+            schema=schema,
+            table_name=table,
+            parts=watermarks_low,
+            part_type="low_watermark",
+        )
+
+    def _get_partition_watermarks(self, partition_table_name: str):
+        """
+        Aggregate the high/low value of each partition column within Presto,
+        so that a single row is returned however many partitions there are.
+        Falls back to fetching every partition if the aggregation fails.
+        """
+        # Only the header is needed to find the partition columns
+        partition_column_names = list(
+            list(
+                self.execute(
+                    "SELECT * FROM {} LIMIT 0".format(partition_table_name),
+                    has_header=True,
+                )
+            )[0]
+        )
+        if not partition_column_names:
+            return [], []
+
+        aggregations = ["count(*)"]
+        for partition_column_name in partition_column_names:
+            quoted_name = '"{}"'.format(partition_column_name.replace('"', '""'))
+            aggregations.append("max({0}), min({0})".format(quoted_name))
+        watermark_query = "SELECT {} FROM {}".format(
+            ", ".join(aggregations), partition_table_name
+        )
+
+        try:
+            row = list(self.execute(watermark_query))[0]
         except Exception as e:
-            LOGGER.exception(e)
+            LOGGER.warning(
+                "Falling back to fetching all partitions of {}: {}".format(
+                    partition_table_name, e
+                )
+            )
+            return self._get_partition_watermarks_from_rows(partition_table_name)
+
+        # Match the fallback, which finds no watermarks without partitions
+        if not row[0]:
+            return [], []
+        watermarks_high = list(zip(partition_column_names, row[1::2]))
+        watermarks_low = list(zip(partition_column_names, row[2::2]))
+        return watermarks_high, watermarks_low
+
+    def _get_partition_watermarks_from_rows(self, partition_table_name: str):
+        partition_query = "SELECT * FROM {}".format(partition_table_name)
+        partition_query_results = self.execute(partition_query, has_header=True)
+        partition_column_names = next(partition_query_results)
+        partition_query_rows = list(partition_query_results)
+        watermarks_high = _calculate_watermarks(
+            partition_names=partition_column_names,
+            partition_query_rows=partition_query_rows,
+            watermark_type="high_watermark",
+        )
+        watermarks_low = _calculate_watermarks(
+            partition_names=partition_column_names,
+            partition_query_rows=partition_query_rows,
+            watermark_type="low_watermark",
+        )
+        return watermarks_high, watermarks_low
 
     def get_analyze(
         self, schema: str, table: str, cluster: str = None
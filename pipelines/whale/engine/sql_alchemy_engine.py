@@ -1,6 +1,10 @@
+import contextlib
 import importlib
+import threading
 from pyhocon import ConfigFactory, ConfigTree, HOCONConverter
 from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 from typing import Iterator
 from ast import literal_eval
 
@@ -17,6 +21,7 @@ class SQLAlchemyEngine(Engine):
     CONNECT_ARGS = 'connect_args'
     MODEL_CLASS_KEY = "model_class"
     CREDENTIALS_PATH_KEY = "credentials_path"
+    POOL_SIZE_KEY = "pool_size"
 
     def init(self, conf: ConfigTree):
         """
@@ -34,6 +39,9 @@ class SQLAlchemyEngine(Engine):
         self.conn_string = conf.get_string(SQLAlchemyEngine.CONN_STRING_KEY)
         self.connect_args = connect_args
         self.credentials_path = conf.get(SQLAlchemyEngine.CREDENTIALS_PATH_KEY, None)
+        self.pool_size = conf.get(SQLAlchemyEngine.POOL_SIZE_KEY, None)
+        self.engine = None
+        self._thread = threading.current_thread()
         self.connection = self._get_connection()
 
         model_class = conf.get(SQLAlchemyEngine.MODEL_CLASS_KEY, None)
@@ -42,34 +50,67 @@ class SQLAlchemyEngine(Engine):
             mod = importlib.import_module(module_name)
             self.model_class = getattr(mod, class_name)
 
+    def _get_engine(self):
+        """
+        Create a SQLAlchemy engine for `conn_string`, whose connection pool is
+        shared by all connections made by this object. If `pool_size` is set,
+        the pool keeps this many connections open, where the dialect pools
+        connections in a queue.
+        """
+        if self.engine is None:
+            kwargs = {'connect_args': self.connect_args}
+            if self.credentials_path:
+                kwargs['credentials_path'] = self.credentials_path
+            if self.pool_size and self._is_queue_pooled():
+                kwargs['pool_size'] = self.pool_size
+            self.engine = create_engine(self.conn_string, **kwargs)
+        return self.engine
+
+    def _is_queue_pooled(self):
+        # Other pools (e.g. sqlite's) don't accept a size
+        url = make_url(self.conn_string)
+        return issubclass(url.get_dialect().get_pool_class(url), QueuePool)
+
     def _get_connection(self):
         """
         Create a SQLAlchemy connection to `conn_string`.
         """
-        if self.credentials_path:
-            engine = create_engine(
-                self.conn_string,
-                credentials_path=self.credentials_path,
-                connect_args=self.connect_args
-            )
+        return self._get_engine().connect()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Yield `connection` on the thread that initialized this engine. Other
+        threads borrow a connection from the engine's pool until they're done,
+        so that engines can be shared by concurrent queries.
+        """
+        if threading.current_thread() is self._thread:
+            yield self.connection
         else:
-            engine = create_engine(
-                self.conn_string,
-                connect_args=self.connect_args
-            )
-        conn = engine.connect()
-        return conn
+            connection = self._get_connection()
+            try:
+                yield connection
+            finally:
+                connection.close()
 
     def execute(
-        self, query: str, is_dict_return_enabled: bool = False, has_header: bool = False
+        self,
+        query: str,
+        is_dict_return_enabled: bool = False,
+        has_header: bool = False,
+        stream_results: bool = False,
     ) -> Iterator:
         """
         Execute `query` over `conn_string`, and yield rows.
 
         :param query: SQL query to execute.
+        :param stream_results: Fetch rows from the server in batches as they
+            are consumed, rather than all at once, where the dialect supports it.
         """
-        try:
-            results = self.connection.execute(query)
+        with self._connect() as connection:
+            if stream_results:
+                connection = connection.execution_options(stream_results=True)
+            results = connection.execute(query)
             keys = results.keys()
 
             if has_header:
@@ -84,8 +125,6 @@ class SQLAlchemyEngine(Engine):
                         yield dict(zip(keys, row))
                     else:
                         yield row
-        except Exception as e:
-            raise e
 
     def get_scope(self):
         # type: () -> str
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import re
+import threading
 from collections import namedtuple
 
 from google.cloud import datacatalog_v1
@@ -29,12 +30,15 @@ class BaseBigQueryExtractor(Extractor):
     CRED_KEY = "project_cred"
     PAGE_SIZE_KEY = "page_size"
     FILTER_KEY = "filter"
+    MAX_WORKERS_KEY = "max_workers"
     _DEFAULT_SCOPES = [
         "https://www.googleapis.com/auth/cloud-platform",
         "https://www.googleapis.com/auth/bigquery.readonly",
     ]
     DEFAULT_PAGE_SIZE = 300
+    DEFAULT_MAX_WORKERS = 8
     NUM_RETRIES = 3
+    QUERY_TIMEOUT_MS = 60 * 1000
     DATE_LENGTH = 8
     INCLUDED_TABLES_REGEX = "included_tables_regex"
 
@@ -54,6 +58,10 @@ class BaseBigQueryExtractor(Extractor):
             BaseBigQueryExtractor.PAGE_SIZE_KEY, BaseBigQueryExtractor.DEFAULT_PAGE_SIZE
         )
         self.filter = conf.get_string(BaseBigQueryExtractor.FILTER_KEY, "")
+        max_workers = conf.get_int(BaseBigQueryExtractor.MAX_WORKERS_KEY, None)
+        self.max_workers = max(
+            max_workers or BaseBigQueryExtractor.DEFAULT_MAX_WORKERS, 1
+        )
 
         included_tables_regex = conf.get_string(
             BaseBigQueryExtractor.INCLUDED_TABLES_REGEX, None
@@ -80,8 +88,9 @@ class BaseBigQueryExtractor(Extractor):
             else:
                 credentials, _ = google.auth.default(scopes=self._DEFAULT_SCOPES)
 
-        http = httplib2.Http()
-        authed_http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+        self._credentials = credentials
+        self._local = threading.local()
+        authed_http = self._get_http()
         self.bigquery_service = build(
             "bigquery", "v2", http=authed_http, cache_discovery=False
         )
@@ -96,6 +105,17 @@ class BaseBigQueryExtractor(Extractor):
         except StopIteration:
             return None
 
+    def _get_http(self):
+        # httplib2.Http isn't thread-safe, so each thread sends requests over
+        # its own, e.g. with `request.execute(http=self._get_http())`
+        authed_http = getattr(self._local, "authed_http", None)
+        if authed_http is None:
+            authed_http = google_auth_httplib2.AuthorizedHttp(
+                self._credentials, http=httplib2.Http()
+            )
+            self._local.authed_http = authed_http
+        return authed_http
+
     def _is_sharded_table(self, table_id):
         suffix = table_id[-BaseBigQueryExtractor.DATE_LENGTH :]
         return suffix.isdigit()
@@ -106,7 +126,7 @@ class BaseBigQueryExtractor(Extractor):
         else:
             table_id = tableRef["tableId"]
             if self._is_sharded_table(table_id):
-                table_id = table_id[-BaseBigQueryExtractor.DATE_LENGTH :]
+                table_id = table_id[: -BaseBigQueryExtractor.DATE_LENGTH]
 
             full_table_address = "{}.{}.{}".format(
                 tableRef["projectId"], tableRef["datasetId"], table_id
@@ -193,5 +213,51 @@ class BaseBigQueryExtractor(Extractor):
             else:
                 response = None
 
+    def _run_query(self, query: str) -> dict:
+        return (
+            self.bigquery_service.jobs()
+            .query(
+                projectId=self.project_id,
+                body={
+                    "query": query,
+                    "useLegacySql": False,
+                    "timeoutMs": BaseBigQueryExtractor.QUERY_TIMEOUT_MS,
+                },
+            )
+            .execute(num_retries=BaseBigQueryExtractor.NUM_RETRIES)
+        )
+
+    def _page_query_results(self, response: dict) -> Any:
+        job_reference = response["jobReference"]
+        while response:
+            page_token = None
+            if response.get("jobComplete", False):
+                yield response
+                if "pageToken" not in response:
+                    return
+                page_token = response["pageToken"]
+
+            response = (
+                self.bigquery_service.jobs()
+                .getQueryResults(
+                    projectId=job_reference["projectId"],
+                    jobId=job_reference["jobId"],
+                    location=job_reference.get("location"),
+                    pageToken=page_token,
+                    timeoutMs=BaseBigQueryExtractor.QUERY_TIMEOUT_MS,
+                )
+                .execute(num_retries=BaseBigQueryExtractor.NUM_RETRIES)
+            )
+
+    def _iterate_over_query_rows(self, response: dict) -> Any:
+        """
+        Yields each row of the results of a `_run_query` response, as a dict,
+        fetching later pages as they're needed.
+        """
+        for page in self._page_query_results(response):
+            field_names = [field["name"] for field in page["schema"]["fields"]]
+            for row in page.get("rows", []):
+                yield dict(zip(field_names, [cell["v"] for cell in row["f"]]))
+
     def get_scope(self) -> str:
         return "extractor.bigquery_table_metadata"
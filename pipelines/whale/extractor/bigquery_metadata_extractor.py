@@ -1,13 +1,21 @@
+import ast
 import logging
 import json
-from collections import namedtuple
+import os
+import re
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import groupby
 
+from googleapiclient.errors import HttpError
 from pyhocon import ConfigTree  # noqa: F401
-from typing import List, Any  # noqa: F401
+from typing import Dict, List, Any, Optional, Tuple  # noqa: F401
 
 from whale.extractor.base_bigquery_extractor import BaseBigQueryExtractor
 from whale.models.table_metadata import TableMetadata
 from whale.models.column_metadata import ColumnMetadata
+from whale.utils import paths
+from whale.utils.extraction_state import ExtractionState
 
 
 DatasetRef = namedtuple("DatasetRef", ["datasetId", "projectId"])
@@ -15,6 +23,155 @@ TableKey = namedtuple("TableKey", ["schema", "table_name"])
 
 LOGGER = logging.getLogger(__name__)
 
+# Every column (including nested fields) of every table in a dataset, along
+# with the options of each table, in the order of the tables' columns
+INFORMATION_SCHEMA_QUERY = """
+SELECT
+  t.table_name
+  , t.table_type
+  , d.option_value AS table_description
+  , l.option_value AS table_labels
+  , p.column_name
+  , p.field_path
+  , p.data_type
+  , p.description
+FROM {dataset_address}.INFORMATION_SCHEMA.TABLES t
+LEFT JOIN {dataset_address}.INFORMATION_SCHEMA.TABLE_OPTIONS d
+  ON d.table_name = t.table_name AND d.option_name = 'description'
+LEFT JOIN {dataset_address}.INFORMATION_SCHEMA.TABLE_OPTIONS l
+  ON l.table_name = t.table_name AND l.option_name = 'labels'
+LEFT JOIN {dataset_address}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS p
+  ON p.table_name = t.table_name
+LEFT JOIN {dataset_address}.INFORMATION_SCHEMA.COLUMNS c
+  ON c.table_name = p.table_name AND c.column_name = p.column_name
+ORDER BY t.table_name, c.ordinal_position
+"""
+
+LAST_MODIFIED_TIMES_QUERY = """
+SELECT table_id, last_modified_time
+FROM {dataset_address}.__TABLES__
+"""
+
+# INFORMATION_SCHEMA uses standard SQL types, while the REST API (and so
+# existing metadata) uses legacy SQL types
+LEGACY_DATA_TYPES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "STRUCT": "RECORD",
+}
+LABEL_REGEX = re.compile(r'STRUCT\("((?:[^"\\]|\\.)*)", "((?:[^"\\]|\\.)*)"\)')
+
+
+def _index_tags(tags_dict: Optional[dict]) -> Tuple[Optional[dict], Dict[str, dict]]:
+    """
+    Splits the Data Catalog tags of a table into its table-level tag and the
+    tag of each column, keyed by column name. Later tags take precedence.
+    """
+    table_tag = None
+    column_tags = {}
+    if tags_dict and "tags" in tags_dict:
+        for tag in tags_dict["tags"]:
+            if "column" in tag:
+                column_tags[tag["column"]] = tag
+            else:
+                table_tag = tag
+    return table_tag, column_tags
+
+
+def _get_state_key(tableRef) -> str:
+    return "{projectId}.{datasetId}.{tableId}".format(**tableRef)
+
+
+def _parse_option_value(option_value: Optional[str]) -> Optional[str]:
+    # String options are given as quoted literals, e.g. "a \"description\""
+    if option_value is None:
+        return None
+    try:
+        return ast.literal_eval(option_value)
+    except (SyntaxError, ValueError):
+        return option_value
+
+
+def _get_legacy_data_type(data_type: str) -> str:
+    # Repeated fields have the same type as their elements in the REST API
+    while data_type.startswith("ARRAY<"):
+        data_type = data_type[len("ARRAY<") : -1]
+    base_type = re.match(r"\w+", data_type).group(0)
+    return LEGACY_DATA_TYPES.get(base_type, base_type)
+
+
+def _get_struct_field_names(data_type: str) -> List[str]:
+    """
+    Returns the names of the fields of a (repeated) STRUCT type, in order,
+    e.g. ["a", "b"] for "ARRAY<STRUCT<a STRING, b STRUCT<c INT64>>>".
+    """
+    match = re.match(r"(?:ARRAY<)*STRUCT<", data_type)
+    if match is None:
+        return []
+
+    fields = [""]
+    depth = 0
+    for char in data_type[match.end() :]:
+        if char in "<(":
+            depth += 1
+        elif char in ">)":
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == "," and depth == 0:
+            fields.append("")
+            continue
+        fields[-1] += char
+    return [field.split()[0].strip("`") for field in fields if field.strip()]
+
+
+def _get_table_from_rows(rows: List[dict]) -> dict:
+    """
+    Builds the REST representation of a table (with its nested schema) from
+    its INFORMATION_SCHEMA_QUERY rows.
+    """
+    rows_by_field_path = {
+        row["field_path"]: row for row in rows if row["field_path"] is not None
+    }
+
+    def get_field(field_path, name):
+        row = rows_by_field_path[field_path]
+        field = {
+            "name": name,
+            "type": _get_legacy_data_type(row["data_type"]),
+            "description": row["description"] or "",
+        }
+        if field["type"] == "RECORD":
+            field["fields"] = [
+                get_field(f"{field_path}.{child}", child)
+                for child in _get_struct_field_names(row["data_type"])
+            ]
+        return field
+
+    table_type = rows[0]["table_type"]
+    table = {
+        "type": "TABLE" if table_type == "BASE TABLE" else table_type.replace(" ", "_"),
+        "schema": {
+            "fields": [
+                get_field(row["field_path"], row["column_name"])
+                for row in rows
+                if row["field_path"] is not None
+                and row["field_path"] == row["column_name"]
+            ]
+        },
+    }
+
+    description = _parse_option_value(rows[0]["table_description"])
+    if description is not None:
+        table["description"] = description
+    if rows[0]["table_labels"] is not None:
+        table["labels"] = {
+            _parse_option_value(f'"{key}"'): _parse_option_value(f'"{value}"')
+            for key, value in LABEL_REGEX.findall(rows[0]["table_labels"])
+        }
+    return table
+
 
 class BigQueryMetadataExtractor(BaseBigQueryExtractor):
 
@@ -27,148 +184,340 @@ class BigQueryMetadataExtractor(BaseBigQueryExtractor):
 
     This extractor supports nested columns, which are delimited by a dot (.) in
     the column name.
+
+    Tables are filtered by `included_tables_regex` before they're fetched, and
+    up to `max_workers` tables (and their Data Catalog tags) are fetched at
+    once. Tables are yielded in the order they're listed.
+
+    If `is_information_schema_enabled`, the schemas of all tables in a dataset
+    are instead read with a single INFORMATION_SCHEMA query, falling back to
+    fetching each table for datasets where the query is denied.
+
+    If `is_incremental_enabled`, the last modified time of each table is read
+    with a single query per dataset, and tables that haven't been modified
+    since the last extraction are yielded from the state at `state_path`
+    instead of being fetched. All tables are fetched again once
+    `full_refresh_interval_days` have passed since the last full refresh, or
+    never if it's set to None.
     """
 
+    IS_INFORMATION_SCHEMA_ENABLED_KEY = "is_information_schema_enabled"
+    IS_INCREMENTAL_ENABLED_KEY = "is_incremental_enabled"
+    FULL_REFRESH_INTERVAL_DAYS_KEY = "full_refresh_interval_days"
+    STATE_PATH_KEY = "state_path"
+    DEFAULT_FULL_REFRESH_INTERVAL_DAYS = 7
+
+    LAST_MODIFIED_TIME_KEY = "last_modified_time"
+    TABLE_KEY = "table"
+    TAGS_KEY = "tags"
+
     def init(self, conf: ConfigTree) -> None:
         BaseBigQueryExtractor.init(self, conf)
         self.grouped_tables = set([])
+        self.is_information_schema_enabled = conf.get_bool(
+            BigQueryMetadataExtractor.IS_INFORMATION_SCHEMA_ENABLED_KEY, False
+        )
+
+        self.state = None
+        if conf.get_bool(BigQueryMetadataExtractor.IS_INCREMENTAL_ENABLED_KEY, False):
+            # Explicitly None to turn off full refreshes
+            full_refresh_interval_days = conf.get(
+                BigQueryMetadataExtractor.FULL_REFRESH_INTERVAL_DAYS_KEY,
+                BigQueryMetadataExtractor.DEFAULT_FULL_REFRESH_INTERVAL_DAYS,
+            )
+            state_path = conf.get_string(
+                BigQueryMetadataExtractor.STATE_PATH_KEY,
+                os.path.join(paths.EXTRACTION_STATE_PATH, f"{self._database}.json"),
+            )
+            self.state = ExtractionState(
+                state_path,
+                full_refresh_interval_seconds=(
+                    None
+                    if full_refresh_interval_days is None
+                    else float(full_refresh_interval_days) * 24 * 60 * 60
+                ),
+            )
+
+    def _iterate_over_tables(self) -> Any:
+        # Without state, every table is fetched
+        is_full_refresh = self.state is None or self.state.is_full_refresh_due
+        if self.state is not None and is_full_refresh:
+            LOGGER.info("Fetching all tables, as a full refresh is due.")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # Keep a bounded number of tables in flight, so that they're yielded
+        # in order without fetching every table up front
+        pending = deque()
+        is_complete = False
+        try:
+            for dataset in self._retrieve_datasets():
+                last_modified_times = {}
+                if self.state is not None:
+                    last_modified_times = self._get_last_modified_times(dataset)
+
+                for tableRef, table_id, table in self._retrieve_tables(dataset):
+                    last_modified_time = last_modified_times.get(tableRef["tableId"])
+                    future = None
+                    if not is_full_refresh:
+                        future = self._get_unmodified_table(
+                            tableRef, last_modified_time
+                        )
+                    if future is None:
+                        future = executor.submit(self._fetch_table, tableRef, table)
+                    pending.append((tableRef, table_id, last_modified_time, future))
+                    if len(pending) >= 2 * self.max_workers:
+                        yield self._collect_table(*pending.popleft())
+            while pending:
+                yield self._collect_table(*pending.popleft())
+            is_complete = True
+        finally:
+            for _, _, _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if self.state is not None:
+                self.state.save(
+                    is_complete=is_complete, is_full_refresh=is_full_refresh
+                )
+
+    def _get_last_modified_times(self, dataset) -> Dict[str, str]:
+        # tables.list doesn't include modification times, but __TABLES__ does
+        try:
+            response = self._run_query(
+                LAST_MODIFIED_TIMES_QUERY.format(
+                    dataset_address=f"`{dataset.projectId}.{dataset.datasetId}`"
+                )
+            )
+            return {
+                row["table_id"]: row["last_modified_time"]
+                for row in self._iterate_over_query_rows(response)
+            }
+        except HttpError as e:
+            LOGGER.warning(
+                f"Fetching all tables in {dataset.datasetId}, as their last"
+                f" modified times can't be queried: {e}"
+            )
+            return {}
+
+    def _get_unmodified_table(self, tableRef, last_modified_time) -> Optional[Future]:
+        if last_modified_time is None:
+            return None
+        entry = self.state.get(_get_state_key(tableRef))
+        if (
+            entry is None
+            or entry[BigQueryMetadataExtractor.LAST_MODIFIED_TIME_KEY]
+            != last_modified_time
+        ):
+            return None
+
+        future = Future()
+        future.set_result(
+            (
+                entry[BigQueryMetadataExtractor.TABLE_KEY],
+                entry[BigQueryMetadataExtractor.TAGS_KEY],
+            )
+        )
+        return future
+
+    def _collect_table(
+        self, tableRef, table_id, last_modified_time, future
+    ) -> TableMetadata:
+        table, tags_dict = future.result()
+        if self.state is not None and last_modified_time is not None:
+            self.state.update(
+                _get_state_key(tableRef),
+                {
+                    BigQueryMetadataExtractor.LAST_MODIFIED_TIME_KEY: last_modified_time,
+                    BigQueryMetadataExtractor.TABLE_KEY: table,
+                    BigQueryMetadataExtractor.TAGS_KEY: tags_dict,
+                },
+            )
+        return self._get_table_metadata(tableRef, table_id, table, tags_dict)
 
     def _retrieve_tables(self, dataset) -> Any:
+        """
+        Yields the reference, grouped id and (if already known) REST
+        representation of each table in `dataset` to be extracted.
+        """
+        if self.is_information_schema_enabled:
+            try:
+                response = self._query_information_schema(dataset)
+            except HttpError as e:
+                if e.resp.status != 403:
+                    raise
+                LOGGER.warning(
+                    f"Falling back to fetching each table in {dataset.datasetId},"
+                    f" as its INFORMATION_SCHEMA can't be queried: {e}"
+                )
+            else:
+                yield from self._retrieve_tables_from_information_schema(
+                    dataset, response
+                )
+                return
+
+        for tableRef, table_id in self._retrieve_table_refs(dataset):
+            yield tableRef, table_id, None
+
+    def _retrieve_table_refs(self, dataset) -> Any:
         for page in self._page_table_list_results(dataset):
             if "tables" not in page:
                 continue
 
             for table in page["tables"]:
                 tableRef = table["tableReference"]
-                table_id = tableRef["tableId"]
-
-                # BigQuery tables that have 8 digits as last characters are
-                # considered date range tables and are grouped together in the
-                # UI. (e.g. ga_sessions_20190101, ga_sessions_20190102, etc.)
-
-                if self._is_sharded_table(table_id):
-                    # If the last eight characters are digits, we assume the
-                    # table is of a table date range type and then we only need
-                    # one schema definition
-                    table_prefix = table_id[: -BigQueryMetadataExtractor.DATE_LENGTH]
-                    if table_prefix in self.grouped_tables:
-                        # If one table in the date range is processed, then
-                        # ignore other ones (it adds too much metadata)
-                        continue
-
-                    table_id = table_prefix
-                    self.grouped_tables.add(table_prefix)
-
-                table = (
-                    self.bigquery_service.tables()
-                    .get(
-                        projectId=tableRef["projectId"],
-                        datasetId=tableRef["datasetId"],
-                        tableId=tableRef["tableId"],
-                    )
-                    .execute(num_retries=BigQueryMetadataExtractor.NUM_RETRIES)
-                )
 
-                tags_dict = None
-                try:
-                    # Fetch entry for given linked_resource
-                    entry = self.datacatalog_service.lookup_entry(
-                        request={
-                            "linked_resource": f"//bigquery.googleapis.com/projects/{tableRef['projectId']}/datasets/{tableRef['datasetId']}/tables/{tableRef['tableId']}"
-                        }
-                    )
-                    if not isinstance(entry, dict):
-                        entry_json = entry.__class__.to_json(entry)
-                        entry = json.loads(entry_json)
+                # Filter before any table is fetched
+                if not self._is_table_match_regex(tableRef):
+                    continue
 
-                    # Fetch tags for given entry
-                    tags = self.datacatalog_service.list_tags(
-                        request={"parent": entry["name"]}
-                    )
-                    tags_dict = dict(tags)
-                except Exception as e:
-                    LOGGER.warning(f"Error fetching tags from Data Catalog: {e}")
-
-                cols = []
-                if self._is_table_match_regex(tableRef):
-                    # BigQuery tables also have interesting metadata about
-                    # partitioning data location (EU/US), mod/create time, etc...
-                    # Extract that some other time?
-                    # Not all tables have schemas
-                    if "schema" in table:
-                        schema = table["schema"]
-                        if "fields" in schema:
-                            total_cols = 0
-                            for column in schema["fields"]:
-                                total_cols = self._iterate_over_cols(
-                                    tags_dict, "", column, cols, total_cols + 1
-                                )
-
-                table_tag = None
-                if tags_dict and "tags" in tags_dict:
-                    for tag in tags_dict["tags"]:
-                        if "column" not in tag:
-                            table_tag = tag
-
-                table_meta = TableMetadata(
-                    database=self._database,
-                    cluster=tableRef["projectId"],
-                    schema=tableRef["datasetId"],
-                    name=table_id,
-                    description=table.get("description", ""),
-                    columns=cols,
-                    is_view=table["type"] == "VIEW",
-                    tags=table_tag,
-                    labels=table.get("labels", ""),
+                table_id = self._get_table_id(tableRef)
+                if table_id is not None:
+                    yield tableRef, table_id
+
+    def _get_table_id(self, tableRef) -> Optional[str]:
+        table_id = tableRef["tableId"]
+
+        # BigQuery tables that have 8 digits as last characters are
+        # considered date range tables and are grouped together in the
+        # UI. (e.g. ga_sessions_20190101, ga_sessions_20190102, etc.)
+
+        if self._is_sharded_table(table_id):
+            # If the last eight characters are digits, we assume the
+            # table is of a table date range type and then we only need
+            # one schema definition
+            table_prefix = table_id[: -BigQueryMetadataExtractor.DATE_LENGTH]
+            if table_prefix in self.grouped_tables:
+                # If one table in the date range is processed, then
+                # ignore other ones (it adds too much metadata)
+                return None
+
+            table_id = table_prefix
+            self.grouped_tables.add(table_prefix)
+        return table_id
+
+    def _query_information_schema(self, dataset) -> dict:
+        dataset_address = f"`{dataset.projectId}.{dataset.datasetId}`"
+        return self._run_query(
+            INFORMATION_SCHEMA_QUERY.format(dataset_address=dataset_address)
+        )
+
+    def _retrieve_tables_from_information_schema(self, dataset, response) -> Any:
+        # Rows are ordered by table, so each table is built as its rows stream
+        rows = self._iterate_over_query_rows(response)
+        for table_name, table_rows in groupby(rows, lambda row: row["table_name"]):
+            tableRef = {
+                "projectId": dataset.projectId,
+                "datasetId": dataset.datasetId,
+                "tableId": table_name,
+            }
+            if not self._is_table_match_regex(tableRef):
+                continue
+
+            table_id = self._get_table_id(tableRef)
+            if table_id is not None:
+                yield tableRef, table_id, _get_table_from_rows(list(table_rows))
+
+    def _fetch_table(self, tableRef, table=None) -> Any:
+        # Runs on worker threads, so requests go over the thread's own http
+        if table is None:
+            table = (
+                self.bigquery_service.tables()
+                .get(
+                    projectId=tableRef["projectId"],
+                    datasetId=tableRef["datasetId"],
+                    tableId=tableRef["tableId"],
+                )
+                .execute(
+                    http=self._get_http(),
+                    num_retries=BigQueryMetadataExtractor.NUM_RETRIES,
                 )
+            )
+
+        tags_dict = None
+        try:
+            # Fetch entry for given linked_resource
+            entry = self.datacatalog_service.lookup_entry(
+                request={
+                    "linked_resource": f"//bigquery.googleapis.com/projects/{tableRef['projectId']}/datasets/{tableRef['datasetId']}/tables/{tableRef['tableId']}"
+                }
+            )
+            if not isinstance(entry, dict):
+                entry_json = entry.__class__.to_json(entry)
+                entry = json.loads(entry_json)
+
+            # Fetch tags for given entry
+            tags = self.datacatalog_service.list_tags(request={"parent": entry["name"]})
+            tags_dict = dict(tags)
+        except Exception as e:
+            LOGGER.warning(f"Error fetching tags from Data Catalog: {e}")
+
+        return table, tags_dict
 
-                yield (table_meta)
+    def _get_table_metadata(
+        self, tableRef, table_id, table, tags_dict
+    ) -> TableMetadata:
+        table_tag, column_tags = _index_tags(tags_dict)
+
+        cols = []
+        # BigQuery tables also have interesting metadata about
+        # partitioning data location (EU/US), mod/create time, etc...
+        # Extract that some other time?
+        # Not all tables have schemas
+        if "schema" in table:
+            schema = table["schema"]
+            if "fields" in schema:
+                cols = self._iterate_over_cols(column_tags, schema["fields"])
+
+        return TableMetadata(
+            database=self._database,
+            cluster=tableRef["projectId"],
+            schema=tableRef["datasetId"],
+            name=table_id,
+            description=table.get("description", ""),
+            columns=cols,
+            is_view=table["type"] == "VIEW",
+            tags=table_tag,
+            labels=table.get("labels", ""),
+        )
 
     def _iterate_over_cols(
-        self,
-        tags_dict: dict,
-        parent: str,
-        column: str,
-        cols: List[ColumnMetadata],
-        total_cols: int,
-    ) -> int:
-        if len(parent) > 0:
-            col_name = "{parent}.{field}".format(parent=parent, field=column["name"])
-        else:
-            col_name = column["name"]
-
-        tags = None
-        if tags_dict and "tags" in tags_dict:
-            for tag in tags_dict["tags"]:
-                if "column" in tag:
-                    if tag["column"] == col_name:
-                        tags = tag
-
-        if column["type"] == "RECORD":
-            col = ColumnMetadata(
-                name=col_name,
-                description=column.get("description", ""),
-                data_type=column["type"],
-                sort_order=total_cols,
-                tags=tags,
-            )
-            cols.append(col)
+        self, column_tags: Dict[str, dict], fields: List[dict]
+    ) -> List[ColumnMetadata]:
+        """
+        Flattens `fields` into columns, where the fields of each RECORD
+        follow it and are named `record.field`. Sort orders are consecutive
+        within each top-level column, with a gap between top-level columns.
+        """
+        cols = []
+        total_cols = 0
+        for top_level_column in fields:
             total_cols += 1
-            for field in column["fields"]:
-                total_cols = self._iterate_over_cols(
-                    tags_dict, col_name, field, cols, total_cols
+            # Walk nested fields depth-first, without recursing
+            stack = [("", top_level_column)]
+            while stack:
+                parent, column = stack.pop()
+                if len(parent) > 0:
+                    col_name = "{parent}.{field}".format(
+                        parent=parent, field=column["name"]
+                    )
+                else:
+                    col_name = column["name"]
+
+                cols.append(
+                    ColumnMetadata(
+                        name=col_name,
+                        description=column.get("description", ""),
+                        data_type=column["type"],
+                        sort_order=total_cols,
+                        tags=column_tags.get(col_name),
+                    )
                 )
-            return total_cols
-        else:
-            col = ColumnMetadata(
-                name=col_name,
-                description=column.get("description", ""),
-                data_type=column["type"],
-                sort_order=total_cols,
-                tags=tags,
-            )
-            cols.append(col)
-            return total_cols + 1
+                total_cols += 1
+
+                if column["type"] == "RECORD":
+                    stack.extend(
+                        (col_name, field) for field in reversed(column["fields"])
+                    )
+        return cols
 
     def get_scope(self):
         # type: () -> str
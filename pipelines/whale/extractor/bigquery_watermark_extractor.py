@@ -4,8 +4,9 @@ import logging
 import datetime
 import textwrap
 
+from googleapiclient.errors import HttpError
 from pyhocon import ConfigTree  # noqa: F401
-from typing import List, Any  # noqa: F401
+from typing import Dict, List, Any, Optional  # noqa: F401
 
 from whale.extractor.base_bigquery_extractor import BaseBigQueryExtractor
 from databuilder.models.watermark import Watermark
@@ -16,8 +17,38 @@ PartitionInfo = namedtuple("PartitionInfo", ["partition_id", "epoch_created"])
 
 LOGGER = logging.getLogger(__name__)
 
+# The lowest and highest partition of every partitioned table in a dataset.
+# INFORMATION_SCHEMA.PARTITIONS has no creation time, so the partitions' last
+# modified time is used instead
+PARTITIONS_QUERY = """
+SELECT
+  table_name
+  , MIN(partition_id) AS low_partition_id
+  , UNIX_MILLIS(
+      ARRAY_AGG(last_modified_time ORDER BY partition_id LIMIT 1)[OFFSET(0)]
+    ) AS low_modified_time
+  , MAX(partition_id) AS high_partition_id
+  , UNIX_MILLIS(
+      ARRAY_AGG(last_modified_time ORDER BY partition_id DESC LIMIT 1)[OFFSET(0)]
+    ) AS high_modified_time
+FROM {dataset_address}.INFORMATION_SCHEMA.PARTITIONS
+WHERE partition_id NOT IN (
+  '__UNPARTITIONED__', '__STREAMING_UNPARTITIONED__', '__NULL__'
+)
+GROUP BY table_name
+"""
+
 
 class BigQueryWatermarkExtractor(BaseBigQueryExtractor):
+    """
+    Extracts the low and high watermarks of partitioned and date-sharded
+    tables.
+
+    The partitions of all tables in a dataset are summarized with a single
+    INFORMATION_SCHEMA.PARTITIONS query, falling back to querying each
+    table's partitions if that fails.
+    """
+
     def init(self, conf):
         # type: (ConfigTree) -> None
         BaseBigQueryExtractor.init(self, conf)
@@ -30,6 +61,9 @@ class BigQueryWatermarkExtractor(BaseBigQueryExtractor):
     def _retrieve_tables(self, dataset):
         # type: () -> Any
         sharded_table_watermarks = {}
+        # Only queried once a partitioned table is found
+        dataset_partitions = None
+        is_dataset_queried = False
 
         for page in self._page_table_list_results(dataset):
             if "tables" not in page:
@@ -61,8 +95,15 @@ class BigQueryWatermarkExtractor(BaseBigQueryExtractor):
                                 "low": suffix,
                                 "table": table,
                             }
-                    else:
-                        partitions = self._get_partitions(table, tableRef)
+                    elif "timePartitioning" in table:
+                        if not is_dataset_queried:
+                            dataset_partitions = self._get_dataset_partitions(dataset)
+                            is_dataset_queried = True
+
+                        if dataset_partitions is not None:
+                            partitions = dataset_partitions.get(tableRef["tableId"])
+                        else:
+                            partitions = self._get_partitions(table, tableRef)
                         if not partitions:
                             continue
                         low, high = self._get_partition_watermarks(
@@ -99,6 +140,38 @@ class BigQueryWatermarkExtractor(BaseBigQueryExtractor):
                     cluster=tableRef["projectId"],
                 )
 
+    def _get_dataset_partitions(
+        self, dataset: DatasetRef
+    ) -> Optional[Dict[str, List[PartitionInfo]]]:
+        """
+        Returns the lowest and highest partition of each partitioned table in
+        `dataset`, or None if INFORMATION_SCHEMA.PARTITIONS can't be queried.
+        """
+        dataset_address = f"`{dataset.projectId}.{dataset.datasetId}`"
+        try:
+            response = self._run_query(
+                PARTITIONS_QUERY.format(dataset_address=dataset_address)
+            )
+            return {
+                row["table_name"]: [
+                    PartitionInfo(
+                        row["low_partition_id"],
+                        float(row["low_modified_time"]) / 1000,
+                    ),
+                    PartitionInfo(
+                        row["high_partition_id"],
+                        float(row["high_modified_time"]) / 1000,
+                    ),
+                ]
+                for row in self._iterate_over_query_rows(response)
+            }
+        except HttpError as e:
+            LOGGER.warning(
+                f"Falling back to querying the partitions of each table in"
+                f" {dataset.datasetId}: {e}"
+            )
+            return None
+
     def _get_partitions(self, table, tableRef):
         if "timePartitioning" not in table:
             return
@@ -1,9 +1,10 @@
 import logging
-import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pyhocon import ConfigFactory
 
 from whale.engine.presto_engine import PrestoEngine
-from whale.utils import get_table_file_path_base
+from whale.utils import get_table_file_path_relative, paths, read_manifest
 
 LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +26,13 @@ class PrestoLoopExtractor(PrestoEngine):
     table in the db. This relies on a `PrestoEngine` base class, which has
     several methods (`get_...`) to execute and organize the results of queries
     against single tables.
+
+    Only tables in the manifest (i.e. that have a table stub) are queried.
+    Table metadata is fetched from information_schema for up to `batch_size`
+    tables of a schema at a time, while analyze and stats are run per table.
+    Queries are run by a pool of `max_workers` threads, each borrowing
+    connections from a shared engine, and results are yielded in the order
+    the tables are listed.
     """
 
     CONN_STRING_KEY = "conn_string"
@@ -37,6 +45,9 @@ class PrestoLoopExtractor(PrestoEngine):
     IS_ANALYZE_ENABLED_KEY = "is_analyze_enabled"
     IS_TABLE_METADATA_ENABLED_KEY = "is_table_metadata_enabled"
     IS_VIEW_QUERY_ENABLED_KEY = "is_view_query_enabled"
+    MAX_WORKERS_KEY = "max_workers"
+    MANIFEST_PATH_KEY = "manifest_path"
+    BATCH_SIZE_KEY = "batch_size"
 
     DEFAULT_CONFIG = ConfigFactory.from_dict(
         {
@@ -50,6 +61,9 @@ class PrestoLoopExtractor(PrestoEngine):
             IS_ANALYZE_ENABLED_KEY: False,
             IS_TABLE_METADATA_ENABLED_KEY: False,
             IS_VIEW_QUERY_ENABLED_KEY: False,
+            MAX_WORKERS_KEY: 8,
+            MANIFEST_PATH_KEY: paths.MANIFEST_PATH,
+            BATCH_SIZE_KEY: 1000,
         }
     )
 
@@ -80,6 +94,13 @@ class PrestoLoopExtractor(PrestoEngine):
         self._is_view_query_enabled = self.conf.get(
             PrestoLoopExtractor.IS_VIEW_QUERY_ENABLED_KEY
         )
+        self._max_workers = max(
+            self.conf.get_int(PrestoLoopExtractor.MAX_WORKERS_KEY), 1
+        )
+        self._manifest_path = self.conf.get_string(
+            PrestoLoopExtractor.MANIFEST_PATH_KEY
+        )
+        self._batch_size = max(self.conf.get_int(PrestoLoopExtractor.BATCH_SIZE_KEY), 1)
 
     def extract(self):
         if not self._extract_iter:
@@ -91,6 +112,44 @@ class PrestoLoopExtractor(PrestoEngine):
             return None
 
     def _get_extract_iter(self):
+        # Read once, rather than checking for each table's stub on disk
+        manifest_entries = read_manifest(self._manifest_path)
+
+        executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        # Keep a bounded number of tables in flight, so that they're yielded
+        # in order without queueing every table up front
+        pending = deque()
+        try:
+            for schema, tables in self._iterate_over_table_batches(manifest_entries):
+                metadata_future = None
+                if self._is_table_metadata_enabled:
+                    metadata_future = executor.submit(
+                        self.get_table_metadata_from_information_schema,
+                        schema,
+                        tables,
+                        cluster=self._cluster,
+                        is_view_query_enabled=self._is_view_query_enabled,
+                    )
+
+                for table in tables:
+                    table_future = None
+                    if self._is_analyze_enabled or self._is_stats_enabled:
+                        table_future = executor.submit(
+                            self._extract_table, schema, table
+                        )
+                    pending.append((table, metadata_future, table_future))
+                    if len(pending) >= 2 * self._max_workers:
+                        yield from self._collect_table(*pending.popleft())
+            while pending:
+                yield from self._collect_table(*pending.popleft())
+        finally:
+            for _, metadata_future, table_future in pending:
+                for future in [metadata_future, table_future]:
+                    if future is not None:
+                        future.cancel()
+            executor.shutdown(wait=True)
+
+    def _iterate_over_table_batches(self, manifest_entries):
         schemas = self.execute(self._sql_stmt_schemas)
         for schema_row in schemas:
             schema = schema_row[0]
@@ -106,42 +165,49 @@ class PrestoLoopExtractor(PrestoEngine):
                 n_tables = len(tables)
                 LOGGER.info("There are {} tables in {}.".format(n_tables, schema))
 
+                batch = []
                 for i, table_row in enumerate(tables):
                     if (i % 10 == 0) or (i == n_tables - 1):
                         LOGGER.info("On table {} of {}".format(i + 1, n_tables))
                     table = table_row[0]
-                    file_name = get_table_file_path_base(
+                    relative_file_path = get_table_file_path_relative(
                         database=self._database,
                         cluster=self._cluster,
                         schema=schema,
                         table=table,
                     )
                     # Only update if the stub already exists
-                    if os.path.exists(file_name + ".md"):
-
-                        if self._is_table_metadata_enabled:
-                            table_metadata = self.get_table_metadata(
-                                schema,
-                                table,
-                                cluster=self._cluster,
-                                is_view_query_enabled=self._is_view_query_enabled,
-                            )  # noqa: E501
-                            yield table_metadata
-
-                        if self._is_analyze_enabled:
-                            self.get_analyze(schema, table, self._cluster)
-
-                        if self._is_stats_enabled:
-                            stats_generator = self.get_stats(
-                                schema, table, self._cluster
-                            )
-                            yield from stats_generator
+                    if relative_file_path in manifest_entries:
+                        batch.append(table)
+                        if len(batch) >= self._batch_size:
+                            yield schema, batch
+                            batch = []
                     else:
                         LOGGER.info(
-                            "Skipping {}.{} because the file already exists.".format(
+                            "Skipping {}.{} because it has no table stub.".format(
                                 schema, table
                             )
                         )
+                if batch:
+                    yield schema, batch
+
+    def _extract_table(self, schema, table) -> list:
+        # Only for what information_schema doesn't have
+        records = []
+        if self._is_analyze_enabled:
+            self.get_analyze(schema, table, self._cluster)
+
+        if self._is_stats_enabled:
+            records.extend(self.get_stats(schema, table, self._cluster))
+        return records
+
+    def _collect_table(self, table, metadata_future, table_future):
+        if metadata_future is not None:
+            table_metadata = metadata_future.result().get(table)
+            if table_metadata is not None:
+                yield table_metadata
+        if table_future is not None:
+            yield from table_future.result()
 
     def get_scope(self):
         return "extractor.presto_loop"
@@ -1,22 +1,24 @@
+import contextlib
 import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime
 from pyhocon import ConfigFactory
-import subprocess
-import yaml
 from databuilder import Scoped
 
 from whale.engine.sql_alchemy_engine import SQLAlchemyEngine
-from whale.utils.paths import METADATA_PATH
+from whale.utils.paths import METADATA_PATH, METRIC_INDEX_PATH
 from whale.utils import get_table_info_from_path
+from whale.utils.metric_index import get_metric_index, parse_defined_metrics
 from whale.utils.sql import template_query
 from whale.utils.parsers import (
-    parse_ugc,
     sections_from_markdown,
-    DEFINED_METRICS_SECTION,
+    UGC_SECTION,
 )
 from whale.utils.markdown_delimiters import METRICS_DELIMITER
-from whale.utils.markdown_delimiters import DEFINED_METRICS_DELIMITER
 from whale.models.metric_value import MetricValue, SlackAlert
 
 SQLALCHEMY_ENGINE_SCOPE = SQLAlchemyEngine().get_scope()
@@ -28,12 +30,30 @@ LOGGER = logging.getLogger(__name__)
 
 
 class UGCRunner(SQLAlchemyEngine):
+    """
+    Runs the ```metrics queries defined in table stubs, yielding a MetricValue
+    for each.
+
+    Queries are run by a pool of `max_workers` threads, each querying over its
+    own connection from a shared engine, and are yielded in the order they're
+    defined. If `query_timeout` (in seconds) is set, a metric whose query
+    hasn't started or finished within this long is skipped. Its query is
+    cancelled where the driver supports it, and otherwise left to finish, after
+    which its worker replaces its connection. The process only exits once
+    every query left to finish has.
+    """
 
     DATABASE_KEY = "database"
+    MAX_WORKERS_KEY = "max_workers"
+    QUERY_TIMEOUT_KEY = "query_timeout"
+    METRIC_INDEX_PATH_KEY = "metric_index_path"
     DEFAULT_CONFIG = ConfigFactory.from_dict(
         {
             "table_stub_paths": None,
             SQLALCHEMY_CONN_STRING_KEY: None,
+            MAX_WORKERS_KEY: 1,
+            QUERY_TIMEOUT_KEY: None,
+            METRIC_INDEX_PATH_KEY: METRIC_INDEX_PATH,
         }
     )
 
@@ -42,14 +62,48 @@ class UGCRunner(SQLAlchemyEngine):
         self.sql_alch_conf = Scoped.get_scoped_conf(self.conf, SQLALCHEMY_ENGINE_SCOPE)
 
         self.database = self.conf.get(UGCRunner.DATABASE_KEY)
+        self.max_workers = max(self.conf.get_int(UGCRunner.MAX_WORKERS_KEY), 1)
+        # Keep a connection open for each worker, plus the initializing thread
+        self.sql_alch_conf.put(SQLAlchemyEngine.POOL_SIZE_KEY, self.max_workers + 1)
+        self.query_timeout = self.conf.get(UGCRunner.QUERY_TIMEOUT_KEY)
         table_stub_paths = self.conf.get("table_stub_paths")
         if table_stub_paths is None:
-            self.table_stub_paths = self._find_all_table_stub_paths()
+            self.metric_index = get_metric_index(
+                self.conf.get_string(UGCRunner.METRIC_INDEX_PATH_KEY)
+            )
+            self.table_stub_paths = self.metric_index.get_table_stub_paths(
+                os.path.join(METADATA_PATH, self.database)
+            )
+            self.metric_index.save()
         else:
+            self.metric_index = None
             self.table_stub_paths = table_stub_paths
 
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._extract_iter = None
 
+    @property
+    def connection(self):
+        # Each worker thread queries over its own connection
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._get_connection()
+            self.connection = connection
+        return connection
+
+    @connection.setter
+    def connection(self, connection):
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Connections are kept until all metrics have run
+        yield self.connection
+
     def extract(self):
         if not self._extract_iter:
             self._extract_iter = self._get_extract_iter()
@@ -59,62 +113,138 @@ class UGCRunner(SQLAlchemyEngine):
         except StopIteration:
             return None
 
-    def _find_all_table_stub_paths(self) -> list:
+    def _get_extract_iter(self):
+        if not self.table_stub_paths:
+            return
+        super().init(self.sql_alch_conf)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # Keep a bounded number of metrics in flight, so that they're yielded
+        # in order without queueing every query up front
+        pending = deque()
         try:
-            results = subprocess.check_output(
-                # f"grep -l '{METRICS_DELIMITER}' ~/.whale/metadata/{self.database}/* -d skip",
-                f"grep -l '{DEFINED_METRICS_DELIMITER}' ~/.whale/metadata/{self.database}/* -d skip",
-                shell=True,
-            )
-            results = results.decode("utf-8")
-            table_stubs_with_metrics = results.split("\n")[:-1]
-            table_stub_paths = [
-                os.path.join(METADATA_PATH, table_stub)
-                for table_stub in table_stubs_with_metrics
-            ]
-        except subprocess.CalledProcessError:
-            table_stub_paths = []
-        return table_stub_paths
+            for metric in self._iterate_over_metrics():
+                query = _MetricQuery()
+                future = executor.submit(self._run_metric, metric, query)
+                pending.append((metric, query, future))
+                if len(pending) >= 2 * self.max_workers:
+                    yield from self._collect_metric(*pending.popleft())
+            while pending:
+                yield from self._collect_metric(*pending.popleft())
+        finally:
+            for _, query, future in pending:
+                if not future.cancel():
+                    self._abandon_query(query)
+            # Abandoned queries keep their workers, which are still joined
+            # before the interpreter exits, and close their own connections
+            executor.shutdown(wait=False)
+            self._close_connections()
 
-    def _get_extract_iter(self):
+    def _iterate_over_metrics(self):
         # Loop through all table stubs that contain ```metrics
-        if self.table_stub_paths:
-            super().init(self.sql_alch_conf)
         for table_stub_path in self.table_stub_paths:
-            database, cluster, schema, table = get_table_info_from_path(table_stub_path)
-            metric_yamls = self._get_metrics_queries_from_table_stub_path(
-                table_stub_path
-            )
+            table_info = get_table_info_from_path(table_stub_path)
 
             # Get all ```metrics definitions in each file (there can be multiple)
-            for metric_yaml in metric_yamls:
-                metric_yaml = yaml.safe_load(metric_yaml)
-
+            for metric_yaml in self._get_metrics_from_table_stub_path(table_stub_path):
                 # Loop through all metrics defined in this ```metrics section.
                 for metric_name, metric_details in metric_yaml.items():
-                    execution_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                    sql_result = self._compute_sql_result(
-                        metric_details["sql"], database
-                    )
-
-                    description = metric_details.get("description")
-                    is_global = metric_details.get("is_global", False)
-                    alerts = metric_details.get("alerts")
-
-                    self._send_slack_alerts(alerts, sql_result)
-
-                    yield MetricValue(
-                        database=database,
-                        cluster=cluster,
-                        schema=schema,
-                        table=table,
-                        name=metric_name,
-                        description=description,
-                        execution_time=execution_time,
-                        value=sql_result,
-                        is_global=is_global,
-                    )
+                    yield table_info, metric_name, metric_details
+
+    def _run_metric(self, metric, query):
+        (database, _, _, _), _, metric_details = metric
+        query.start()
+        connection = None
+        try:
+            connection = self.connection
+            query.connection = connection
+            execution_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            sql_result = self._compute_sql_result(metric_details["sql"], database)
+            return execution_time, sql_result
+        finally:
+            if query.finish() and connection is not None:
+                # Given up on, so don't reuse a connection that may be mid-query
+                self._discard_connection(connection)
+
+    def _collect_metric(self, metric, query, future):
+        (database, cluster, schema, table), metric_name, metric_details = metric
+        timeout = None
+        if self.query_timeout is not None:
+            # Time queries from when they start, not while they're queued, but
+            # don't wait forever on workers held up by queries given up on
+            if not query.started.wait(self.query_timeout) and future.cancel():
+                LOGGER.warning(
+                    f"Metric {metric_name} on {schema}.{table} didn't start"
+                    f" within {self.query_timeout}s, skipping."
+                )
+                return
+            query.started.wait()
+            timeout = max(query.started_at + self.query_timeout - time.time(), 0)
+        try:
+            execution_time, sql_result = future.result(timeout=timeout)
+        except TimeoutError:
+            self._abandon_query(query)
+            LOGGER.warning(
+                f"Metric {metric_name} on {schema}.{table} timed out after"
+                f" {self.query_timeout}s, skipping."
+            )
+            return
+
+        description = metric_details.get("description")
+        is_global = metric_details.get("is_global", False)
+        alerts = metric_details.get("alerts")
+
+        self._send_slack_alerts(alerts, sql_result)
+
+        yield MetricValue(
+            database=database,
+            cluster=cluster,
+            schema=schema,
+            table=table,
+            name=metric_name,
+            description=description,
+            execution_time=execution_time,
+            value=sql_result,
+            is_global=is_global,
+        )
+
+    def _abandon_query(self, query):
+        # Giving up on a result doesn't stop its query, which keeps running
+        # on its worker and connection unless the driver can cancel it
+        if not query.abandon() or query.connection is None:
+            return
+        connection = query.connection
+        with self._connections_lock:
+            # Left to the worker to close, once its query is done with it
+            if connection in self._connections:
+                self._connections.remove(connection)
+        try:
+            cancel = getattr(connection.connection, "cancel", None)
+            if callable(cancel):
+                cancel()
+        except Exception as e:
+            LOGGER.debug(f"Failed to cancel query: {e}")
+
+    def _discard_connection(self, connection):
+        if getattr(self._local, "connection", None) is connection:
+            self._local.connection = None
+        with self._connections_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        try:
+            connection.close()
+        except Exception as e:
+            LOGGER.debug(f"Failed to close connection: {e}")
+
+    def _close_connections(self):
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                LOGGER.debug(f"Failed to close connection: {e}")
 
     def _compute_sql_result(self, sql_query, database):
         connected_query = template_query(sql_query, connection_name=database)
@@ -126,10 +256,12 @@ class UGCRunner(SQLAlchemyEngine):
             LOGGER.warning("Running {sql_query} led to {e}.")
             return None
 
-    def _get_metrics_queries_from_table_stub_path(self, table_stub_path):
+    def _get_metrics_from_table_stub_path(self, table_stub_path):
+        if self.metric_index is not None:
+            return self.metric_index.get_metrics(table_stub_path)
+
         sections = sections_from_markdown(table_stub_path)
-        ugc_sections = parse_ugc(sections["ugc"])
-        return ugc_sections[DEFINED_METRICS_SECTION]
+        return parse_defined_metrics(sections[UGC_SECTION], table_stub_path)
 
     def _send_slack_alerts(self, alerts, sql_result):
         if not alerts:
@@ -148,3 +280,38 @@ class UGCRunner(SQLAlchemyEngine):
 
     def get_scope(self):
         return "extractor.markdown_metric"
+
+
+class _MetricQuery(object):
+    """
+    When a metric's query started, the connection it's running over, and
+    whether its result has been given up on.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.started_at = None
+        self.connection = None
+        self._is_finished = False
+        self._is_abandoned = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.time()
+        self.started.set()
+
+    def finish(self) -> bool:
+        """
+        Marks the query as finished, returning whether it was abandoned.
+        """
+        with self._lock:
+            self._is_finished = True
+            return self._is_abandoned
+
+    def abandon(self) -> bool:
+        """
+        Abandons the query if it's still running, returning whether it was.
+        """
+        with self._lock:
+            self._is_abandoned = not self._is_finished
+            return self._is_abandoned
@@ -1,5 +1,6 @@
 import logging
 import os
+import threading
 import yaml
 
 from pathlib import Path
@@ -13,9 +14,17 @@ from whale.utils import (
     create_base_table_stub,
     get_table_file_path_base,
     get_table_file_path_relative,
+    read_manifest,
     safe_write,
 )
 from whale.utils import paths
+from whale.utils.catalog import Catalog, DEFAULT_BATCH_SIZE
+from whale.utils.fingerprints import get_fingerprint, get_fingerprint_store
+from whale.utils.metric_history import (
+    MetricHistory,
+    DEFAULT_DOWNSAMPLE_AFTER_DAYS,
+)
+from whale.utils.metric_index import get_metric_index
 from whale.utils.parsers import (
     parse_programmatic_blob,
     parse_ugc,
@@ -48,15 +57,63 @@ from whale.utils.parsers import (
 
 LOGGER = logging.getLogger(__name__)
 
+# Stages of a pull may run concurrently and update different sections of the
+# same table stub, so read-modify-write cycles are serialized per file. Locks
+# are striped to keep memory bounded on large catalogs.
+N_FILE_LOCKS = 64
+_FILE_LOCKS = [threading.Lock() for _ in range(N_FILE_LOCKS)]
+
+
+def get_file_lock(file_path):
+    return _FILE_LOCKS[hash(str(file_path)) % N_FILE_LOCKS]
+
+
 class WhaleLoader(Loader):
     """
     Loader class to format metadata as as a markdown doc for whale.
+
+    If buffering is enabled, records for the same table stub are held in
+    memory and written in a single read/rewrite of the file, when the
+    extractor moves on to another table, when `buffer_size` records are
+    pending, or on `close`.
+
+    If the catalog is enabled, each record is also upserted into the SQLite
+    catalog, which is committed every `catalog_batch_size` records and on
+    `close`. Similarly, if metric history is enabled, metric values are
+    appended to each connection's history, which is written on `close`.
     """
 
+    IS_BUFFERING_ENABLED_KEY = "is_buffering_enabled"
+    BUFFER_SIZE_KEY = "buffer_size"
+    IS_FINGERPRINTING_ENABLED_KEY = "is_fingerprinting_enabled"
+    FINGERPRINTS_PATH_KEY = "fingerprints_path"
+    IS_CATALOG_ENABLED_KEY = "is_catalog_enabled"
+    CATALOG_PATH_KEY = "catalog_path"
+    CATALOG_BATCH_SIZE_KEY = "catalog_batch_size"
+    IS_METRIC_INDEX_ENABLED_KEY = "is_metric_index_enabled"
+    METRIC_INDEX_PATH_KEY = "metric_index_path"
+    IS_METRIC_HISTORY_ENABLED_KEY = "is_metric_history_enabled"
+    METRIC_HISTORY_PATH_KEY = "metric_history_path"
+    METRIC_HISTORY_RETENTION_DAYS_KEY = "metric_history_retention_days"
+    METRIC_HISTORY_DOWNSAMPLE_AFTER_DAYS_KEY = "metric_history_downsample_after_days"
+
     DEFAULT_CONFIG = ConfigFactory.from_dict(
         {
             "base_directory": paths.METADATA_PATH,
             "tmp_manifest_path": paths.TMP_MANIFEST_PATH,
+            IS_BUFFERING_ENABLED_KEY: False,
+            BUFFER_SIZE_KEY: 1000,
+            IS_FINGERPRINTING_ENABLED_KEY: False,
+            FINGERPRINTS_PATH_KEY: paths.FINGERPRINTS_PATH,
+            IS_CATALOG_ENABLED_KEY: False,
+            CATALOG_PATH_KEY: paths.CATALOG_PATH,
+            CATALOG_BATCH_SIZE_KEY: DEFAULT_BATCH_SIZE,
+            IS_METRIC_INDEX_ENABLED_KEY: False,
+            METRIC_INDEX_PATH_KEY: paths.METRIC_INDEX_PATH,
+            IS_METRIC_HISTORY_ENABLED_KEY: False,
+            METRIC_HISTORY_PATH_KEY: paths.METRIC_HISTORY_PATH,
+            METRIC_HISTORY_RETENTION_DAYS_KEY: None,
+            METRIC_HISTORY_DOWNSAMPLE_AFTER_DAYS_KEY: DEFAULT_DOWNSAMPLE_AFTER_DAYS,
         }
     )
 
@@ -65,9 +122,41 @@ class WhaleLoader(Loader):
         self.base_directory = self.conf.get_string("base_directory")
         self.tmp_manifest_path = self.conf.get_string("tmp_manifest_path", None)
         self.database_name = self.conf.get_string("database_name", None)
+        self.is_buffering_enabled = self.conf.get_bool(
+            WhaleLoader.IS_BUFFERING_ENABLED_KEY
+        )
+        self.buffer_size = self.conf.get_int(WhaleLoader.BUFFER_SIZE_KEY)
+        self.fingerprint_store = None
+        if self.conf.get_bool(WhaleLoader.IS_FINGERPRINTING_ENABLED_KEY):
+            self.fingerprint_store = get_fingerprint_store(
+                self.conf.get_string(WhaleLoader.FINGERPRINTS_PATH_KEY)
+            )
+        self.metric_index = None
+        if self.conf.get_bool(WhaleLoader.IS_METRIC_INDEX_ENABLED_KEY):
+            self.metric_index = get_metric_index(
+                self.conf.get_string(WhaleLoader.METRIC_INDEX_PATH_KEY)
+            )
+        self.is_metric_history_enabled = self.conf.get_bool(
+            WhaleLoader.IS_METRIC_HISTORY_ENABLED_KEY
+        )
+        self._metric_histories = {}
+        self.catalog = None
+        if self.conf.get_bool(WhaleLoader.IS_CATALOG_ENABLED_KEY):
+            self.catalog = Catalog(self.conf.get_string(WhaleLoader.CATALOG_PATH_KEY))
+        self.catalog_batch_size = self.conf.get_int(WhaleLoader.CATALOG_BATCH_SIZE_KEY)
         Path(self.base_directory).mkdir(parents=True, exist_ok=True)
         Path(paths.MANIFEST_DIR).mkdir(parents=True, exist_ok=True)
 
+        self._created_directories = set()
+        self._buffered_file_path = None
+        self._buffered_table_info = None
+        self._buffered_records = []
+
+        # The manifest is held in memory and appended to on close
+        self._manifest_entries = set()
+        self._pending_manifest_entries = []
+        if self.tmp_manifest_path is not None:
+            self._manifest_entries = read_manifest(self.tmp_manifest_path)
 
     def load(self, record) -> None:
         """
@@ -106,38 +195,179 @@ class WhaleLoader(Loader):
 
         file_path = table_file_path_base + ".md"
         subdirectory = "/".join(file_path.split("/")[:-1])
-        Path(subdirectory).mkdir(parents=True, exist_ok=True)
+        if subdirectory not in self._created_directories:
+            Path(subdirectory).mkdir(parents=True, exist_ok=True)
+            self._created_directories.add(subdirectory)
+
+        table_info = {
+            "database": database,
+            "cluster": cluster,
+            "schema": schema,
+            "table": table,
+        }
 
-        if not os.path.exists(file_path):
-            create_base_table_stub(
-                file_path=file_path,
-                database=database,
-                cluster=cluster,
-                schema=schema,
-                table=table,
+        if self.is_buffering_enabled:
+            self._buffer(file_path, table_info, record)
+        else:
+            _write_records(
+                file_path,
+                table_info,
+                [record],
+                self.fingerprint_store,
+                self.metric_index,
             )
 
-        update_markdown(file_path, record)
+        relative_file_path = get_table_file_path_relative(
+            database, cluster, schema, table
+        )
+
+        if self.is_metric_history_enabled and type(record) == MetricValue:
+            self._get_metric_history(database).append(record)
+
+        if self.catalog is not None:
+            self.catalog.upsert(relative_file_path, record)
+            if self.catalog.n_pending_statements >= self.catalog_batch_size:
+                self.catalog.commit()
 
         # add path if it does not exist yet
         if self.tmp_manifest_path is not None:
-            _append_to_temp_manifest(
-                database=database,
-                cluster=cluster,
-                schema=schema,
-                table=table,
-                tmp_manifest_path=self.tmp_manifest_path,
+            if relative_file_path not in self._manifest_entries:
+                self._manifest_entries.add(relative_file_path)
+                self._pending_manifest_entries.append(relative_file_path)
+
+    def flush(self):
+        """
+        Writes all buffered records to their table stub.
+        """
+        if self._buffered_records:
+            _write_records(
+                self._buffered_file_path,
+                self._buffered_table_info,
+                self._buffered_records,
+                self.fingerprint_store,
+                self.metric_index,
             )
+        self._buffered_file_path = None
+        self._buffered_table_info = None
+        self._buffered_records = []
 
     def close(self):
-        pass
+        self.flush()
+        self._flush_manifest()
+        for metric_history in self._metric_histories.values():
+            metric_history.flush()
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.fingerprint_store is not None:
+            self.fingerprint_store.save()
+        if self.metric_index is not None:
+            self.metric_index.save()
 
     def get_scope(self):
         # type: () -> str
         return "loader.whale"
 
+    def _get_metric_history(self, database):
+        if database not in self._metric_histories:
+            self._metric_histories[database] = MetricHistory(
+                database,
+                base_directory=self.conf.get_string(
+                    WhaleLoader.METRIC_HISTORY_PATH_KEY
+                ),
+                retention_days=self.conf.get(
+                    WhaleLoader.METRIC_HISTORY_RETENTION_DAYS_KEY
+                ),
+                downsample_after_days=self.conf.get(
+                    WhaleLoader.METRIC_HISTORY_DOWNSAMPLE_AFTER_DAYS_KEY
+                ),
+            )
+        return self._metric_histories[database]
+
+    def _flush_manifest(self):
+        if not self._pending_manifest_entries:
+            return
+
+        with open(self.tmp_manifest_path, "a") as f:
+            f.writelines(entry + "\n" for entry in self._pending_manifest_entries)
+        self._pending_manifest_entries = []
+
+    def _buffer(self, file_path, table_info, record):
+        # The extractor has moved on to another table
+        if self._buffered_file_path not in (None, file_path):
+            self.flush()
+
+        self._buffered_file_path = file_path
+        self._buffered_table_info = table_info
+        self._buffered_records.append(record)
+
+        if len(self._buffered_records) >= self.buffer_size:
+            self.flush()
+
+
+def _write_records(
+    file_path, table_info, records, fingerprint_store=None, metric_index=None
+):
+    with get_file_lock(file_path):
+        if not os.path.exists(file_path):
+            create_base_table_stub(file_path=file_path, **table_info)
+
+        if fingerprint_store is None:
+            sections = update_markdown_from_records(file_path, records)
+            if metric_index is not None:
+                metric_index.update(file_path, sections[UGC_SECTION])
+            return
+
+        fingerprints = {}
+        for record in records:
+            fingerprint_key, fingerprint = _get_record_fingerprint(record)
+            if fingerprint_key is not None:
+                fingerprints[fingerprint_key] = fingerprint
+
+        # Records whose section is unchanged since the last write are no-ops
+        unchanged_keys = fingerprint_store.get_unchanged_keys(file_path, fingerprints)
+        records = [
+            record
+            for record in records
+            if _get_record_fingerprint(record)[0] not in unchanged_keys
+        ]
+        if not records:
+            return
+
+        sections = update_markdown_from_records(file_path, records)
+        fingerprint_store.update(file_path, fingerprints)
+        if metric_index is not None:
+            metric_index.update(file_path, sections[UGC_SECTION])
+
+
+def _get_record_fingerprint(record):
+    """
+    Returns the key of the section that `record` fully determines, along with
+    a hash of its contents, or (None, None) if the record can't be skipped.
+    """
+    if type(record) in [
+        metadata_model_whale.TableMetadata,
+        metadata_model_amundsen.TableMetadata,
+    ]:
+        return HEADER_SECTION, get_fingerprint(record.format_for_markdown())
+    elif type(record) == TableIndexesMetadata:
+        return INDEX_SECTION, get_fingerprint(record.format_for_markdown())
+    elif type(record) == Watermark:
+        return (
+            f"{PARTITION_SECTION}.{record.part_type}",
+            get_fingerprint(repr(record.parts)),
+        )
+    return None, None
+
 
 def update_markdown(file_path, record):
+    update_markdown_from_records(file_path, [record])
+
+
+def update_markdown_from_records(file_path, records):
+    """
+    Applies each of `records`, in order, to the table stub at `file_path`,
+    reading and rewriting the file only once. Returns the stub's new sections.
+    """
     # Key (on record type) functions that take actions on a table stub
     section_methods = {
         MetricValue: _update_metric,
@@ -151,11 +381,13 @@ def update_markdown(file_path, record):
     # The table metadata record has both a header and column details. Add
     # custom logic to handle both.
 
-    section_method = section_methods[type(record)]
-    sections = section_method(sections, record)
+    for record in records:
+        section_method = section_methods[type(record)]
+        sections = section_method(sections, record)
 
     new_file_text = markdown_from_sections(sections)
     safe_write(file_path, new_file_text)
+    return sections
 
 
 def format_yaml_section(section, delimiter):
@@ -259,23 +491,3 @@ def _get_section_from_metrics(metrics):
         markdown_blob = f"{metric}: {metric_details['value']} @ {metric_details['execution_time']}\n"
         markdown_blobs.append(markdown_blob)
     return "".join(markdown_blobs)
-
-
-def _append_to_temp_manifest(
-    database, cluster, schema, table, tmp_manifest_path=paths.TMP_MANIFEST_PATH
-):
-    # read current manifest
-    tmp = []
-    if os.path.exists(tmp_manifest_path):
-        with open(tmp_manifest_path, "r") as f:
-            tmp = list(map(lambda s: s.strip(), f.readlines()))
-
-
-    # only add new entries
-    relative_file_path = get_table_file_path_relative(database, cluster, schema, table)
-    # LOGGER.warning(f"###: {relative_file_path}")
-
-    with open(tmp_manifest_path, "a") as f:
-        if not relative_file_path in tmp:
-            tmp.append(relative_file_path)
-            f.write(relative_file_path + "\n")
@@ -2,6 +2,50 @@ from typing import Optional, List
 
 
 class ConnectionConfigSchema(object):
+    # Connections are loaded once per process and shared, so they can't be
+    # changed once created
+    __slots__ = (
+        "uri",
+        "connect_args",
+        "port",
+        "metadata_source",
+        "dialect",
+        "username",
+        "password",
+        "name",
+        "account",
+        "database",
+        "instance",
+        "cluster",
+        "role",
+        "is_location_parsing_enabled",
+        "included_schemas",
+        "excluded_schemas",
+        "included_keys",
+        "excluded_keys",
+        "included_key_regex",
+        "excluded_key_regex",
+        "included_tables_regex",
+        "build_script_path",
+        "venv_path",
+        "python_binary",
+        "key_path",
+        "project_id",
+        "project_credentials",
+        "page_size",
+        "filter_key",
+        "where_clause_suffix",
+        "max_concurrency",
+        "metric_max_concurrency",
+        "metric_timeout",
+        "table_max_concurrency",
+        "is_information_schema_enabled",
+        "is_incremental_enabled",
+        "full_refresh_interval_days",
+        "conn_string",
+        "_is_frozen",
+    )
+
     def __init__(
         self,
         metadata_source: str,
@@ -34,6 +78,13 @@ class ConnectionConfigSchema(object):
         page_size: Optional[str] = None,
         filter_key: Optional[str] = None,
         where_clause_suffix: Optional[str] = "",
+        max_concurrency: Optional[int] = 1,
+        metric_max_concurrency: Optional[int] = 4,
+        metric_timeout: Optional[float] = None,
+        table_max_concurrency: Optional[int] = 8,  # Bigquery-specific
+        is_information_schema_enabled: bool = False,  # Bigquery-specific
+        is_incremental_enabled: bool = False,  # Bigquery-specific
+        full_refresh_interval_days: Optional[float] = 7,  # Bigquery-specific
     ):
 
         self.uri = uri
@@ -69,8 +120,21 @@ class ConnectionConfigSchema(object):
         self.page_size = page_size
         self.filter_key = filter_key
         self.where_clause_suffix = where_clause_suffix
+        self.max_concurrency = max_concurrency
+        self.metric_max_concurrency = metric_max_concurrency
+        self.metric_timeout = metric_timeout
+        self.table_max_concurrency = table_max_concurrency
+        self.is_information_schema_enabled = is_information_schema_enabled
+        self.is_incremental_enabled = is_incremental_enabled
+        self.full_refresh_interval_days = full_refresh_interval_days
 
         self.infer_conn_string()
+        self._is_frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_is_frozen", False):
+            raise AttributeError(f"Can't set `{name}`: connections are immutable.")
+        super().__setattr__(name, value)
 
     def infer_conn_string(self):
         if self.metadata_source == "bigquery":
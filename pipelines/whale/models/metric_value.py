@@ -1,11 +1,9 @@
 import os
 import logging
-from pathlib import Path
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
-from whale.utils import paths
-from whale.utils import get_table_file_path_relative
+from whale.utils.metric_history import MetricHistory
 
 LOGGER = logging.getLogger(__name__)
 
@@ -40,17 +38,13 @@ class MetricValue(object):
         self.markdown_blob = markdown_blob
 
     def record(self):
-        relative_file_path = (
-            get_table_file_path_relative(
-                self.database, self.cluster, self.schema, self.table
-            )
-            + f"/{self.name}.csv"
-        )
-        record_path = os.path.join(paths.METRICS_PATH, relative_file_path)
-        record_dirname = os.path.dirname(record_path)
-        Path(record_dirname).mkdir(parents=True, exist_ok=True)
-        with open(record_path, "a") as f:
-            f.write(f"{self.value},{self.execution_time}\n")
+        """
+        Appends this value to its connection's metric history. To record many
+        values at once, append them to a single MetricHistory instead.
+        """
+        metric_history = MetricHistory(self.database)
+        metric_history.append(self)
+        metric_history.flush()
 
 
 class SlackAlert(object):
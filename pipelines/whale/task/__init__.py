@@ -1,11 +1,13 @@
 import csv
 import logging
 import os
+import threading
 from datetime import datetime
 from databuilder.task.task import DefaultTask
 from whale.utils import paths
 
 LOGGER = logging.getLogger(__name__)
+STATS_LOCK = threading.Lock()
 
 
 class WhaleTask(DefaultTask):
@@ -36,6 +38,10 @@ class WhaleTask(DefaultTask):
 
     def save_stats(self):
         LOGGER.info("Saving task-level statistics.")
+        with STATS_LOCK:
+            self._write_stats()
+
+    def _write_stats(self):
         has_headers = os.path.isfile(paths.TABLE_COUNT_PATH)
 
         with open(paths.TABLE_COUNT_PATH, "a") as csvfile:
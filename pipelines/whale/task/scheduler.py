@@ -0,0 +1,178 @@
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional  # noqa: F401
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_GROUP_CONCURRENCY = 1
+
+
+class Job(object):
+    """
+    A unit of work within a Scheduler.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable,
+        dependencies: Iterable[str] = (),
+        group: Optional[str] = None,
+        is_required: bool = True,
+    ):
+        """
+        :param name: Unique name of the job.
+        :param function: Zero-argument callable to run.
+        :param dependencies: Names of jobs that must succeed before this runs.
+        :param group: Name of the group whose concurrency limit applies.
+        :param is_required: If False, failures are logged as warnings rather
+            than raised at the end of the run.
+        """
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.group = group
+        self.is_required = is_required
+
+
+class Scheduler(object):
+    """
+    Runs jobs on a thread pool, respecting dependencies between jobs and a
+    per-group concurrency limit. Jobs whose dependencies fail are skipped.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+        self.jobs = {}  # type: Dict[str, Job]
+        self.group_concurrency = {}  # type: Dict[str, int]
+        self.succeeded = set()
+        self.failed = {}  # type: Dict[str, BaseException]
+        self.skipped = set()
+
+    def add_group(self, group: str, concurrency: int = DEFAULT_GROUP_CONCURRENCY):
+        self.group_concurrency[group] = max(1, concurrency or DEFAULT_GROUP_CONCURRENCY)
+
+    def add_job(
+        self,
+        name: str,
+        function: Callable,
+        dependencies: Iterable[str] = (),
+        group: Optional[str] = None,
+        is_required: bool = True,
+    ) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"Job `{name}` has already been scheduled.")
+        job = Job(
+            name=name,
+            function=function,
+            dependencies=dependencies,
+            group=group,
+            is_required=is_required,
+        )
+        self.jobs[name] = job
+        if group is not None and group not in self.group_concurrency:
+            self.add_group(group)
+        return job
+
+    def run(self):
+        """
+        Runs all jobs to completion. If any required job failed, the first
+        such exception is re-raised once every other job has finished.
+        """
+        for job in self.jobs.values():
+            for dependency in job.dependencies:
+                if dependency not in self.jobs:
+                    raise ValueError(
+                        f"Job `{job.name}` depends on unknown job `{dependency}`."
+                    )
+
+        pending = list(self.jobs.values())
+        running = {}
+        group_counts = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                pending = self._skip_unreachable(pending)
+
+                for job in self._get_ready_jobs(pending, group_counts):
+                    pending.remove(job)
+                    if job.group is not None:
+                        group_counts[job.group] = group_counts.get(job.group, 0) + 1
+                    running[executor.submit(job.function)] = job
+
+                if not running:
+                    for job in pending:
+                        LOGGER.warning(
+                            f"Skipping `{job.name}`: unresolvable dependencies."
+                        )
+                        self.skipped.add(job.name)
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    if job.group is not None:
+                        group_counts[job.group] -= 1
+                    self._record_result(job, future.exception())
+
+        for job in self.jobs.values():
+            if job.name in self.failed and job.is_required:
+                raise self.failed[job.name]
+
+    def _get_ready_jobs(self, pending: List[Job], group_counts: dict) -> List[Job]:
+        ready = []
+        counts = dict(group_counts)
+        for job in pending:
+            if not all(dependency in self.succeeded for dependency in job.dependencies):
+                continue
+            if job.group is not None:
+                if counts.get(job.group, 0) >= self.group_concurrency[job.group]:
+                    continue
+                counts[job.group] = counts.get(job.group, 0) + 1
+            ready.append(job)
+        return ready
+
+    def _skip_unreachable(self, pending: List[Job]) -> List[Job]:
+        # Repeat until no more jobs are skipped, so that skips propagate
+        # through chains of dependencies.
+        is_skipping = True
+        while is_skipping:
+            is_skipping = False
+            still_pending = []
+            for job in pending:
+                blocked_by = [
+                    dependency
+                    for dependency in job.dependencies
+                    if dependency in self.failed or dependency in self.skipped
+                ]
+                if blocked_by:
+                    LOGGER.warning(
+                        f"Skipping `{job.name}` because `{blocked_by[0]}` did not complete."
+                    )
+                    self.skipped.add(job.name)
+                    is_skipping = True
+                else:
+                    still_pending.append(job)
+            pending = still_pending
+        return pending
+
+    def _record_result(self, job: Job, exception: Optional[BaseException]):
+        if exception is None:
+            self.succeeded.add(job.name)
+            return
+
+        self.failed[job.name] = exception
+        formatted_traceback = "".join(
+            traceback.format_exception(
+                type(exception), exception, exception.__traceback__
+            )
+        )
+        if job.is_required:
+            LOGGER.error(f"`{job.name}` failed: {exception}")
+            LOGGER.error(formatted_traceback)
+        else:
+            LOGGER.warning(exception)
+            LOGGER.warning(f"Skipping `{job.name}`.")
+            LOGGER.warning(formatted_traceback)
@@ -1,6 +1,6 @@
 import logging
 import os
-import shutil
+import threading
 from pathlib import Path
 from whale.utils.markdown_delimiters import UGC_DELIMITER
 from whale.utils import paths
@@ -8,6 +8,7 @@ from whale.utils import paths
 LOGGER = logging.getLogger(__name__)
 
 
+DEFAULT_CHECKPOINT_INTERVAL = 1000
 TABLE_RELATIVE_FILE_PATH = "{database}/{cluster}.{schema}.{table}"
 CLUSTERLESS_TABLE_RELATIVE_FILE_PATH = "{database}/{schema}.{table}"
 SCHEMALESS_TABLE_RELATIVE_FILE_PATH = "{database}/{table}"
@@ -94,14 +95,93 @@ def get_table_info_from_path(
 
 def safe_write(file_path_to_write, text_to_write, tmp_extension=".bak"):
     backup_file_path = file_path_to_write + tmp_extension
+    group_commit = _active_group_commit
 
     with open(backup_file_path, "w") as f:
         f.write(text_to_write)
-        f.flush()
-        os.fsync(f.fileno())
+        if group_commit is None:
+            f.flush()
+            os.fsync(f.fileno())
 
     os.rename(backup_file_path, file_path_to_write)
 
+    if group_commit is not None:
+        group_commit.register(file_path_to_write)
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_active_group_commit = None
+
+
+class GroupCommit(object):
+    """
+    Context manager that, while active, defers the per-file fsync in
+    `safe_write` to checkpoints, every `checkpoint_interval` writes and on
+    exit. A checkpoint fsyncs each file written since the last one, then each
+    written-to directory, so that the kernel can flush the files together.
+    Writes remain atomic, as files are still written then renamed into place,
+    but are only guaranteed to be durable once a checkpoint has completed.
+    """
+
+    def __init__(self, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._file_paths = set()
+        self._directories = set()
+        self._n_writes = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        global _active_group_commit
+        _active_group_commit = self
+
+    def stop(self):
+        global _active_group_commit
+        if _active_group_commit is self:
+            _active_group_commit = None
+        self.checkpoint()
+
+    def register(self, file_path):
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            self._file_paths.add(file_path)
+            self._directories.add(os.path.dirname(file_path))
+            self._n_writes += 1
+            is_checkpoint_due = self._n_writes >= self.checkpoint_interval
+
+        if is_checkpoint_due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self._lock:
+            file_paths = self._file_paths
+            directories = self._directories
+            self._file_paths = set()
+            self._directories = set()
+            self._n_writes = 0
+
+        for file_path in file_paths:
+            try:
+                fsync_path(file_path)
+            except FileNotFoundError:
+                # Removed since, so there's nothing left to make durable
+                pass
+        for directory in directories:
+            fsync_path(directory)
+
 
 def transfer_manifest(tmp_manifest_path):
     if os.path.exists(tmp_manifest_path):
@@ -110,10 +190,33 @@ def transfer_manifest(tmp_manifest_path):
         LOGGER.warning(f"No tmp manifest created at path: {tmp_manifest_path}")
 
 
-def copy_manifest(tmp_manifest_path):
-    if os.path.exists(tmp_manifest_path):
-        shutil.copy(tmp_manifest_path, paths.MANIFEST_PATH)
-    else:
-        LOGGER.warning(
-            f"No tmp manifest copied from {tmp_manifest_path} to {paths.MANIFEST_PATH}"
-        )
+def read_manifest(manifest_path) -> set:
+    entries = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            for line in f:
+                entry = line.strip()
+                if entry:
+                    entries.add(entry)
+    return entries
+
+
+def write_manifest(entries, manifest_path):
+    """
+    Atomically replaces `manifest_path` with `entries`, sorted and
+    deduplicated.
+    """
+    safe_write(
+        str(manifest_path), "".join(entry + "\n" for entry in sorted(set(entries)))
+    )
+
+
+def merge_manifests(manifest_paths, target_path):
+    """
+    Atomically replaces `target_path` with the sorted union of the entries
+    within `manifest_paths`.
+    """
+    entries = set()
+    for manifest_path in manifest_paths:
+        entries.update(read_manifest(manifest_path))
+    write_manifest(entries, target_path)
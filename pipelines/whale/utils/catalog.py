@@ -0,0 +1,259 @@
+import sqlite3
+from pathlib import Path
+from typing import List, Optional
+
+from databuilder.models.table_metadata import DescriptionMetadata
+from databuilder.models.watermark import Watermark
+import databuilder.models.table_metadata as metadata_model_amundsen
+
+from whale.utils import paths
+import whale.models.table_metadata as metadata_model_whale
+from whale.models.index_metadata import TableIndexesMetadata
+from whale.models.metric_value import MetricValue
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    table_key TEXT PRIMARY KEY,
+    database TEXT,
+    cluster TEXT,
+    schema TEXT,
+    name TEXT,
+    description TEXT,
+    is_view INTEGER
+);
+CREATE TABLE IF NOT EXISTS columns (
+    table_key TEXT,
+    name TEXT,
+    type TEXT,
+    description TEXT,
+    sort_order INTEGER,
+    PRIMARY KEY (table_key, name)
+);
+CREATE INDEX IF NOT EXISTS columns_name ON columns (name);
+CREATE INDEX IF NOT EXISTS columns_type ON columns (type);
+CREATE TABLE IF NOT EXISTS indexes (
+    table_key TEXT,
+    name TEXT,
+    columns TEXT,
+    index_type TEXT,
+    constraint_type TEXT,
+    architecture TEXT,
+    PRIMARY KEY (table_key, name)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    table_key TEXT,
+    part_type TEXT,
+    part_name TEXT,
+    part_value TEXT,
+    PRIMARY KEY (table_key, part_type, part_name)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    table_key TEXT,
+    name TEXT,
+    value TEXT,
+    execution_time TEXT,
+    PRIMARY KEY (table_key, name)
+);
+"""
+
+DEFAULT_BATCH_SIZE = 1000
+TIMEOUT_SECONDS = 60
+
+
+def _get_text(description):
+    if description is None:
+        return None
+    if isinstance(description, DescriptionMetadata):
+        return description._text
+    return str(description)
+
+
+class Catalog(object):
+    """
+    SQLite index of the tables, columns, indexes, watermarks and metrics
+    written to the table stubs, keyed on each stub's path relative to
+    ~/.whale/metadata (the same key used in the manifest).
+
+    Upserts are queued in memory and written in a single transaction on
+    `commit`, so that concurrent loaders only hold the write lock briefly.
+    """
+
+    def __init__(self, catalog_path=paths.CATALOG_PATH):
+        self.catalog_path = str(catalog_path)
+        Path(self.catalog_path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.catalog_path, timeout=TIMEOUT_SECONDS)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self._pending_statements = []
+
+    def upsert(self, table_key: str, record):
+        """
+        Queues the statements that bring `table_key` in line with `record`.
+        """
+        statements = self._pending_statements
+        if type(record) in [
+            metadata_model_whale.TableMetadata,
+            metadata_model_amundsen.TableMetadata,
+        ]:
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        table_key,
+                        record.database,
+                        record.cluster,
+                        record.schema,
+                        record.name,
+                        _get_text(record.description),
+                        int(bool(record.is_view)),
+                    ),
+                )
+            )
+            statements.append(("DELETE FROM columns WHERE table_key = ?", (table_key,)))
+            for column in record.columns:
+                statements.append(
+                    (
+                        "INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?, ?)",
+                        (
+                            table_key,
+                            column.name,
+                            column.type,
+                            _get_text(column.description),
+                            column.sort_order,
+                        ),
+                    )
+                )
+        elif type(record) == TableIndexesMetadata:
+            statements.append(("DELETE FROM indexes WHERE table_key = ?", (table_key,)))
+            for index in record.indexes:
+                statements.append(
+                    (
+                        "INSERT OR REPLACE INTO indexes VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            table_key,
+                            index.name,
+                            ",".join(index.columns),
+                            index.index_type,
+                            index.constraint,
+                            index.architecture,
+                        ),
+                    )
+                )
+        elif type(record) == Watermark:
+            part_type = "high" if record.part_type == "high_watermark" else "low"
+            for part_name, part_value in record.parts:
+                statements.append(
+                    (
+                        "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)",
+                        (table_key, part_type, part_name, str(part_value)),
+                    )
+                )
+        elif type(record) == MetricValue:
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)",
+                    (
+                        table_key,
+                        record.name,
+                        None if record.value is None else str(record.value),
+                        str(record.execution_time),
+                    ),
+                )
+            )
+
+    @property
+    def n_pending_statements(self) -> int:
+        return len(self._pending_statements)
+
+    def commit(self):
+        if not self._pending_statements:
+            return
+
+        with self.connection:
+            for statement, parameters in self._pending_statements:
+                self.connection.execute(statement, parameters)
+        self._pending_statements = []
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def get_table(self, table_key: str) -> Optional[dict]:
+        """
+        Returns the table at `table_key`, along with its columns, indexes,
+        watermarks and metrics, or None if it is not in the catalog.
+        """
+        table = self._fetch_dicts("SELECT * FROM tables WHERE table_key = ?", table_key)
+        if not table:
+            return None
+
+        table = table[0]
+        table["is_view"] = bool(table["is_view"])
+        table["columns"] = self._fetch_dicts(
+            "SELECT name, type, description, sort_order FROM columns"
+            " WHERE table_key = ? ORDER BY sort_order",
+            table_key,
+        )
+        table["indexes"] = self._fetch_dicts(
+            "SELECT name, columns, index_type, constraint_type, architecture"
+            " FROM indexes WHERE table_key = ?",
+            table_key,
+        )
+        for index in table["indexes"]:
+            index["columns"] = index["columns"].split(",") if index["columns"] else []
+        table["watermarks"] = self._fetch_dicts(
+            "SELECT part_type, part_name, part_value FROM watermarks WHERE table_key = ?",
+            table_key,
+        )
+        table["metrics"] = self._fetch_dicts(
+            "SELECT name, value, execution_time FROM metrics WHERE table_key = ?",
+            table_key,
+        )
+        return table
+
+    def find_table_keys(
+        self, database: str, table: str, schema: str = None
+    ) -> List[str]:
+        """
+        Returns the keys of the tables named `table` (and in `schema`, if
+        given) in `database`, ignoring case.
+
+        `database` is the connection name that prefixes each table key, which
+        differs from the `database` of the records loaded (e.g. "postgres").
+        """
+        prefix = database + "/"
+        query = (
+            "SELECT table_key FROM tables"
+            " WHERE substr(table_key, 1, ?) = ? AND name = ? COLLATE NOCASE"
+        )
+        parameters = [len(prefix), prefix, table]
+        if schema is not None:
+            query += " AND schema = ? COLLATE NOCASE"
+            parameters.append(schema)
+        return [
+            row["table_key"]
+            for row in self._fetch_dicts(query + " ORDER BY table_key", *parameters)
+        ]
+
+    def get_watermarks(self, table_key: str) -> List[dict]:
+        return self._fetch_dicts(
+            "SELECT part_type, part_name, part_value FROM watermarks"
+            " WHERE table_key = ? ORDER BY part_type, part_name",
+            table_key,
+        )
+
+    def find_columns_by_name(self, column_name: str) -> List[dict]:
+        return self._fetch_dicts(
+            "SELECT * FROM columns WHERE name = ? ORDER BY table_key", column_name
+        )
+
+    def find_columns_by_type(self, data_type: str) -> List[dict]:
+        return self._fetch_dicts(
+            "SELECT * FROM columns WHERE type = ? ORDER BY table_key, sort_order",
+            data_type,
+        )
+
+    def _fetch_dicts(self, query: str, *parameters) -> List[dict]:
+        cursor = self.connection.execute(query, parameters)
+        keys = [description[0] for description in cursor.description]
+        return [dict(zip(keys, row)) for row in cursor]
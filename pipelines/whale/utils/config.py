@@ -1,38 +1,111 @@
 import os
+import threading
 import yaml
+from collections import namedtuple
 from whale.utils import paths
 from whale.models.connection_config import ConnectionConfigSchema
 
+# The parsed contents of connections.yaml. `by_name` maps each name to the
+# index of its connection, whose schema is created on first use
+Connections = namedtuple(
+    "Connections", ["raw_connection_dicts", "by_name", "connection_schemas"]
+)
+
+_FILE_CACHE = {}
+_FILE_CACHE_LOCK = threading.Lock()
+
+
+def _load_cached(path, load):
+    """
+    Returns `load(path)`, or None if there is no file at `path`. The result is
+    reused until the file is replaced or modified (i.e. its inode, size or
+    mtime changes), so it must not be mutated.
+    """
+    path = str(path)
+    try:
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        version = None
+
+    with _FILE_CACHE_LOCK:
+        cached_version, value = _FILE_CACHE.get(path, (None, None))
+    if path in _FILE_CACHE and cached_version == version:
+        return value
+
+    value = None if version is None else load(path)
+    with _FILE_CACHE_LOCK:
+        _FILE_CACHE[path] = (version, value)
+    return value
+
+
+def _load_config(path):
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def _load_connections(path) -> Connections:
+    with open(path, "r") as f:
+        raw_connection_dicts = tuple(yaml.safe_load_all(f))
+
+    by_name = {}
+    for i, raw_connection_dict in enumerate(raw_connection_dicts):
+        if "name" in raw_connection_dict:
+            # The last connection with a name takes precedence
+            by_name[raw_connection_dict["name"]] = i
+    return Connections(
+        raw_connection_dicts=raw_connection_dicts,
+        by_name=by_name,
+        connection_schemas={},
+    )
+
+
+def read_config(key, default=None):
+    """
+    Returns the value of `key` within ~/.whale/config/config.yaml, or
+    `default` if either the file or the key does not exist.
+    """
+    config = _load_cached(paths.CONFIG_PATH, _load_config)
+    if not isinstance(config, dict):
+        return default
+    return config.get(key, default)
+
 
 def read_connections():
-    if os.path.exists(paths.CONNECTION_PATH):
-        with open(paths.CONNECTION_PATH, "r") as f:
-            raw_connection_dicts = list(yaml.safe_load_all(f))
-    else:
-        raw_connection_dicts = []
-    return raw_connection_dicts
+    connections = _load_cached(paths.CONNECTION_PATH, _load_connections)
+    if connections is None:
+        return []
+    # Copied, so that callers can't change the cached connections
+    return [
+        dict(raw_connection_dict)
+        for raw_connection_dict in connections.raw_connection_dicts
+    ]
 
 
 def get_connection(warehouse_name=None) -> ConnectionConfigSchema:
     """
     Returns the first connection that has a matching "name" field to `warehouse_name`.
     If "None" is given, the first warehouse in the list is returned.
+
+    Connections are created once per version of connections.yaml and shared,
+    so repeated lookups are free.
     """
-    connection_dict = {}
-    raw_connection_dicts = read_connections()
+    connections = _load_cached(paths.CONNECTION_PATH, _load_connections)
+    if connections is None or not connections.raw_connection_dicts:
+        raise Exception("No warehouses found in ~/.whale/config/connections.yaml.")
 
     if warehouse_name is not None:
-        for raw_connection_dict in raw_connection_dicts:
-            if "name" in raw_connection_dict:
-                if raw_connection_dict["name"] == warehouse_name:
-                    connection_dict = raw_connection_dict
-        if not connection_dict:
+        if warehouse_name not in connections.by_name:
             raise Exception(
                 f"Warehouse `{warehouse_name}` not found in ~/.whale/config/connections.yaml."
             )
+        i = connections.by_name[warehouse_name]
     else:
-        if raw_connection_dicts:
-            connection_dict = raw_connection_dicts[0]
+        i = 0
 
-    connection = ConnectionConfigSchema(**connection_dict)
-    return connection
+    with _FILE_CACHE_LOCK:
+        if i not in connections.connection_schemas:
+            connections.connection_schemas[i] = ConnectionConfigSchema(
+                **connections.raw_connection_dicts[i]
+            )
+        return connections.connection_schemas[i]
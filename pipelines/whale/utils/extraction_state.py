@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from whale.utils import safe_write
+
+LOGGER = logging.getLogger(__name__)
+
+ENTRIES_KEY = "entries"
+LAST_FULL_REFRESH_KEY = "last_full_refresh"
+
+
+class ExtractionState(object):
+    """
+    Persistent state of an incremental extraction, with an entry per table
+    (e.g. its last modified time and the metadata last extracted for it).
+
+    Entries are recorded as tables are extracted and written on `save`. Once
+    an extraction completes, tables that weren't seen are dropped. A full
+    refresh is due once `full_refresh_interval_seconds` have passed since the
+    last complete extraction that didn't reuse any entries.
+    """
+
+    def __init__(self, state_path, full_refresh_interval_seconds=None):
+        self.state_path = str(state_path)
+        self.full_refresh_interval_seconds = full_refresh_interval_seconds
+        self._lock = threading.Lock()
+        self._state = None
+        self._seen_entries = {}
+
+    @property
+    def is_full_refresh_due(self) -> bool:
+        if self.full_refresh_interval_seconds is None:
+            return False
+        last_full_refresh = self._get_state()[LAST_FULL_REFRESH_KEY]
+        return (
+            last_full_refresh is None
+            or time.time() - last_full_refresh >= self.full_refresh_interval_seconds
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._get_state()[ENTRIES_KEY].get(key)
+
+    def update(self, key: str, entry: dict):
+        try:
+            # Keep entries that can't be saved out of the state altogether
+            json.dumps(entry)
+        except (TypeError, ValueError) as e:
+            LOGGER.debug(f"Not recording state for {key}: {e}")
+            return
+
+        with self._lock:
+            self._seen_entries[key] = entry
+
+    def save(self, is_complete: bool = False, is_full_refresh: bool = False):
+        with self._lock:
+            state = self._get_state()
+            if is_complete:
+                state[ENTRIES_KEY] = self._seen_entries
+                if is_full_refresh:
+                    state[LAST_FULL_REFRESH_KEY] = time.time()
+            else:
+                state[ENTRIES_KEY].update(self._seen_entries)
+            self._seen_entries = {}
+
+            Path(self.state_path).parent.mkdir(parents=True, exist_ok=True)
+            safe_write(self.state_path, json.dumps(state))
+
+    def _get_state(self) -> dict:
+        if self._state is None:
+            self._state = {ENTRIES_KEY: {}, LAST_FULL_REFRESH_KEY: None}
+            if os.path.exists(self.state_path):
+                try:
+                    with open(self.state_path, "r") as f:
+                        self._state.update(json.load(f))
+                except ValueError:
+                    LOGGER.warning(
+                        f"Discarding unreadable extraction state at {self.state_path}."
+                    )
+        return self._state
@@ -1,55 +1,49 @@
 import os
 
 from pyhocon import ConfigFactory, ConfigTree
-from whale.extractor.presto_loop_extractor import PrestoLoopExtractor
-from whale.extractor.presto_table_metadata_extractor import PrestoTableMetadataExtractor
 from whale.models.connection_config import ConnectionConfigSchema
-from whale.extractor.amundsen_neo4j_metadata_extractor import (
-    AmundsenNeo4jMetadataExtractor,
-)
-from whale.extractor.bigquery_metadata_extractor import BigQueryMetadataExtractor
-from whale.extractor.spanner_metadata_extractor import SpannerMetadataExtractor
-from whale.extractor.bigquery_watermark_extractor import BigQueryWatermarkExtractor
-from whale.extractor.glue_extractor import GlueExtractor
-from whale.extractor.snowflake_metadata_extractor import SnowflakeMetadataExtractor
-from whale.extractor.splice_machine_metadata_extractor import (
-    SpliceMachineMetadataExtractor,
-)
-from whale.extractor.postgres_metadata_extractor import PostgresMetadataExtractor
-from whale.extractor.ugc_runner import UGCRunner
-from whale.extractor.base_index_extractor import IndexExtractor
-from whale.extractor.postgres_index_extractor import PostgresIndexExtractor
-from whale.extractor.redshift_metadata_extractor import RedshiftMetadataExtractor
 from whale.engine.sql_alchemy_engine import SQLAlchemyEngine
-from databuilder.extractor.sql_alchemy_extractor import SQLAlchemyExtractor
-from whale.extractor.hive_table_metadata_extractor import HiveTableMetadataExtractor
+
+# Extractors are imported by the functions that configure them, so that only
+# the dependencies of the connections in use (e.g. the Google Cloud clients
+# for BigQuery) are imported.
 
 BUILD_SCRIPT_TEMPLATE = """source {venv_path}/bin/activate \
     && {python_binary} {build_script_path}"""
-SQL_ALCHEMY_SCOPE = SQLAlchemyExtractor().get_scope()
 SQL_ALCHEMY_ENGINE_SCOPE = SQLAlchemyEngine().get_scope()
 
-METRIC_RUNNER_SCOPE = UGCRunner().get_scope()
-INDEX_SCOPE = IndexExtractor().get_scope()
-
 
 def get_sql_alchemy_conn_string_key(scope):
-    conn_string_key = f"{scope}.{SQL_ALCHEMY_SCOPE}.{SQLAlchemyExtractor.CONN_STRING}"
+    from databuilder.extractor.sql_alchemy_extractor import SQLAlchemyExtractor
+
+    sql_alchemy_scope = SQLAlchemyExtractor().get_scope()
+    conn_string_key = f"{scope}.{sql_alchemy_scope}.{SQLAlchemyExtractor.CONN_STRING}"
     return conn_string_key
 
 
 def add_ugc_runner(extractors: list, conf: ConfigTree, connection):
-    conf.put(f"{METRIC_RUNNER_SCOPE}.{UGCRunner.DATABASE_KEY}", connection.name)
+    from whale.extractor.ugc_runner import UGCRunner
+
+    metric_runner_scope = UGCRunner().get_scope()
+    conf.put(f"{metric_runner_scope}.{UGCRunner.DATABASE_KEY}", connection.name)
+    conf.put(
+        f"{metric_runner_scope}.{UGCRunner.MAX_WORKERS_KEY}",
+        connection.metric_max_concurrency,
+    )
     conf.put(
-        f"{METRIC_RUNNER_SCOPE}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONN_STRING_KEY}",
+        f"{metric_runner_scope}.{UGCRunner.QUERY_TIMEOUT_KEY}",
+        connection.metric_timeout,
+    )
+    conf.put(
+        f"{metric_runner_scope}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONN_STRING_KEY}",
         connection.conn_string,
     )
     conf.put(
-        f"{METRIC_RUNNER_SCOPE}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CREDENTIALS_PATH_KEY}",
+        f"{metric_runner_scope}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CREDENTIALS_PATH_KEY}",
         connection.key_path,
     )
     conf.put(
-        f"{METRIC_RUNNER_SCOPE}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONNECT_ARGS}",
+        f"{metric_runner_scope}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONNECT_ARGS}",
         connection.connect_args,
     )
     extractors.append(UGCRunner())
@@ -57,13 +51,17 @@ def add_ugc_runner(extractors: list, conf: ConfigTree, connection):
 
 
 def add_indexes(extractors: list, conf: ConfigTree, connection):
-    conf.put(f"{INDEX_SCOPE}.{IndexExtractor.DATABASE_KEY}", connection.name)
+    from whale.extractor.base_index_extractor import IndexExtractor
+    from whale.extractor.postgres_index_extractor import PostgresIndexExtractor
+
+    index_scope = IndexExtractor().get_scope()
+    conf.put(f"{index_scope}.{IndexExtractor.DATABASE_KEY}", connection.name)
     conf.put(
-        f"{INDEX_SCOPE}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONN_STRING_KEY}",
+        f"{index_scope}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CONN_STRING_KEY}",
         connection.conn_string,
     )
     conf.put(
-        f"{INDEX_SCOPE}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CREDENTIALS_PATH_KEY}",
+        f"{index_scope}.{SQL_ALCHEMY_ENGINE_SCOPE}.{SQLAlchemyEngine.CREDENTIALS_PATH_KEY}",
         connection.key_path,
     )
 
@@ -76,6 +74,9 @@ def add_indexes(extractors: list, conf: ConfigTree, connection):
 
 
 def configure_bigquery_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.bigquery_metadata_extractor import BigQueryMetadataExtractor
+    from whale.extractor.bigquery_watermark_extractor import BigQueryWatermarkExtractor
+
     Extractor = BigQueryMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -91,6 +92,10 @@ def configure_bigquery_extractors(connection: ConnectionConfigSchema):
             f"{scope}.page_size": connection.page_size,
             f"{scope}.filter_key": connection.filter_key,
             f"{scope}.included_tables_regex": connection.included_tables_regex,
+            f"{scope}.max_workers": connection.table_max_concurrency,
+            f"{scope}.is_information_schema_enabled": connection.is_information_schema_enabled,
+            f"{scope}.is_incremental_enabled": connection.is_incremental_enabled,
+            f"{scope}.full_refresh_interval_days": connection.full_refresh_interval_days,
             f"{watermark_scope}.connection_name": connection.name,
             f"{watermark_scope}.key_path": connection.key_path,
             f"{watermark_scope}.project_id": connection.project_id,
@@ -106,6 +111,8 @@ def configure_bigquery_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_spanner_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.spanner_metadata_extractor import SpannerMetadataExtractor
+
     Extractor = SpannerMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -127,6 +134,8 @@ def configure_spanner_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_glue_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.glue_extractor import GlueExtractor
+
     Extractor = GlueExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -144,6 +153,8 @@ def configure_glue_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_hive_metastore_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.hive_table_metadata_extractor import HiveTableMetadataExtractor
+
     Extractor = HiveTableMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -163,6 +174,11 @@ def configure_hive_metastore_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_presto_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.presto_loop_extractor import PrestoLoopExtractor
+    from whale.extractor.presto_table_metadata_extractor import (
+        PrestoTableMetadataExtractor,
+    )
+
     Extractor = PrestoTableMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -196,6 +212,10 @@ def configure_presto_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_neo4j_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.amundsen_neo4j_metadata_extractor import (
+        AmundsenNeo4jMetadataExtractor,
+    )
+
     extractor = AmundsenNeo4jMetadataExtractor()
     scope = extractor.get_scope()
     conf = ConfigFactory.from_dict(
@@ -216,6 +236,8 @@ def configure_neo4j_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_postgres_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.postgres_metadata_extractor import PostgresMetadataExtractor
+
     Extractor = PostgresMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -238,6 +260,8 @@ def configure_postgres_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_redshift_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.redshift_metadata_extractor import RedshiftMetadataExtractor
+
     Extractor = RedshiftMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -259,6 +283,8 @@ def configure_redshift_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_snowflake_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.snowflake_metadata_extractor import SnowflakeMetadataExtractor
+
     Extractor = SnowflakeMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -281,6 +307,10 @@ def configure_snowflake_extractors(connection: ConnectionConfigSchema):
 
 
 def configure_splice_machine_extractors(connection: ConnectionConfigSchema):
+    from whale.extractor.splice_machine_metadata_extractor import (
+        SpliceMachineMetadataExtractor,
+    )
+
     Extractor = SpliceMachineMetadataExtractor
     extractor = Extractor()
     scope = extractor.get_scope()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from whale.utils import paths, safe_write
+
+LOGGER = logging.getLogger(__name__)
+
+STAT_KEY = "stat"
+FINGERPRINTS_KEY = "fingerprints"
+
+
+def get_fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def get_file_stat(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class FingerprintStore(object):
+    """
+    Persistent store of hashes of the programmatically-generated sections of
+    each table stub, keyed by the stub's path.
+
+    Alongside the hashes, the stub's mtime and size are recorded whenever
+    whale writes it. If the stub has changed since (e.g. it was edited by
+    hand, or updated by a `git pull`), its fingerprints are discarded.
+    """
+
+    def __init__(self, store_path=paths.FINGERPRINTS_PATH):
+        self.store_path = str(store_path)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._is_dirty = False
+
+    def get_unchanged_keys(self, file_path, fingerprints: dict) -> set:
+        """
+        Returns the keys of `fingerprints` whose hash matches the one stored
+        for the stub at `file_path`.
+        """
+        file_path = str(file_path)
+        with self._lock:
+            entry = self._get_entries().get(file_path)
+            if entry is None:
+                return set()
+
+            if entry[STAT_KEY] != get_file_stat(file_path):
+                del self._entries[file_path]
+                self._is_dirty = True
+                return set()
+
+            stored_fingerprints = entry[FINGERPRINTS_KEY]
+            return {
+                key
+                for key, fingerprint in fingerprints.items()
+                if stored_fingerprints.get(key) == fingerprint
+            }
+
+    def update(self, file_path, fingerprints: dict):
+        """
+        Records `fingerprints` for the stub at `file_path`, which must be
+        called immediately after whale writes the stub.
+        """
+        file_path = str(file_path)
+        with self._lock:
+            entries = self._get_entries()
+            entry = entries.get(file_path)
+            stat = get_file_stat(file_path)
+            if entry is None or entry[STAT_KEY] is None:
+                entry = {STAT_KEY: stat, FINGERPRINTS_KEY: {}}
+                entries[file_path] = entry
+            entry[STAT_KEY] = stat
+            entry[FINGERPRINTS_KEY].update(fingerprints)
+            self._is_dirty = True
+
+    def invalidate(self, file_path=None):
+        """
+        Discards the fingerprints of the stub at `file_path`, or of all stubs
+        if no path is given.
+        """
+        with self._lock:
+            if file_path is None:
+                self._entries = {}
+            else:
+                self._get_entries().pop(str(file_path), None)
+            self._is_dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._is_dirty:
+                return
+            Path(self.store_path).parent.mkdir(parents=True, exist_ok=True)
+            safe_write(self.store_path, json.dumps(self._entries))
+            self._is_dirty = False
+
+    def _get_entries(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.store_path):
+                try:
+                    with open(self.store_path, "r") as f:
+                        self._entries = json.load(f)
+                except ValueError:
+                    LOGGER.warning(
+                        f"Discarding unreadable fingerprint store at {self.store_path}."
+                    )
+        return self._entries
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_fingerprint_store(store_path=paths.FINGERPRINTS_PATH) -> FingerprintStore:
+    """
+    Returns the store at `store_path`, shared by all loaders in this process.
+    """
+    store_path = str(store_path)
+    with _STORES_LOCK:
+        if store_path not in _STORES:
+            _STORES[store_path] = FingerprintStore(store_path)
+        return _STORES[store_path]
@@ -0,0 +1,233 @@
+import fcntl
+import glob
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from whale.utils import get_table_file_path_relative, paths
+
+LOGGER = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment"
+LOCK_FILE_NAME = ".lock"
+DEFAULT_MAX_SEGMENTS = 32
+DEFAULT_DOWNSAMPLE_AFTER_DAYS = 30
+DEFAULT_DOWNSAMPLE_FREQUENCY = "1D"
+SECONDS_PER_DAY = 24 * 60 * 60
+COLUMNS = ["keys", "times", "values", "texts"]
+
+
+def get_metric_key(table_key: str, name: str) -> str:
+    return f"{table_key}/{name}"
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_timestamp(value) -> int:
+    # Seconds since the epoch
+    return int(pd.Timestamp(value).timestamp())
+
+
+class MetricHistory(object):
+    """
+    History of the metric values of a connection, stored as compressed,
+    columnar segments under ~/.whale/metrics/history/<connection>.
+
+    Values are appended in memory and written as a single segment on
+    `flush`. Once there are more than `max_segments` segments, they are
+    compacted into one: values older than `retention_days` are dropped, and
+    values older than `downsample_after_days` are downsampled to the last
+    value of each metric in each `downsample_frequency` interval.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        base_directory=paths.METRIC_HISTORY_PATH,
+        retention_days=None,
+        downsample_after_days=DEFAULT_DOWNSAMPLE_AFTER_DAYS,
+        downsample_frequency=DEFAULT_DOWNSAMPLE_FREQUENCY,
+        max_segments=DEFAULT_MAX_SEGMENTS,
+    ):
+        self.directory = os.path.join(str(base_directory), database)
+        self.retention_days = retention_days
+        self.downsample_after_days = downsample_after_days
+        self.downsample_frequency = downsample_frequency
+        self.max_segments = max_segments
+        self._pending = {column: [] for column in COLUMNS}
+
+    def append(self, metric_value):
+        table_key = get_table_file_path_relative(
+            metric_value.database,
+            metric_value.cluster,
+            metric_value.schema,
+            metric_value.table,
+        )
+        self._pending["keys"].append(get_metric_key(table_key, metric_value.name))
+        self._pending["times"].append(_to_timestamp(metric_value.execution_time))
+        self._pending["values"].append(_to_float(metric_value.value))
+        self._pending["texts"].append(str(metric_value.value))
+
+    def flush(self):
+        """
+        Writes all appended values as a new segment, compacting the history
+        if there are too many segments.
+        """
+        if not self._pending["keys"]:
+            return
+
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        self._write_segment(
+            np.array(self._pending["keys"], dtype=str),
+            np.array(self._pending["times"], dtype=np.int64),
+            np.array(self._pending["values"], dtype=np.float64),
+            np.array(self._pending["texts"], dtype=str),
+        )
+        self._pending = {column: [] for column in COLUMNS}
+
+        if len(self._get_segment_paths()) > self.max_segments:
+            self.compact()
+
+    def read(
+        self, table_key: str, name: str, start=None, end=None, is_numeric=True
+    ) -> pd.Series:
+        """
+        Returns the values of metric `name` on the table at `table_key` (its
+        path relative to ~/.whale/metadata), indexed by execution time.
+
+        Only values executed between `start` and `end` (inclusive) are
+        returned. If `is_numeric` is False, values are returned as strings,
+        otherwise values that aren't numbers are NaN.
+        """
+        metric_key = get_metric_key(table_key, name)
+        start = None if start is None else _to_timestamp(start)
+        end = None if end is None else _to_timestamp(end)
+        column = "values" if is_numeric else "texts"
+
+        times = []
+        values = []
+        for segment in self._read_segments(start, end):
+            mask = segment["keys"] == metric_key
+            if start is not None:
+                mask &= segment["times"] >= start
+            if end is not None:
+                mask &= segment["times"] <= end
+            times.append(segment["times"][mask])
+            values.append(segment[column][mask])
+
+        if times:
+            times = np.concatenate(times)
+            values = np.concatenate(values)
+        else:
+            times = np.array([], dtype=np.int64)
+            values = np.array([], dtype=np.float64 if is_numeric else str)
+
+        order = np.argsort(times, kind="stable")
+        return pd.Series(
+            values[order],
+            index=pd.to_datetime(times[order], unit="s"),
+            name=name,
+        )
+
+    def compact(self, now=None):
+        """
+        Merges all segments into one, applying the retention and
+        downsampling policies. Skipped if another process is compacting.
+        """
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE_NAME), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            segment_paths = self._get_segment_paths()
+            if not segment_paths:
+                return
+
+            segments = [self._read_segment(path) for path in segment_paths]
+            history = pd.DataFrame(
+                {
+                    column: np.concatenate([segment[column] for segment in segments])
+                    for column in COLUMNS
+                }
+            )
+
+            now = time.time() if now is None else now
+            if self.retention_days is not None:
+                cutoff = now - self.retention_days * SECONDS_PER_DAY
+                history = history[history["times"] >= cutoff]
+
+            if self.downsample_after_days is not None:
+                cutoff = now - self.downsample_after_days * SECONDS_PER_DAY
+                is_old = history["times"] < cutoff
+                old_history = history[is_old].sort_values("times", kind="mergesort")
+                buckets = pd.to_datetime(old_history["times"], unit="s").dt.floor(
+                    self.downsample_frequency
+                )
+                old_history = old_history.groupby(
+                    [old_history["keys"], buckets], sort=False
+                ).tail(1)
+                history = pd.concat([old_history, history[~is_old]])
+
+            history = history.sort_values(["keys", "times"], kind="mergesort")
+            if len(history):
+                self._write_segment(
+                    *(history[column].to_numpy() for column in COLUMNS),
+                )
+            for segment_path in segment_paths:
+                os.remove(segment_path)
+
+    def _write_segment(self, keys, times, values, texts):
+        start, end = int(times.min()), int(times.max())
+        # The time range is in the name, so that reads can skip segments
+        segment_name = f"{SEGMENT_PREFIX}_{start}_{end}_{uuid.uuid4().hex}.npz"
+        segment_path = os.path.join(self.directory, segment_name)
+        tmp_path = os.path.join(self.directory, f".{segment_name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                keys=keys.astype(str),
+                times=times.astype(np.int64),
+                values=values.astype(np.float64),
+                texts=texts.astype(str),
+            )
+        os.replace(tmp_path, segment_path)
+
+    def _read_segments(self, start=None, end=None) -> list:
+        while True:
+            try:
+                return [
+                    self._read_segment(segment_path)
+                    for segment_path in self._get_segment_paths(start, end)
+                ]
+            except FileNotFoundError:
+                # Compacted since the segments were listed
+                continue
+
+    def _read_segment(self, segment_path) -> dict:
+        with np.load(segment_path) as segment:
+            return {column: segment[column] for column in COLUMNS}
+
+    def _get_segment_paths(self, start=None, end=None) -> list:
+        segment_paths = []
+        for segment_path in sorted(
+            glob.glob(os.path.join(self.directory, f"{SEGMENT_PREFIX}_*.npz"))
+        ):
+            _, segment_start, segment_end, _ = os.path.basename(segment_path).split("_")
+            if start is not None and int(segment_end) < start:
+                continue
+            if end is not None and int(segment_start) > end:
+                continue
+            segment_paths.append(segment_path)
+        return segment_paths
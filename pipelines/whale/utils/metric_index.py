@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import yaml
+from pathlib import Path
+
+from whale.utils import paths, safe_write
+from whale.utils.fingerprints import get_file_stat
+from whale.utils.parsers import (
+    parse_ugc,
+    sections_from_markdown,
+    DEFINED_METRICS_SECTION,
+    UGC_SECTION,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+STAT_KEY = "stat"
+METRICS_KEY = "metrics"
+
+
+def parse_defined_metrics(ugc: str, file_path=None) -> list:
+    """
+    Returns the parsed YAML of each ```metrics block in `ugc`, skipping any
+    that are empty or invalid.
+    """
+    defined_metrics = []
+    for metric_yaml in parse_ugc(ugc)[DEFINED_METRICS_SECTION]:
+        try:
+            metrics = yaml.safe_load(metric_yaml)
+        except yaml.YAMLError as e:
+            LOGGER.warning(f"Skipping invalid metrics definition in {file_path}: {e}")
+            continue
+        if metrics:
+            defined_metrics.append(metrics)
+    return defined_metrics
+
+
+class MetricIndex(object):
+    """
+    Persistent index of the metrics defined in each table stub, keyed by the
+    stub's path.
+
+    Each entry records the stub's mtime and size when it was parsed, and is
+    re-parsed only if the stub has changed since. The loader updates entries
+    as it writes stubs, so only stubs edited outside of whale are re-read.
+    """
+
+    def __init__(self, index_path=paths.METRIC_INDEX_PATH):
+        self.index_path = str(index_path)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._is_dirty = False
+
+    def get_table_stub_paths(self, directory) -> list:
+        """
+        Returns the paths of the table stubs in `directory` that define
+        metrics.
+        """
+        directory = str(directory)
+        if not os.path.isdir(directory):
+            return []
+
+        file_paths = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".md"):
+                    file_paths.add(os.path.join(directory, entry.name))
+
+        with self._lock:
+            # Forget stubs that have been deleted
+            for file_path in list(self._get_entries()):
+                if (
+                    os.path.dirname(file_path) == directory
+                    and file_path not in file_paths
+                ):
+                    del self._entries[file_path]
+                    self._is_dirty = True
+
+            return sorted(
+                file_path
+                for file_path in file_paths
+                if self._get_entry(file_path)[METRICS_KEY]
+            )
+
+    def get_metrics(self, file_path) -> list:
+        """
+        Returns the parsed YAML of each ```metrics block in the stub at
+        `file_path`.
+        """
+        with self._lock:
+            return self._get_entry(str(file_path))[METRICS_KEY]
+
+    def update(self, file_path, ugc: str):
+        """
+        Records the metrics defined in `ugc`, which must be called immediately
+        after whale writes it to the stub at `file_path`.
+        """
+        file_path = str(file_path)
+        metrics = parse_defined_metrics(ugc, file_path)
+        with self._lock:
+            self._get_entries()[file_path] = {
+                STAT_KEY: get_file_stat(file_path),
+                METRICS_KEY: metrics,
+            }
+            self._is_dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._is_dirty:
+                return
+            Path(self.index_path).parent.mkdir(parents=True, exist_ok=True)
+            safe_write(self.index_path, json.dumps(self._entries, default=str))
+            self._is_dirty = False
+
+    def _get_entry(self, file_path: str) -> dict:
+        entries = self._get_entries()
+        entry = entries.get(file_path)
+        stat = get_file_stat(file_path)
+        if stat is None:
+            if entries.pop(file_path, None) is not None:
+                self._is_dirty = True
+            return {STAT_KEY: None, METRICS_KEY: []}
+
+        if entry is None or entry[STAT_KEY] != stat:
+            sections = sections_from_markdown(file_path)
+            entry = {
+                STAT_KEY: stat,
+                METRICS_KEY: parse_defined_metrics(sections[UGC_SECTION], file_path),
+            }
+            entries[file_path] = entry
+            self._is_dirty = True
+        return entry
+
+    def _get_entries(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r") as f:
+                        self._entries = json.load(f)
+                except ValueError:
+                    LOGGER.warning(
+                        f"Discarding unreadable metric index at {self.index_path}."
+                    )
+        return self._entries
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_metric_index(index_path=paths.METRIC_INDEX_PATH) -> MetricIndex:
+    """
+    Returns the index at `index_path`, shared by all loaders and runners in
+    this process.
+    """
+    index_path = str(index_path)
+    with _INDEXES_LOCK:
+        if index_path not in _INDEXES:
+            _INDEXES[index_path] = MetricIndex(index_path)
+        return _INDEXES[index_path]
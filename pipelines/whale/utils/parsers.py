@@ -1,5 +1,7 @@
+import functools
 import re
 import textwrap
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from whale.utils.markdown_delimiters import (
     COLUMN_DETAILS_DELIMITER,
     INDEX_DELIMITER,
@@ -22,76 +24,119 @@ DEFINED_METRICS_SECTION = "defined_metrics"
 METRICS_SECTION = "metrics"
 NOTES_SECTION = "notes"
 
-
-def parse_programmatic_blob(programmatic_blob):
-
-    regex_to_match = (
-        "("
-        + COLUMN_DETAILS_DELIMITER
-        + "|"
-        + INDEX_DELIMITER
-        + "|"
-        + PARTITIONS_DELIMITER
-        + "|"
-        + USAGE_DELIMITER
-        + "|"
-        + METRICS_DELIMITER
-        + ")"
-    )
-
-    splits = re.split(regex_to_match, programmatic_blob)
-
-    state = HEADER_SECTION
-    sections = {
-        HEADER_SECTION: [],
-        COLUMN_DETAILS_SECTION: [],
-        INDEX_SECTION: [],
-        PARTITION_SECTION: [],
-        USAGE_SECTION: [],
-        METRICS_SECTION: [],
+# Programmatic sections, in the order they are written to a table stub.
+PROGRAMMATIC_SECTIONS = [
+    HEADER_SECTION,
+    COLUMN_DETAILS_SECTION,
+    INDEX_SECTION,
+    PARTITION_SECTION,
+    USAGE_SECTION,
+    METRICS_SECTION,
+]
+PROGRAMMATIC_DELIMITER_SECTIONS = {
+    COLUMN_DETAILS_DELIMITER: COLUMN_DETAILS_SECTION,
+    INDEX_DELIMITER: INDEX_SECTION,
+    PARTITIONS_DELIMITER: PARTITION_SECTION,
+    USAGE_DELIMITER: USAGE_SECTION,
+    METRICS_DELIMITER: METRICS_SECTION,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def compile_delimiters(*delimiters):
+    """
+    Compiles a pattern matching any of `delimiters`. Earlier delimiters take
+    priority, so END_DELIMITERS should always go last.
+    """
+    return re.compile("|".join(re.escape(delimiter) for delimiter in delimiters))
+
+
+PROGRAMMATIC_DELIMITER_PATTERN = compile_delimiters(*PROGRAMMATIC_DELIMITER_SECTIONS)
+
+
+def scan_programmatic_sections(text, start=0, end=None):
+    """
+    Scans text[start:end] once, returning the (start, end) offsets of the
+    spans belonging to each programmatic section. Each span begins with the
+    section's delimiter, except for the header.
+    """
+    end = len(text) if end is None else end
+    spans = {section: [] for section in PROGRAMMATIC_SECTIONS}
+
+    section = HEADER_SECTION
+    section_start = start
+    for match in PROGRAMMATIC_DELIMITER_PATTERN.finditer(text, start, end):
+        spans[section].append((section_start, match.start()))
+        section = PROGRAMMATIC_DELIMITER_SECTIONS[match.group()]
+        section_start = match.start()
+    spans[section].append((section_start, end))
+    return spans
+
+
+def scan_blocks(text, delimiter_start, delimiter_end, start=0, end=None):
+    """
+    Scans text[start:end] once, returning the (start, end) offsets of the
+    contents of each block opened by `delimiter_start`. A block's contents
+    run until the next delimiter of either kind.
+    """
+    end = len(text) if end is None else end
+    pattern = compile_delimiters(delimiter_start, delimiter_end)
+
+    blocks = []
+    block_start = None
+    for match in pattern.finditer(text, start, end):
+        if block_start is not None:
+            blocks.append((block_start, match.start()))
+        block_start = match.end() if match.group() == delimiter_start else None
+    if block_start is not None:
+        blocks.append((block_start, end))
+    return blocks
+
+
+def _join_spans(text, spans):
+    return "".join(text[span_start:span_end] for span_start, span_end in spans)
+
+
+def parse_programmatic_blob(programmatic_blob, start=0, end=None):
+    spans = scan_programmatic_sections(programmatic_blob, start, end)
+    return {
+        section: _join_spans(programmatic_blob, section_spans)
+        for section, section_spans in spans.items()
     }
 
-    for clause in splits:
-        if clause == COLUMN_DETAILS_DELIMITER:
-            state = COLUMN_DETAILS_SECTION
-        elif clause == INDEX_DELIMITER:
-            state = INDEX_SECTION
-        elif clause == PARTITIONS_DELIMITER:
-            state = PARTITION_SECTION
-        elif clause == USAGE_DELIMITER:
-            state = USAGE_SECTION
-        elif clause == METRICS_DELIMITER:
-            state = METRICS_SECTION
-
-        sections[state].append(clause)
-
-    for state, clauses in sections.items():
-        sections[state] = "".join(clauses)
-    return sections
-
 
 def parse_ugc(ugc_blob):
-    regex_to_match = (
-        "(" + DEFINED_METRICS_DELIMITER + "|" + BLOCK_END_DELIMITER + ")"
-    )  # To reduce priority, END_DELIMITERS always go last
-    splits = re.split(regex_to_match, ugc_blob)
-
-    state = NOTES_SECTION
-    sections = {
-        DEFINED_METRICS_SECTION: [],
-        NOTES_SECTION: [],
+    defined_metrics_blocks = scan_blocks(
+        ugc_blob, DEFINED_METRICS_DELIMITER, BLOCK_END_DELIMITER
+    )
+    defined_metrics = [
+        ugc_blob[block_start:block_end]
+        for block_start, block_end in defined_metrics_blocks
+    ]
+
+    # Everything else, except for the DEFINED_METRICS_DELIMITERs themselves
+    notes = []
+    notes_start = 0
+    for block_start, block_end in defined_metrics_blocks:
+        notes.append(
+            ugc_blob[notes_start : block_start - len(DEFINED_METRICS_DELIMITER)]
+        )
+        notes_start = block_end
+    notes.append(ugc_blob[notes_start:])
+
+    return {
+        DEFINED_METRICS_SECTION: defined_metrics,
+        NOTES_SECTION: notes,
     }
 
-    for clause in splits:
-        if clause == DEFINED_METRICS_DELIMITER:
-            state = DEFINED_METRICS_SECTION
-        elif clause == BLOCK_END_DELIMITER:
-            state = NOTES_SECTION
-
-        if clause not in [DEFINED_METRICS_DELIMITER]:
-            sections[state].append(clause)
 
-    return sections
+def get_jinja_alias(clause):
+    """
+    Returns the alias of a block whose first line is -<alias>, or None.
+    """
+    if clause.startswith("-"):
+        return clause.split("\n")[0][1:]
+    return None
 
 
 def find_blocks_and_process(
@@ -100,32 +145,23 @@ def find_blocks_and_process(
     function_kwargs={},
     delimiter_start=SQL_BLOCK_DELIMITER,
     delimiter_end=BLOCK_END_DELIMITER,
+    max_workers=1,
 ):
     """Takes a blob and applies the function `function_to_apply_to_block` to
-    each block delimited by `delimiter_start` and `delimiter_end`."""
-
-    IN_BLOCK = "in_block"
-    OUT_OF_BLOCK = "out_of_block"
+    each block delimited by `delimiter_start` and `delimiter_end`.
 
-    regex_to_match = (
-        "(" + delimiter_start + "|" + delimiter_end + ")"
-    )  # To reduce priority, END_DELIMITERS always go last
-    splits = re.split(regex_to_match, ugc_blob)
+    Blocks are processed by up to `max_workers` threads and written back in
+    document order. A block that references an aliased block waits for it.
+    Once a block fails, no more are started, and its exception is raised."""
 
-    def get_state(clause, state):
-        if clause == delimiter_start:
-            state = IN_BLOCK
-        elif clause == delimiter_end:
-            state = OUT_OF_BLOCK
-        return state
+    blocks = scan_blocks(ugc_blob, delimiter_start, delimiter_end)
 
     def construct_jinja_statement(clause):
         # Check if the first element is a -, in which case everything up to the
         # newline is used as the jinja alias
-        if clause[0] == "-":
-            clause_split_on_cr = clause.split("\n")
-            jinja_alias = clause_split_on_cr[0][1:]
-            sql = "\n".join(clause_split_on_cr[1:])
+        jinja_alias = get_jinja_alias(clause)
+        if jinja_alias is not None:
+            sql = "\n".join(clause.split("\n")[1:])
             jinja_statement = textwrap.dedent(
                 f"""
             {{% set {jinja_alias} %}}
@@ -138,69 +174,120 @@ def find_blocks_and_process(
             return None
 
     # Loop through once to get macros
-    state = OUT_OF_BLOCK
     jinja_statements = []
-    for clause in splits:
-        if state == IN_BLOCK:
-            jinja_statement = construct_jinja_statement(clause)
-            if jinja_statement:
-                jinja_statements.append(jinja_statement)
-        else:
-            pass
-        state = get_state(clause, state)
+    aliased_blocks = {}
+    for i, (block_start, block_end) in enumerate(blocks):
+        clause = ugc_blob[block_start:block_end]
+        jinja_statement = construct_jinja_statement(clause)
+        if jinja_statement:
+            jinja_statements.append(jinja_statement)
+            aliased_blocks[get_jinja_alias(clause)] = i
     extra_macros = "".join(jinja_statements)
 
-    state = OUT_OF_BLOCK
-    sections = []
-    for clause in splits:
-        if state == IN_BLOCK:
-            split_clause = clause.split("\n")
-            prefix = split_clause[0]
-            sql = "\n".join(split_clause[1:])
-            processed_sql = function_to_apply_to_block(
-                sql, **function_kwargs, extra_macros=extra_macros
-            )
-            processed_clause = "\n".join([prefix, processed_sql])
-            state = OUT_OF_BLOCK
-        else:
-            processed_clause = clause
+    prefixes = []
+    sqls = []
+    for block_start, block_end in blocks:
+        split_clause = ugc_blob[block_start:block_end].split("\n")
+        prefixes.append(split_clause[0])
+        sqls.append("\n".join(split_clause[1:]))
+    processed_sqls = list(sqls)
+
+    def process_block(i):
+        processed_sqls[i] = function_to_apply_to_block(
+            sqls[i], **function_kwargs, extra_macros=extra_macros
+        )
+
+    if max_workers <= 1:
+        for i in range(len(sqls)):
+            process_block(i)
+    else:
+        dependencies = [
+            [
+                aliased_block
+                for jinja_alias, aliased_block in aliased_blocks.items()
+                if aliased_block != i
+                and re.search(r"{{[^}]*\b" + re.escape(jinja_alias) + r"\b", sql)
+            ]
+            for i, sql in enumerate(sqls)
+        ]
+        _process_concurrently(process_block, dependencies, max_workers)
 
-        state = get_state(clause, state)
-
-        sections.append(processed_clause)
+    sections = []
+    previous_block_end = 0
+    for i, (block_start, block_end) in enumerate(blocks):
+        sections.append(ugc_blob[previous_block_end:block_start])
+        sections.append("\n".join([prefixes[i], processed_sqls[i]]))
+        previous_block_end = block_end
+    sections.append(ugc_blob[previous_block_end:])
 
     return "".join(sections)
 
 
-def sections_from_markdown(file_path):
-
-    with open(file_path, "r") as f:
-        old_file_text = "".join(f.readlines())
-
-    file_strings = old_file_text.split(UGC_DELIMITER)
-
-    programmatic_blob = file_strings[0]
-
-    programmatic_sections = parse_programmatic_blob(programmatic_blob)
-
-    ugc = "".join(file_strings[1:])
+def _process_concurrently(process_block, dependencies, max_workers):
+    """
+    Calls `process_block(i)` for each block, once the blocks in
+    `dependencies[i]` are processed, on up to `max_workers` threads.
+    """
+    pending = list(range(len(dependencies)))
+    processed = set()
+    running = {}
+    exception = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [i for i in pending if all(j in processed for j in dependencies[i])]
+            if not ready and not running:
+                # Aliases reference each other, so fall back to document order
+                ready = pending[:1]
+            # Only submit as many as can start, so that the rest can be stopped
+            for i in ready[: max_workers - len(running)]:
+                pending.remove(i)
+                running[executor.submit(process_block, i)] = i
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                if future.exception() is None:
+                    processed.add(i)
+                elif exception is None:
+                    # As when run in turn, later blocks don't run
+                    exception = future.exception()
+                    pending = []
+
+    if exception is not None:
+        raise exception
+
+
+def sections_from_text(text):
+    """
+    Splits the text of a table stub into its programmatic sections and the
+    UGC that follows the first UGC_DELIMITER.
+    """
+    ugc_delimiter_start = text.find(UGC_DELIMITER)
+    if ugc_delimiter_start == -1:
+        programmatic_end = len(text)
+        ugc = ""
+    else:
+        programmatic_end = ugc_delimiter_start
+        ugc = text[ugc_delimiter_start + len(UGC_DELIMITER) :]
 
     sections = {
         UGC_SECTION: ugc,
     }
-    sections.update(programmatic_sections)
+    sections.update(parse_programmatic_blob(text, end=programmatic_end))
     return sections
 
 
+def sections_from_markdown(file_path):
+
+    with open(file_path, "r") as f:
+        old_file_text = f.read()
+
+    return sections_from_text(old_file_text)
+
+
 def markdown_from_sections(sections: dict):
-    programmatic_blob = (
-        sections[HEADER_SECTION]
-        + sections[COLUMN_DETAILS_SECTION]
-        + sections[INDEX_SECTION]
-        + sections[PARTITION_SECTION]
-        + sections[USAGE_SECTION]
-        + sections[METRICS_SECTION]
-    )
+    programmatic_blob = "".join(sections[section] for section in PROGRAMMATIC_SECTIONS)
 
     ugc_blob = sections[UGC_SECTION]
     final_blob = UGC_DELIMITER.join([programmatic_blob, ugc_blob])
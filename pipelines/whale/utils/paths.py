@@ -2,9 +2,12 @@ from pathlib import Path
 import os
 
 BASE_DIR = Path(os.path.join(Path.home(), ".whale/"))
+CACHE_DIR = BASE_DIR / "cache/"
 CONFIG_DIR = BASE_DIR / "config/"
 CONFIG_PATH = CONFIG_DIR / "config.yaml"
 CONNECTION_PATH = CONFIG_DIR / "connections.yaml"
+# Kept in sync with run_script.py, which can't import whale before using it
+DAEMON_SOCKET_PATH = BASE_DIR / "daemon.sock"
 LOGS_DIR = BASE_DIR / "logs/"
 MACROS_DIR = BASE_DIR / "macros/"
 # MACROS_PATH = MACROS_DIR / "macros."
@@ -12,9 +15,16 @@ MANIFEST_DIR = BASE_DIR / "manifests/"
 MANIFEST_PATH = MANIFEST_DIR / "manifest.txt"
 METADATA_PATH = BASE_DIR / "metadata/"
 METRICS_PATH = BASE_DIR / "metrics/"
+METRIC_HISTORY_PATH = METRICS_PATH / "history/"
 TMP_MANIFEST_PATH = MANIFEST_DIR / "tmp_manifest.txt"
 ETL_LOG_PATH = LOGS_DIR / "cron.log"
 TABLE_COUNT_PATH = LOGS_DIR / "table_count.csv"
+FINGERPRINTS_PATH = CACHE_DIR / "fingerprints.json"
+CATALOG_PATH = CACHE_DIR / "catalog.sqlite3"
+METRIC_INDEX_PATH = CACHE_DIR / "metric_index.json"
+RESULT_CACHE_PATH = CACHE_DIR / "results/"
+JINJA_CACHE_PATH = CACHE_DIR / "jinja/"
+EXTRACTION_STATE_PATH = CACHE_DIR / "extraction_state/"
 
 
 def get_subdir_without_whale(path):
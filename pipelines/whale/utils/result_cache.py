@@ -0,0 +1,192 @@
+import datetime
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from whale.utils import paths
+
+LOGGER = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".pkl.gz"
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_BYTES = 256 << 20  # 256 MiB
+
+RESULTS_KEY = "results"
+EXECUTION_TIME_KEY = "execution_time"
+CACHED_AT_KEY = "cached_at"
+WATERMARKS_KEY = "watermarks"
+
+# Tables following FROM or JOIN, e.g. schema.table, "schema"."table" or
+# `project.dataset.table`
+IDENTIFIER_PART = r"(?:[\w$]+|\"[^\"]+\"|`[^`]+`|\[[^\]]+\])"
+TABLE_REFERENCE_REGEX = re.compile(
+    rf"\b(?:from|join)\s+({IDENTIFIER_PART}(?:\s*\.\s*{IDENTIFIER_PART})*)",
+    re.IGNORECASE,
+)
+
+
+def get_cache_key(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def get_referenced_tables(sql: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Returns the (schema, table) of each table that `sql` selects from or
+    joins to. Schema is None if the table isn't qualified.
+    """
+    tables = set()
+    for match in TABLE_REFERENCE_REGEX.finditer(sql):
+        reference = re.sub(r"[\"`\[\]\s]", "", match.group(1))
+        parts = reference.split(".")
+        schema = parts[-2] if len(parts) > 1 else None
+        tables.add((schema, parts[-1]))
+    return sorted(tables, key=lambda table: (table[0] or "", table[1]))
+
+
+def get_watermarks(
+    database: str, sql: str, catalog_path=paths.CATALOG_PATH
+) -> List[list]:
+    """
+    Returns the watermarks in the catalog of the tables referenced by `sql`,
+    which change whenever new partitions land in those tables.
+    """
+    if not os.path.exists(str(catalog_path)):
+        return []
+
+    # Only needed when invalidating on watermarks, and slow to import
+    from whale.utils.catalog import Catalog
+
+    catalog = Catalog(catalog_path)
+    try:
+        watermarks = []
+        for schema, table in get_referenced_tables(sql):
+            for table_key in catalog.find_table_keys(database, table, schema):
+                for watermark in catalog.get_watermarks(table_key):
+                    watermarks.append(
+                        [
+                            table_key,
+                            watermark["part_type"],
+                            watermark["part_name"],
+                            watermark["part_value"],
+                        ]
+                    )
+    finally:
+        catalog.close()
+    return sorted(watermarks)
+
+
+class ResultCache(object):
+    """
+    Cache of query results under ~/.whale/cache/results, with one
+    gzip-compressed pickle per entry.
+
+    Entries expire `ttl_seconds` after the query was executed. Once the
+    entries take up more than `max_bytes`, the least recently used are
+    evicted (reads touch an entry's mtime). If watermarks are given when
+    saving an entry, it is only returned while the same watermarks are given.
+    """
+
+    def __init__(
+        self,
+        cache_directory=paths.RESULT_CACHE_PATH,
+        ttl_seconds=DEFAULT_TTL_SECONDS,
+        max_bytes=DEFAULT_MAX_BYTES,
+    ):
+        self.cache_directory = str(cache_directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    def get(
+        self, key: str, watermarks: list = None
+    ) -> Optional[Tuple[pd.DataFrame, datetime.datetime]]:
+        """
+        Returns the results cached under `key` and the time at which their
+        query was executed, or None on a miss.
+        """
+        entry_path = self._get_entry_path(key)
+        try:
+            entry = pd.read_pickle(entry_path, compression="gzip")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            LOGGER.warning(f"Discarding unreadable cached results at {entry_path}: {e}")
+            self._remove(entry_path)
+            return None
+
+        if (
+            self.ttl_seconds is not None
+            and time.time() - entry[CACHED_AT_KEY] > self.ttl_seconds
+        ):
+            self._remove(entry_path)
+            return None
+
+        if watermarks is not None and entry[WATERMARKS_KEY] != watermarks:
+            LOGGER.info("Watermarks have changed since the results were cached.")
+            self._remove(entry_path)
+            return None
+
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Evicted by another process, but the entry was still valid
+            pass
+        return entry[RESULTS_KEY], entry[EXECUTION_TIME_KEY]
+
+    def put(
+        self,
+        key: str,
+        results: pd.DataFrame,
+        execution_time: datetime.datetime,
+        watermarks: list = None,
+    ):
+        # Results may be sensitive, so only the user may read them
+        Path(self.cache_directory).mkdir(mode=0o700, parents=True, exist_ok=True)
+        entry_path = self._get_entry_path(key)
+        tmp_path = os.path.join(self.cache_directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        pd.to_pickle(
+            {
+                RESULTS_KEY: results,
+                EXECUTION_TIME_KEY: execution_time,
+                CACHED_AT_KEY: execution_time.timestamp(),
+                WATERMARKS_KEY: watermarks,
+            },
+            tmp_path,
+            compression="gzip",
+        )
+        os.replace(tmp_path, entry_path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_directory) as dir_entries:
+            for dir_entry in dir_entries:
+                if not dir_entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        n_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if n_bytes <= self.max_bytes:
+                break
+            self._remove(entry_path)
+            n_bytes -= size
+
+    def _remove(self, entry_path: str):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_directory, key + ENTRY_SUFFIX)
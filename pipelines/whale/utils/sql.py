@@ -1,12 +1,67 @@
-from jinja2 import Environment, BaseLoader
+import os
+import stat
+import threading
+from jinja2 import Environment, BaseLoader, FileSystemBytecodeCache, FileSystemLoader
 from pathlib import Path
 from termcolor import colored
+from whale.utils import paths
 from whale.utils.paths import MACROS_DIR
 
 DEFAULT_TEMPLATE_NAME = "default.sql"
 FAILING_COLOR = "red"
 PASSING_COLOR = "green"
 
+_ENVIRONMENTS = {}
+_MACRO_MODULES = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_environment() -> Environment:
+    """
+    Returns the Jinja environment shared by all queries templated with the
+    macros in ~/.whale/macros. Compiled macro files are also cached as
+    bytecode under ~/.whale/cache/jinja, to be reused by later runs.
+    """
+    macros_dir = str(MACROS_DIR)
+    with _CACHE_LOCK:
+        if macros_dir not in _ENVIRONMENTS:
+            try:
+                Path(paths.JINJA_CACHE_PATH).mkdir(parents=True, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(str(paths.JINJA_CACHE_PATH))
+            except OSError:
+                bytecode_cache = None
+            _ENVIRONMENTS[macros_dir] = Environment(
+                loader=FileSystemLoader(macros_dir), bytecode_cache=bytecode_cache
+            )
+        return _ENVIRONMENTS[macros_dir]
+
+
+def get_macro_module(connection_name=""):
+    """
+    Returns the rendered Jinja module of the connection_name.sql file of
+    macros, or None if there is no such file. Modules are cached until the
+    file is modified.
+    """
+    template_name = (connection_name or "") + ".sql"
+    template_file_path = str(MACROS_DIR / template_name)
+    try:
+        file_stat = os.stat(template_file_path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None
+
+    version = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _CACHE_LOCK:
+        cached_version, module = _MACRO_MODULES.get(template_file_path, (None, None))
+    if cached_version == version:
+        return module
+
+    module = get_environment().get_template(template_name).make_module()
+    with _CACHE_LOCK:
+        _MACRO_MODULES[template_file_path] = (version, module)
+    return module
+
 
 def template_query(query, connection_name="", extra_macros=""):
     """
@@ -15,20 +70,24 @@ def template_query(query, connection_name="", extra_macros=""):
     templated query.
     """
     # First determine the connection type, and look for a "connection_name.sql" file in templates.
-    template_file_path = MACROS_DIR / ((connection_name or "") + ".sql")
-    is_template_file_path_found = template_file_path.is_file()
+    macro_module = get_macro_module(connection_name)
 
     if extra_macros:
         query = "\n".join([extra_macros, query])
-    if is_template_file_path_found:
-        # Load this default file and prepend to the provided query.
-        with open(template_file_path, "r") as f:
-            template = f.read()
-        query = "\n".join([template, query])
 
     # Template the query with Jinja.
-    template = Environment(loader=BaseLoader).from_string(query)
-    templated_query = template.render()
+    template = get_environment().from_string(query)
+    if macro_module is None:
+        return template.render()
+
+    # Render against the precompiled macros, with the same output as if the
+    # file had been prepended to the query
+    macros = {
+        name: value
+        for name, value in vars(macro_module).items()
+        if not name.startswith("_")
+    }
+    templated_query = "\n".join([str(macro_module), template.render(**macros)])
     return templated_query
 
 